@@ -1,7 +1,11 @@
 import os
 import logging
+from datetime import timedelta
 from flask import Flask
 from flask_session import Session
+import assets
+import metrics
+from sessions import SQLiteSessionInterface
 
 # Set up logging for debugging
 logging.basicConfig(level=logging.DEBUG)
@@ -10,14 +14,46 @@ logging.basicConfig(level=logging.DEBUG)
 app = Flask(__name__)
 
 # Configure session
+# "sqlite" (default) shares one session table across workers; "filesystem" is
+# the original Flask-Session file-per-session backend
+SESSION_BACKEND = os.environ.get("QUICKBITE_SESSIONS", "sqlite")
 app.secret_key = os.environ.get("SESSION_SECRET", "quickbite-secret-key-for-development")
-app.config['SESSION_TYPE'] = 'filesystem'
-app.config['SESSION_PERMANENT'] = False
-app.config['SESSION_USE_SIGNER'] = True
-Session(app)
+# Idle sessions are removed after this long
+app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=12)
+if SESSION_BACKEND == 'sqlite':
+    session_db = os.environ.get("QUICKBITE_SESSION_DB",
+                                os.path.join(app.root_path, 'data', 'sessions.db'))
+    app.session_interface = SQLiteSessionInterface(session_db)
+else:
+    app.config['SESSION_TYPE'] = 'filesystem'
+    app.config['SESSION_PERMANENT'] = False
+    app.config['SESSION_USE_SIGNER'] = True
+    Session(app)
+
+# Request/template timing and the /metrics endpoint
+metrics.init_app(app)
+
+# Fingerprinted, precompressed static files under /assets
+assets.init_app(app)
+
+def count_open_sessions():
+    """Count sessions that have not expired (or session files not cleaned up)"""
+    if SESSION_BACKEND == 'sqlite':
+        return app.session_interface.count()
+    session_dir = app.config.get('SESSION_FILE_DIR', os.path.join(os.getcwd(), 'flask_session'))
+    try:
+        return sum(1 for entry in os.scandir(session_dir) if entry.is_file())
+    except FileNotFoundError:
+        return 0
+
+metrics.gauge('quickbite_open_sessions', 'Stored sessions', count_open_sessions)
 
 # Import routes after app creation to avoid circular imports
 from routes import *
 
+# Move yesterday's closed orders out of the hot store, then repeat daily
+from models import start_daily_rollover
+start_daily_rollover()
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,149 @@
+"""Cold storage for closed orders from previous days
+
+Each daily rollover appends one segment: a JSONL data file holding the
+archived orders and an index file listing (order_id, student_id, offset,
+length) for every line. The index is written only after the data is on
+disk, so a segment without one is an interrupted rollover and is ignored.
+
+Only the indexes are held in memory. Order history is read on demand by
+slicing memory-mapped segment files, newest first. Segments are shared by
+every worker process; each process picks up new ones when the directory
+changes. Rollovers from several processes are serialised with a file lock.
+"""
+import fcntl
+import json
+import mmap
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+SEGMENT_PATTERN = re.compile(r'^segment-(\d+)\.idx$')
+
+
+class OrderArchive:
+    """Append-only, per-student indexed archive of order records"""
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._by_student = {}  # student_id -> [(segment, offset, length), ...] oldest first
+        self._by_order = {}  # order_id -> (student_id, segment, offset, length)
+        self._segments = {}  # segment number -> mmap (opened on first read)
+        self._loaded = set()
+        self._dir_mtime = None
+        self._lock = threading.Lock()
+        self._refresh()
+
+    def _path(self, segment, suffix):
+        return os.path.join(self.directory, f"segment-{segment:06d}.{suffix}")
+
+    def _refresh(self):
+        """Load indexes of segments written since the last look (by any process)"""
+        mtime = os.stat(self.directory).st_mtime_ns
+        if mtime == self._dir_mtime:
+            return
+        with self._lock:
+            self._dir_mtime = mtime
+            numbers = sorted(int(match.group(1)) for match in
+                             map(SEGMENT_PATTERN.match, os.listdir(self.directory)) if match)
+            for segment in numbers:
+                if segment in self._loaded:
+                    continue
+                with open(self._path(segment, 'idx')) as f:
+                    entries = json.load(f)
+                for order_id, student_id, offset, length in entries:
+                    location = (segment, offset, length)
+                    self._by_student.setdefault(student_id, []).append(location)
+                    self._by_order[order_id] = (student_id,) + location
+                self._loaded.add(segment)
+
+    @contextmanager
+    def rollover_lock(self):
+        """Hold the archive's cross-process lock for one rollover"""
+        with open(os.path.join(self.directory, 'rollover.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def contains(self, order_id):
+        return order_id in self._by_order
+
+    def order_ids(self):
+        return list(self._by_order)
+
+    def _holds(self, record):
+        """True if the archived record under record's order_id is the same order"""
+        stored = self._read(*self._by_order[record['order_id']][1:])
+        return (stored['student_id'], stored.get('order_time')) == \
+            (record['student_id'], record.get('order_time'))
+
+    def add(self, records):
+        """Append order records as a new segment, skipping any already archived
+
+        records are dicts with at least order_id and student_id. Returns the
+        IDs of the records now safely in the archive: the ones written and
+        the ones an interrupted rollover already wrote. A record whose ID is
+        archived for a different order is left out. Call under
+        rollover_lock() so concurrent rollovers do not pick the same segment.
+        """
+        held = [record['order_id'] for record in records
+                if record['order_id'] in self._by_order and self._holds(record)]
+        records = [record for record in records if record['order_id'] not in self._by_order]
+        if not records:
+            return held
+        segment = max(self._loaded, default=0) + 1
+        entries = []
+        offset = 0
+        with open(self._path(segment, 'jsonl'), 'wb') as f:
+            for record in records:
+                line = json.dumps(record, separators=(',', ':')).encode() + b'\n'
+                f.write(line)
+                entries.append((record['order_id'], record['student_id'], offset, len(line)))
+                offset += len(line)
+            f.flush()
+            os.fsync(f.fileno())
+        temp_path = self._path(segment, 'idx.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(entries, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self._path(segment, 'idx'))
+        self._dir_mtime = None
+        self._refresh()
+        return [record['order_id'] for record in records] + held
+
+    def _read(self, segment, offset, length):
+        data = self._segments.get(segment)
+        if data is None:
+            with self._lock:
+                data = self._segments.get(segment)
+                if data is None:
+                    with open(self._path(segment, 'jsonl'), 'rb') as f:
+                        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    self._segments[segment] = data
+        return json.loads(data[offset:offset + length])
+
+    def count(self, student_id):
+        self._refresh()
+        return len(self._by_student.get(student_id, ()))
+
+    def student_records(self, student_id, offset, limit):
+        """Read up to limit of a student's archived orders, newest first, skipping offset"""
+        self._refresh()
+        locations = self._by_student.get(student_id, [])
+        end = len(locations) - offset
+        if end <= 0 or limit <= 0:
+            return []
+        start = max(end - limit, 0)
+        return [self._read(*location) for location in reversed(locations[start:end])]
+
+    def student_record(self, student_id, order_id):
+        """Read one archived order if it belongs to student_id"""
+        self._refresh()
+        entry = self._by_order.get(order_id)
+        if entry is None or entry[0] != student_id:
+            return None
+        return self._read(*entry[1:])
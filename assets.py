@@ -0,0 +1,274 @@
+"""Self-hosted, fingerprinted and precompressed static assets
+
+Third-party CSS, JS and fonts are vendored under static/vendor instead of
+being pulled from three CDNs on first page load. A build step copies every
+file under static/ to static/dist with a content hash in its name, writes
+gzip (and, when the brotli module is installed, brotli) variants next to it
+and records the mapping in static/dist/manifest.json. Relative url()
+references inside CSS are rewritten to the fingerprinted names.
+
+Templates keep calling url_for('static', filename=...). Files in the manifest
+get a /assets/ URL, which serves the best precompressed variant the browser
+accepts with a one-year immutable Cache-Control; a changed file gets a new
+name, so nothing is ever stale.
+
+    python assets.py vendor [--missing]  # download third-party assets into static/vendor, then build
+    python assets.py build               # fingerprint and compress static/ into static/dist
+
+Deploys download the vendored files while building the slug (bin/post_compile),
+and a failed download fails the build. The app refuses to start without
+them unless QUICKBITE_ASSETS_CDN_FALLBACK=1, which serves missing ones from
+their CDN URLs instead (for development without running vendor). The app
+rebuilds static/dist at startup whenever a source file is newer than the
+manifest, so a deploy only needs to ship the changed sources.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import sys
+import urllib.request
+
+from flask import request, send_from_directory, url_for as flask_url_for
+from werkzeug.exceptions import NotFound
+
+try:
+    import brotli
+except ImportError:  # gzip variants only
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+
+# Vendored file (relative to static/) -> where it is downloaded from
+VENDOR = {
+    'vendor/bootstrap/bootstrap-agent-dark-theme.min.css':
+        'https://cdn.replit.com/agent/bootstrap-agent-dark-theme.min.css',
+    'vendor/bootstrap/bootstrap.bundle.min.js':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+    'vendor/fontawesome/css/all.min.css':
+        'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/css/all.min.css',
+}
+for _font in ('fa-brands-400', 'fa-regular-400', 'fa-solid-900', 'fa-v4compatibility'):
+    for _ext in ('woff2', 'ttf'):
+        VENDOR[f'vendor/fontawesome/webfonts/{_font}.{_ext}'] = (
+            f'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0/webfonts/{_font}.{_ext}')
+
+# Serve vendored files that were never downloaded from their CDNs instead of failing
+CDN_FALLBACK = os.environ.get('QUICKBITE_ASSETS_CDN_FALLBACK') == '1'
+
+# Browsers cache fingerprinted files for a year without revalidating
+ASSET_MAX_AGE = 365 * 24 * 3600
+# Already-compressed formats are served as they are
+COMPRESSIBLE = {'.css', '.js', '.svg', '.ttf', '.json', '.txt', '.map'}
+# Preferred encoding first: (Accept-Encoding token, file suffix)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+CSS_URL_PATTERN = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+def _write_atomic(path, data):
+    """Write data so concurrent readers (and builders) never see a partial file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def _sources():
+    """Files under static/ to publish, as paths relative to it"""
+    found = []
+    for root, dirs, files in os.walk(STATIC_DIR):
+        if root == STATIC_DIR:
+            dirs[:] = [name for name in dirs if name != 'dist']
+        for name in files:
+            if not name.startswith('.'):
+                path = os.path.relpath(os.path.join(root, name), STATIC_DIR)
+                found.append(path.replace(os.sep, '/'))
+    return sorted(found)
+
+
+def _fingerprinted(path, data):
+    root, ext = posixpath.splitext(path)
+    return f"{root}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+
+
+def _rewrite_css(path, data, manifest):
+    """Point relative url() references at fingerprinted files"""
+    directory = posixpath.dirname(path)
+
+    def replace(match):
+        quote, target = match.groups()
+        if re.match(r'^([a-z]+:|/|#)', target, re.I):
+            return match.group(0)
+        clean = re.split(r'[?#]', target, maxsplit=1)[0]
+        suffix = target[len(clean):]
+        resolved = posixpath.normpath(posixpath.join(directory, clean))
+        if resolved not in manifest:
+            return match.group(0)
+        # Both files keep their directories, so the reference stays relative
+        relative = posixpath.relpath(manifest[resolved], directory)
+        return f"url({quote}{relative}{suffix}{quote})"
+
+    return CSS_URL_PATTERN.sub(replace, data.decode('utf-8')).encode('utf-8')
+
+
+def _compress(path, data):
+    """Write precompressed variants that are actually smaller; return their encodings"""
+    encodings = []
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+    for encoding, suffix in ENCODINGS:
+        compressed = variants.get(encoding)
+        if compressed is not None and len(compressed) < len(data):
+            _write_atomic(path + suffix, compressed)
+            encodings.append(encoding)
+    return encodings
+
+
+def build():
+    """Publish static/ into static/dist and return the manifest"""
+    manifest = {}  # source path -> fingerprinted path
+    encodings = {}  # fingerprinted path -> available encodings
+    # CSS last, so the files it references already have their final names
+    for path in sorted(_sources(), key=lambda path: path.endswith('.css')):
+        with open(os.path.join(STATIC_DIR, path), 'rb') as f:
+            data = f.read()
+        if path.endswith('.css'):
+            data = _rewrite_css(path, data, manifest)
+        published = _fingerprinted(path, data)
+        target = os.path.join(DIST_DIR, published)
+        if not os.path.exists(target):
+            _write_atomic(target, data)
+        manifest[path] = published
+        if posixpath.splitext(path)[1] in COMPRESSIBLE:
+            encodings[published] = _compress(target, data)
+        else:
+            encodings[published] = []
+    result = {'files': manifest, 'encodings': encodings}
+    _write_atomic(MANIFEST_PATH, json.dumps(result, indent=1, sort_keys=True).encode())
+    return result
+
+
+def _manifest_current():
+    try:
+        built = os.stat(MANIFEST_PATH).st_mtime
+    except FileNotFoundError:
+        return False
+    return all(os.stat(os.path.join(STATIC_DIR, path)).st_mtime <= built for path in _sources())
+
+
+def load_manifest(rebuild=True):
+    """Read the manifest, rebuilding static/dist first if a source changed"""
+    if rebuild and not _manifest_current():
+        return build()
+    with open(MANIFEST_PATH) as f:
+        return json.load(f)
+
+
+def _missing_vendor_files():
+    return [path for path in VENDOR if not os.path.exists(os.path.join(STATIC_DIR, path))]
+
+
+def vendor(missing=False):
+    """Download the third-party assets into static/vendor; return how many failed
+
+    With missing, files already downloaded are kept as they are.
+    """
+    failed = 0
+    for path in _missing_vendor_files() if missing else VENDOR:
+        try:
+            with urllib.request.urlopen(VENDOR[path], timeout=60) as response:
+                data = response.read()
+        except OSError as e:
+            print(f"{path}  failed: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        _write_atomic(os.path.join(STATIC_DIR, path), data)
+        print(f"{path}  {len(data)} bytes")
+    return failed
+
+
+def init_app(app):
+    """Serve published assets under /assets and route url_for('static') to them"""
+    try:
+        manifest = load_manifest()
+    except OSError:
+        app.logger.exception("Could not build static assets; serving static/ as is")
+        manifest = {'files': {}, 'encodings': {}}
+    files = manifest['files']
+    encodings = manifest['encodings']
+    missing = _missing_vendor_files()
+    if missing and not CDN_FALLBACK:
+        raise RuntimeError(f"{len(missing)} vendored assets not downloaded (run python assets.py "
+                           f"vendor, or set QUICKBITE_ASSETS_CDN_FALLBACK=1): {', '.join(missing)}")
+    if missing:
+        app.logger.warning("%d vendored assets not downloaded, serving them from their CDNs: %s",
+                           len(missing), ', '.join(missing))
+    # Pages embed these URLs, so their ETags must change with them
+    app.config['ASSETS_VERSION'] = hashlib.sha256(
+        json.dumps(files, sort_keys=True).encode()).hexdigest()[:10]
+
+    def url_for(endpoint, **values):
+        if endpoint == 'static':
+            filename = values.get('filename')
+            if filename in files:
+                values['filename'] = files[filename]
+                return flask_url_for('serve_asset', **values)
+            if filename in VENDOR and not os.path.exists(os.path.join(STATIC_DIR, filename)):
+                return VENDOR[filename]  # CDN_FALLBACK, warned about above
+        return flask_url_for(endpoint, **values)
+
+    @app.route('/assets/<path:filename>')
+    def serve_asset(filename):
+        if filename not in encodings:
+            raise NotFound()
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding = None
+        for candidate, suffix in ENCODINGS:
+            if candidate in encodings[filename] and request.accept_encodings[candidate]:
+                encoding = candidate
+                break
+        path = filename + dict(ENCODINGS)[encoding] if encoding else filename
+        response = send_from_directory(DIST_DIR, path, mimetype=mimetype,
+                                       max_age=ASSET_MAX_AGE, conditional=True)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        response.vary.add('Accept-Encoding')
+        return response
+
+    app.jinja_env.globals['url_for'] = url_for
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    command = commands.add_parser('vendor', help='download third-party assets into static/vendor')
+    command.add_argument('--missing', action='store_true',
+                         help='only download files that are not there yet')
+    commands.add_parser('build', help='fingerprint and compress static/ into static/dist')
+    args = parser.parse_args(argv)
+    failed = vendor(args.missing) if args.command == 'vendor' else 0
+    result = build()
+    total = len(result['files'])
+    compressed = sum(1 for found in result['encodings'].values() if found)
+    print(f"{total} files published to {os.path.relpath(DIST_DIR)}, {compressed} precompressed"
+          + ('' if brotli else ' (gzip only; install brotli for .br variants)'))
+    if failed:
+        print(f"{failed} vendored assets could not be downloaded", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
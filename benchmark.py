@@ -0,0 +1,676 @@
+"""Lunch-rush load and memory benchmarks for QuickBite
+
+Drives the app the way students do at noon: a burst of registrations and
+logins, then menu browsing, cart updates, checkout and order tracking spread
+over the pickup slots and locations. Reports latency percentiles and
+throughput per route. Each simulated student keeps ETags like a browser and
+revalidates pages it has already seen.
+
+    python benchmark.py load                        # 500 students, Flask test client
+    python benchmark.py load --scale 10 --concurrency 16
+    python benchmark.py load --gunicorn --workers 4  # against a local gunicorn
+    python benchmark.py load --url http://127.0.0.1:5000
+    python benchmark.py memory --orders 20000      # bytes per stored order
+    python benchmark.py journal --orders 20000     # journal writes and recovery time
+    python benchmark.py stress --threads 64        # hammer carts and checkout, check invariants
+    python benchmark.py roster --students 2000     # bulk import throughput per worker count
+
+Use --mix to change the scenario weights, e.g. --mix checkout=3,browse=1.
+Results can be saved with --json so runs can be compared across changes.
+"""
+import argparse
+import http.cookiejar
+import json
+import logging
+import os
+import random
+import re
+import socket
+import subprocess
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Students per term at the default scale
+BASE_STUDENTS = 500
+
+# Named scenario mixes: flow name -> relative weight
+MIXES = {
+    'lunch-rush': {'checkout': 6, 'browse': 2.5, 'track': 1.5},
+    'checkout': {'checkout': 1},
+    'browse': {'browse': 1},
+    'track': {'track': 1},
+}
+
+# Most students want the middle of the lunch hour
+SLOT_WEIGHTS = [2, 4, 3, 1]
+
+
+class BrowserCache:
+    """Pages a browser keeps with their ETags so it can revalidate them"""
+    def __init__(self):
+        self.pages = {}  # path -> (etag, body)
+
+    def headers(self, method, path):
+        cached = self.pages.get(path) if method == 'GET' else None
+        return {'If-None-Match': cached[0]} if cached else {}
+
+    def result(self, method, path, status, etag, body):
+        """(status, body) as the student sees it, serving 304s from the cache"""
+        if status == 304:
+            return status, self.pages[path][1]
+        if method == 'GET' and status == 200 and etag:
+            self.pages[path] = (etag, body)
+        return status, body
+
+
+class TestClientSession:
+    """One student's browser, backed by the Flask test client"""
+    def __init__(self, app):
+        self.client = app.test_client()
+        self.cache = BrowserCache()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data,
+                                    headers=self.cache.headers(method, path))
+        return self.cache.result(method, path, response.status_code,
+                                 response.headers.get('ETag'), response.get_data(as_text=True))
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class HTTPSession:
+    """One student's browser talking to a running server over HTTP"""
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+        self.cache = BrowserCache()
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data, doseq=True).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method,
+                                     headers=self.cache.headers(method, path))
+        try:
+            with self.opener.open(req, timeout=60) as response:
+                status, etag, text = response.status, response.headers.get('ETag'), response.read().decode()
+        except urllib.error.HTTPError as error:
+            status, etag, text = error.code, error.headers.get('ETag'), error.read().decode()
+        return self.cache.result(method, path, status, etag, text)
+
+
+class Recorder:
+    """Collects per-route latency and CPU samples from many threads"""
+    def __init__(self):
+        self.samples = {}  # route -> list of (seconds, cpu seconds)
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def timed(self, session, route, method, path, data=None):
+        cpu_start = time.thread_time()
+        start = time.perf_counter()
+        status, body = session.request(method, path, data)
+        elapsed = time.perf_counter() - start
+        cpu = time.thread_time() - cpu_start
+        with self._lock:
+            self.samples.setdefault(route, []).append((elapsed, cpu))
+            if status >= 400:
+                self.errors[route] = self.errors.get(route, 0) + 1
+        return status, body
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(fraction * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def run_student(recorder, session, student_number, flow, rng, time_slots, locations, meal_ids):
+    """Play one student's visit through the app"""
+    student_id = f"bench{student_number:06d}"
+    password = "benchpass"
+    recorder.timed(session, 'POST /register', 'POST', '/register', {
+        'student_id': student_id, 'name': f"Student {student_number}",
+        'email': f"{student_id}@school.edu", 'password': password,
+        'confirm_password': password})
+    recorder.timed(session, 'POST /login', 'POST', '/login',
+                   {'student_id': student_id, 'password': password})
+
+    recorder.timed(session, 'GET /', 'GET', '/')
+    recorder.timed(session, 'GET /menu', 'GET', '/menu')
+    if flow == 'browse':
+        recorder.timed(session, 'GET /menu', 'GET', '/menu')
+        recorder.timed(session, 'POST /add_to_cart', 'POST', '/add_to_cart',
+                       {'meal_id': rng.choice(meal_ids), 'quantity': 1})
+        recorder.timed(session, 'GET /cart', 'GET', '/cart')
+        return
+
+    for _ in range(rng.randint(1, 3)):
+        recorder.timed(session, 'POST /add_to_cart', 'POST', '/add_to_cart',
+                       {'meal_id': rng.choice(meal_ids), 'quantity': rng.randint(1, 2)})
+    recorder.timed(session, 'GET /cart', 'GET', '/cart')
+    recorder.timed(session, 'POST /place_cart_order', 'POST', '/place_cart_order', {
+        'pickup_time': rng.choices(time_slots, SLOT_WEIGHTS[:len(time_slots)])[0],
+        'pickup_location': rng.choice(locations)})
+
+    _, body = recorder.timed(session, 'GET /orders', 'GET', '/orders')
+    order_ids = re.findall(r'/track_order/(ORD\d+)', body)
+    if not order_ids:
+        return  # slot was full
+    reloads = rng.randint(3, 6) if flow == 'track' else 1
+    for _ in range(reloads):
+        recorder.timed(session, 'GET /track_order/<id>', 'GET', f"/track_order/{order_ids[0]}")
+
+
+def parse_mix(value):
+    if value in MIXES:
+        return MIXES[value]
+    mix = {}
+    for part in value.split(','):
+        flow, _, weight = part.partition('=')
+        if flow not in ('checkout', 'browse', 'track'):
+            raise argparse.ArgumentTypeError(f"Unknown flow: {flow}")
+        mix[flow] = float(weight or 1)
+    return mix
+
+
+def wait_for_port(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"gunicorn did not start listening on {host}:{port}")
+
+
+def start_gunicorn(args):
+    """Start a local gunicorn on a free port, sharing state through SQLite"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    env = dict(os.environ)
+    env.setdefault('QUICKBITE_STORE', 'sqlite')
+    env.setdefault('QUICKBITE_DB_PATH', os.path.join('data', f"benchmark-{port}.db"))
+    process = subprocess.Popen(
+        ['gunicorn', 'app:app', '--bind', f"127.0.0.1:{port}", '--workers', str(args.workers),
+         '--worker-class', 'gthread', '--threads', str(args.threads), '--log-level', 'warning'],
+        env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+    wait_for_port('127.0.0.1', port)
+    return process, f"http://127.0.0.1:{port}", env['QUICKBITE_DB_PATH']
+
+
+def report(recorder, wall_time, show_cpu):
+    """Print per-route latency percentiles and throughput"""
+    header = f"{'route':<26}{'count':>7}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}"
+    if show_cpu:
+        header += f"{'cpu ms':>9}"
+    print(header)
+    print('-' * len(header))
+    results = {}
+    for route in sorted(recorder.samples):
+        samples = recorder.samples[route]
+        latencies = sorted(elapsed for elapsed, _ in samples)
+        result = {
+            'count': len(samples),
+            'errors': recorder.errors.get(route, 0),
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'throughput': len(samples) / wall_time,
+            'cpu_ms': sum(cpu for _, cpu in samples) / len(samples) * 1000,
+        }
+        results[route] = result
+        line = (f"{route:<26}{result['count']:>7}{result['errors']:>8}{result['p50_ms']:>9.2f}"
+                f"{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}{result['throughput']:>9.1f}")
+        if show_cpu:
+            line += f"{result['cpu_ms']:>9.2f}"
+        print(line)
+    total = sum(len(samples) for samples in recorder.samples.values())
+    print(f"\n{total} requests in {wall_time:.2f}s ({total / wall_time:.1f} req/s)")
+    return results
+
+
+def run_load(args):
+    students = int(args.students * args.scale)
+    rng = random.Random(args.seed)
+    flows = list(args.mix)
+    weights = [args.mix[flow] for flow in flows]
+    plan = [(number, rng.choices(flows, weights)[0], rng.randrange(2 ** 32))
+            for number in range(students)]
+
+    server = None
+    if args.gunicorn:
+        server, base_url, db_path = start_gunicorn(args)
+    else:
+        base_url = args.url
+
+    try:
+        if base_url:
+            make_session = lambda: HTTPSession(base_url)
+        else:
+            from app import app
+            app.config['TESTING'] = True
+            # app.py logs at DEBUG, which would dominate the measurements
+            logging.getLogger().setLevel(logging.WARNING)
+            make_session = lambda: TestClientSession(app)
+
+        from models import get_time_slots, get_pickup_locations, load_menu
+        time_slots = get_time_slots()
+        locations = [location['name'] for location in get_pickup_locations()]
+        meal_ids = [str(meal['id']) for meal in load_menu()['meals']]
+
+        recorder = Recorder()
+        target = base_url or 'Flask test client'
+        print(f"{students} students ({args.scale}x), concurrency {args.concurrency}, "
+              f"mix {args.mix}, target {target}\n")
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = [pool.submit(run_student, recorder, make_session(), number, flow,
+                                   random.Random(seed), time_slots, locations, meal_ids)
+                       for number, flow, seed in plan]
+            for future in futures:
+                future.result()
+        wall_time = time.perf_counter() - start
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+
+    # Server-side CPU is only visible when requests run in this process
+    results = report(recorder, wall_time, show_cpu=not base_url)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'students': students, 'scale': args.scale, 'mix': args.mix,
+                       'concurrency': args.concurrency, 'target': target,
+                       'wall_time': wall_time, 'routes': results}, f, indent=2)
+
+
+class PlainCartItem:
+    """The original order line: a __dict__ object with its own name and price"""
+    def __init__(self, meal_id, meal_name, meal_price, quantity=1):
+        self.meal_id = meal_id
+        self.meal_name = meal_name
+        self.meal_price = meal_price
+        self.quantity = quantity
+
+
+class PlainOrder:
+    """The original order layout, kept here as the memory baseline"""
+    def __init__(self, order_id, student_id, student_name, items, total_price,
+                 pickup_time, pickup_location, order_time=None):
+        self.order_id = order_id
+        self.student_id = student_id
+        self.student_name = student_name
+        self.items = items
+        self.total_price = total_price
+        self.pickup_time = pickup_time
+        self.pickup_location = pickup_location
+        self.order_time = order_time or datetime.now()
+        self.status = "confirmed"
+        self.preparation_status = "received"
+        self.estimated_ready_time = None
+        self.actual_ready_time = None
+        self.delivered_time = None
+        self.version = 0
+
+
+def fresh(text):
+    """A new copy of a string, as a request form or database row would produce"""
+    return ''.join(list(text))
+
+
+def build_orders(count, order_class, item_class, rng, meals, time_slots, locations):
+    """Build count orders of 1-3 lines from request-like (freshly allocated) strings"""
+    orders = []
+    for number in range(count):
+        student = number % max(count // 4, 1)  # students order about four times a term
+        lines = []
+        for meal in rng.sample(meals, rng.randint(1, 3)):
+            lines.append(item_class(fresh(str(meal['id'])), fresh(meal['name']),
+                                    meal['price'], rng.randint(1, 2)))
+        order = order_class(f"ORD{number:04d}", fresh(f"bench{student:06d}"),
+                            fresh(f"Student {student}"), lines,
+                            sum(line.meal_price * line.quantity for line in lines),
+                            fresh(rng.choice(time_slots)), fresh(rng.choice(locations)))
+        order.preparation_status = fresh(rng.choice(['received', 'preparing', 'ready', 'delivered']))
+        orders.append(order)
+    return orders
+
+
+def measure_orders(count, order_class, item_class, seed, meals, time_slots, locations):
+    """Bytes retained per order, measured with tracemalloc"""
+    rng = random.Random(seed)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    orders = build_orders(count, order_class, item_class, rng, meals, time_slots, locations)
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del orders
+    return retained / count
+
+
+def run_memory(args):
+    logging.getLogger().setLevel(logging.WARNING)
+    from models import Order, CartItem, get_time_slots, get_pickup_locations, load_menu
+    meals = load_menu()['meals']
+    time_slots = get_time_slots()
+    locations = [location['name'] for location in get_pickup_locations()]
+
+    results = {}
+    for name, order_class, item_class in (('plain', PlainOrder, PlainCartItem),
+                                          ('compact', Order, CartItem)):
+        results[name] = measure_orders(args.orders, order_class, item_class, args.seed,
+                                       meals, time_slots, locations)
+    print(f"{args.orders} orders, 1-3 lines each\n")
+    print(f"{'layout':<10}{'bytes/order':>13}{'MB total':>11}")
+    for name, per_order in results.items():
+        print(f"{name:<10}{per_order:>13.0f}{per_order * args.orders / 2 ** 20:>11.1f}")
+    saving = 1 - results['compact'] / results['plain']
+    print(f"\ncompact layout uses {saving:.0%} less memory per order")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'orders': args.orders, 'bytes_per_order': results}, f, indent=2)
+
+
+def journal_orders(count, rng, meals, time_slots, locations):
+    from models import Order, CartItem
+    for number in range(count):
+        lines = [CartItem(str(meal['id']), meal['name'], meal['price'], rng.randint(1, 2))
+                 for meal in rng.sample(meals, rng.randint(1, 3))]
+        yield Order(None, f"bench{number % 5000:06d}", f"Student {number % 5000}", lines,
+                    sum(line.get_total_price() for line in lines),
+                    rng.choice(time_slots), rng.choice(locations))
+
+
+def fill_journal(store, count, concurrency, seed, meals, time_slots, locations):
+    """Place count orders and move a third of them along, from concurrency threads"""
+    orders = list(journal_orders(count, random.Random(seed), meals, time_slots, locations))
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(store.place_order, orders))
+        list(pool.map(lambda order: (order.apply_status('preparing'), store.order_updated(order)),
+                      orders[::3]))
+    return (count + len(orders[::3])) / (time.perf_counter() - start)
+
+
+def time_recovery(directory, time_slots, capacity, snapshot_every):
+    from storage import JournalStore
+    start = time.perf_counter()
+    store = JournalStore(directory, time_slots, capacity, snapshot_every=snapshot_every)
+    elapsed = time.perf_counter() - start
+    return elapsed, len(store.orders)
+
+
+def run_journal(args):
+    logging.getLogger().setLevel(logging.WARNING)
+    from models import get_time_slots, get_pickup_locations, load_menu
+    from storage import JournalStore
+    meals = load_menu()['meals']
+    time_slots = get_time_slots()
+    locations = [location['name'] for location in get_pickup_locations()]
+    capacity = args.orders  # never turn orders away here
+    root = tempfile.mkdtemp(prefix='quickbite-journal-')
+    results = {'orders': args.orders, 'writes_per_second': {}, 'recovery_seconds': {}}
+    try:
+        print(f"{args.orders} orders, then a status change for every third one\n")
+        print(f"{'writers':<10}{'fsync':>7}{'writes/s':>11}")
+        for concurrency in sorted({1, args.concurrency}):
+            for fsync in (True, False):
+                directory = os.path.join(root, f"write-{concurrency}-{int(fsync)}")
+                store = JournalStore(directory, time_slots, capacity,
+                                     snapshot_every=10 ** 9, fsync=fsync)
+                rate = fill_journal(store, args.orders, concurrency, args.seed,
+                                    meals, time_slots, locations)
+                results['writes_per_second'][f"{concurrency}/{'fsync' if fsync else 'no-fsync'}"] = rate
+                print(f"{concurrency:<10}{'on' if fsync else 'off':>7}{rate:>11.0f}")
+
+        # The same history recovered from the full journal and from a snapshot plus tail
+        full = os.path.join(root, f"write-{args.concurrency}-1")
+        with_snapshot = os.path.join(root, 'snapshot')
+        store = JournalStore(with_snapshot, time_slots, capacity,
+                             snapshot_every=args.snapshot_every, fsync=False)
+        fill_journal(store, args.orders, args.concurrency, args.seed, meals, time_slots, locations)
+        time.sleep(0.5)  # let the last background snapshot finish
+        print(f"\n{'startup from':<26}{'seconds':>9}{'orders':>8}")
+        for label, directory, snapshot_every in (
+                ('full journal', full, 10 ** 9),
+                (f"snapshot (every {args.snapshot_every})", with_snapshot, args.snapshot_every)):
+            elapsed, restored = time_recovery(directory, time_slots, capacity, snapshot_every)
+            results['recovery_seconds'][label] = elapsed
+            print(f"{label:<26}{elapsed:>9.3f}{restored:>8}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+def stress_round(rng, student_id, meal_ids, time_slots, locations, placed):
+    """One random operation; returns how many items it put into the cart"""
+    import models
+    action = rng.random()
+    if action < 0.45:
+        quantity = rng.randint(1, 3)
+        meal = models.get_meal(rng.choice(meal_ids))
+        models.add_to_cart(student_id, str(meal['id']), meal['name'], meal['price'], quantity)
+        return quantity
+    if action < 0.65:
+        operations = [{'op': 'add', 'meal_id': rng.choice(meal_ids), 'quantity': rng.randint(1, 2)}
+                      for _ in range(rng.randint(1, 4))]
+        cart, _ = models.apply_cart_operations(student_id, operations)
+        return sum(operation['quantity'] for operation in operations) if cart is not None else 0
+    if action < 0.9:
+        order, _ = models.create_order_from_cart(
+            student_id, student_id, rng.choice(time_slots), rng.choice(locations),
+            idempotency_key=f"{student_id}-{rng.randrange(4)}" if rng.random() < 0.3 else None)
+        if order is not None:
+            placed.add(order.order_id)  # a repeated key returns an order already counted
+    elif action < 0.95:
+        orders, _ = models.get_student_orders(student_id, 1, 5)
+        if orders:
+            models.cancel_order(rng.choice(orders).order_id)
+    else:
+        models.update_orders_status(
+            rng.choice(models.PREPARATION_STATUSES), time_slot=rng.choice(time_slots),
+            location=rng.choice(locations), current_status=rng.choice(models.PREPARATION_STATUSES))
+    return 0
+
+
+def stress_worker(barrier, rng, students, meal_ids, time_slots, locations, rounds, tally):
+    """One thread's share of the stress run: cart changes, checkouts, cancels, kitchen updates"""
+    added = 0
+    placed = set()
+    barrier.wait()
+    try:
+        for _ in range(rounds):
+            added += stress_round(rng, rng.choice(students), meal_ids, time_slots, locations, placed)
+    except Exception:
+        with tally['lock']:
+            tally['errors'] += 1
+        raise
+    finally:
+        with tally['lock']:
+            tally['added'] += added
+            tally['placed'] |= placed
+
+
+def run_stress(args):
+    """Many threads on a few students' carts at once, then check nothing was lost or doubled"""
+    logging.getLogger().setLevel(logging.WARNING)
+    import models
+    from models import User, get_time_slots, get_pickup_locations, load_menu
+    # Switch threads far more often than usual to shake out races
+    sys.setswitchinterval(1e-5)
+    time_slots = get_time_slots()
+    locations = [location['name'] for location in get_pickup_locations()]
+    meal_ids = [str(meal['id']) for meal in load_menu()['meals']]
+    students = [f"stress{number:04d}" for number in range(args.students)]
+    store = models.store
+
+    # Everyone registers every student at once; each ID must be taken exactly once
+    registered = []
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        registered = list(pool.map(
+            lambda student_id: store.add_user(User(student_id, student_id, f"{student_id}@school.edu")),
+            students * 4))
+
+    tally = {'lock': threading.Lock(), 'added': 0, 'placed': set(), 'errors': 0}
+    barrier = threading.Barrier(args.threads)
+    start = time.perf_counter()
+    threads = [threading.Thread(target=stress_worker, args=(
+        barrier, random.Random(args.seed + number), students, meal_ids, time_slots, locations,
+        args.rounds, tally)) for number in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    orders = [order for student_id in students
+              for order in store.get_student_orders(student_id, 1, 10 ** 6)[0]]
+    carts = [store.get_cart(student_id) for student_id in students]
+    carts = [cart for cart in carts if cart is not None]
+    seated = {slot: 0 for slot in time_slots}
+    for order in orders:
+        if order.status != 'cancelled':
+            seated[order.pickup_time] += 1
+    in_orders = sum(item.quantity for order in orders for item in order.items)
+    in_carts = sum(item.quantity for cart in carts for item in cart.items.values())
+    slot_counts = store.slot_counts()
+
+    checks = [
+        ("no operation raised", tally['errors'] == 0),
+        ("each student registered once", sum(registered) == len(students)),
+        ("order IDs unique", len({order.order_id for order in orders}) == len(orders)),
+        ("every checkout stored", {order.order_id for order in orders} == tally['placed']),
+        ("slot seats match live orders", all(slot_counts.get(slot, 0) == seated[slot]
+                                             for slot in time_slots)),
+        ("no slot over capacity", all(count <= models.MAX_SLOT_CAPACITY
+                                      for count in slot_counts.values())),
+        ("order totals match their lines", all(
+            order.total_price == sum(item.get_total_price() for item in order.items)
+            for order in orders)),
+        ("cart totals match their items", all(
+            cart.get_total_items() == sum(item.quantity for item in cart.items.values())
+            and cart.get_total_price() == sum(item.get_total_price() for item in cart.items.values())
+            for cart in carts)),
+        ("no cart item lost or doubled", tally['added'] == in_orders + in_carts),
+    ]
+    operations = args.threads * args.rounds
+    print(f"{args.threads} threads x {args.rounds} operations on {args.students} students "
+          f"in {elapsed:.2f}s ({operations / elapsed:.0f} ops/s), {len(orders)} orders\n")
+    for name, passed in checks:
+        print(f"{'ok' if passed else 'FAILED':<8}{name}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'threads': args.threads, 'rounds': args.rounds, 'students': args.students,
+                       'seconds': elapsed, 'orders': len(orders),
+                       'checks': {name: passed for name, passed in checks}}, f, indent=2)
+    return 0 if all(passed for _, passed in checks) else 1
+
+
+def run_roster(args):
+    """Import the same roster with more and more hashing processes"""
+    logging.getLogger().setLevel(logging.WARNING)
+    import io
+    from roster import import_roster
+    counts = sorted({1, 2, 4, 8, 16, args.workers} & set(range(1, args.workers + 1)))
+    results = {'students': args.students, 'users_per_second': {}}
+    print(f"{args.students} students per import\n")
+    print(f"{'workers':<10}{'seconds':>9}{'users/s':>10}{'speedup':>9}")
+    baseline = None
+    for workers in counts:
+        rows = "".join(f"roster{workers}-{number},Student {number},s{number}@school.edu,pass{number:06d}\n"
+                       for number in range(args.students))
+        stream = io.StringIO("student_id,name,email,password\n" + rows, newline='')
+        start = time.perf_counter()
+        report = import_roster(stream, 'csv', workers=workers)
+        elapsed = time.perf_counter() - start
+        if report.created != args.students:
+            print(f"only {report.created} of {args.students} students created", file=sys.stderr)
+            return 1
+        rate = args.students / elapsed
+        baseline = baseline or rate
+        results['users_per_second'][workers] = rate
+        print(f"{workers:<10}{elapsed:>9.2f}{rate:>10.0f}{rate / baseline:>8.1f}x")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    load = commands.add_parser('load', help='simulate a lunch rush and report per-route latency')
+    load.add_argument('--students', type=int, default=BASE_STUDENTS,
+                      help='students at scale 1 (default: %(default)s)')
+    load.add_argument('--scale', type=float, default=1,
+                      help='multiply the student count, e.g. 10 or 100')
+    load.add_argument('--mix', type=parse_mix, default=MIXES['lunch-rush'],
+                      help=f"one of {', '.join(MIXES)} or flow=weight,... (default: lunch-rush)")
+    load.add_argument('--concurrency', type=int, default=8, help='students active at once')
+    load.add_argument('--seed', type=int, default=1, help='random seed for a reproducible run')
+    load.add_argument('--url', help='benchmark a server that is already running')
+    load.add_argument('--gunicorn', action='store_true', help='start a local gunicorn to benchmark')
+    load.add_argument('--workers', type=int, default=2, help='gunicorn workers (with --gunicorn)')
+    load.add_argument('--threads', type=int, default=8, help='threads per gunicorn worker')
+    load.add_argument('--json', help='also write results to this file')
+    load.set_defaults(func=run_load)
+
+    memory = commands.add_parser('memory', help='compare memory per stored order')
+    memory.add_argument('--orders', type=int, default=20000, help='orders to build')
+    memory.add_argument('--seed', type=int, default=1, help='random seed for a reproducible run')
+    memory.add_argument('--json', help='also write results to this file')
+    memory.set_defaults(func=run_memory)
+
+    journal = commands.add_parser('journal', help='measure journal write throughput and recovery time')
+    journal.add_argument('--orders', type=int, default=20000, help='orders to journal')
+    journal.add_argument('--concurrency', type=int, default=16, help='threads placing orders')
+    journal.add_argument('--snapshot-every', type=int, default=5000,
+                         help='records between snapshots for the snapshot run')
+    journal.add_argument('--seed', type=int, default=1, help='random seed for a reproducible run')
+    journal.add_argument('--json', help='also write results to this file')
+    journal.set_defaults(func=run_journal)
+
+    stress = commands.add_parser('stress', help='hammer carts and checkout from many threads')
+    stress.add_argument('--threads', type=int, default=64, help='threads running at once')
+    stress.add_argument('--rounds', type=int, default=300, help='operations per thread')
+    stress.add_argument('--students', type=int, default=40,
+                        help='students shared by all threads (fewer means more contention)')
+    stress.add_argument('--seed', type=int, default=1, help='random seed for a reproducible run')
+    stress.add_argument('--json', help='also write results to this file')
+    stress.set_defaults(func=run_stress)
+
+    roster = commands.add_parser('roster', help='measure bulk roster import throughput')
+    roster.add_argument('--students', type=int, default=500, help='students per import')
+    roster.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='most hashing processes to try (default: %(default)s)')
+    roster.add_argument('--json', help='also write results to this file')
+    roster.set_defaults(func=run_roster)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
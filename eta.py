@@ -0,0 +1,123 @@
+"""Ready-time estimates learned from how fast the kitchen actually works
+
+An order's prep time is
+
+    prep = base + sum(quantity * meal minutes)
+
+A new order is estimated at order time + orders ahead * minutes per order +
+prep. When a slot's queue is recomputed, an order the kitchen is preparing
+is ready at preparing time + prep (or now, if that has passed). The orders
+behind it follow at minutes per order apart, starting from the previous
+order's estimate, and none before now + its own prep. Estimates of orders
+the kitchen has started therefore stay put instead of drifting later on
+every recompute.
+
+Minutes per meal start at the old fixed 2 minutes per item and minutes per
+order at the old 2 minutes per queued order. Both move towards what is
+observed every time an order is marked ready: meal minutes from how long it
+took from "preparing" to "ready", minutes per order from the gaps between
+consecutive ready orders. Updates are exponentially weighted so the
+estimates follow the kitchen as it speeds up or falls behind.
+"""
+import threading
+from datetime import timedelta
+
+# Fixed minutes every order takes regardless of its contents
+BASE_MINUTES = 5
+# Starting guesses until the kitchen has been observed
+DEFAULT_MEAL_MINUTES = 2.0
+DEFAULT_ORDER_MINUTES = 2.0
+# Weight of each new observation in the moving averages
+LEARNING_RATE = 0.2
+# Gaps between ready orders longer than this are idle time, not throughput
+MAX_ORDER_GAP_MINUTES = 30
+# Estimates that move by less than this are not rewritten
+MIN_CHANGE = timedelta(seconds=30)
+
+
+class EtaEngine:
+    """Learned per-meal prep minutes and kitchen throughput"""
+    def __init__(self, learning_rate=LEARNING_RATE):
+        self.learning_rate = learning_rate
+        self._meal_minutes = {}  # meal_id -> learned minutes per unit
+        self._order_minutes = DEFAULT_ORDER_MINUTES
+        self._last_ready = None
+        self._lock = threading.Lock()
+
+    def meal_minutes(self, meal_id):
+        return self._meal_minutes.get(meal_id, DEFAULT_MEAL_MINUTES)
+
+    def minutes_per_order(self):
+        """Minutes each queued order ahead adds to the wait"""
+        return self._order_minutes
+
+    def prep_minutes(self, items):
+        """Minutes the kitchen needs for one order once it starts on it"""
+        meal_minutes = self._meal_minutes
+        return BASE_MINUTES + sum(
+            item.quantity * meal_minutes.get(item.meal_id, DEFAULT_MEAL_MINUTES) for item in items)
+
+    def observe_ready(self, orders, ready_time):
+        """Learn from orders that were marked ready together at ready_time"""
+        if not orders:
+            return
+        rate = self.learning_rate
+        with self._lock:
+            last_ready = self._last_ready
+            if last_ready is not None:
+                gap = (ready_time - last_ready).total_seconds() / 60 / len(orders)
+                if 0 <= gap * len(orders) <= MAX_ORDER_GAP_MINUTES:
+                    self._order_minutes += rate * (gap - self._order_minutes)
+            for order in orders:
+                # Orders that skipped "preparing" say nothing about prep time
+                if order.preparing_time is None:
+                    continue
+                service = (ready_time - order.preparing_time).total_seconds() / 60
+                quantity = sum(item.quantity for item in order.items)
+                if quantity <= 0 or service <= 0:
+                    continue
+                per_unit = max(service - BASE_MINUTES, 0) / quantity
+                for item in order.items:
+                    current = self._meal_minutes.get(item.meal_id, DEFAULT_MEAL_MINUTES)
+                    self._meal_minutes[item.meal_id] = current + rate * (per_unit - current)
+            self._last_ready = max(ready_time, last_ready) if last_ready else ready_time
+
+    def train(self, orders):
+        """Warm up from past orders that have an actual_ready_time"""
+        batch = []
+        for order in sorted(orders, key=lambda order: order.actual_ready_time):
+            if batch and order.actual_ready_time != batch[0].actual_ready_time:
+                self.observe_ready(batch, batch[0].actual_ready_time)
+                batch = []
+            batch.append(order)
+        if batch:
+            self.observe_ready(batch, batch[0].actual_ready_time)
+
+    def recompute(self, queue, now):
+        """Re-estimate one slot's pending orders, given in queue order, as a batch
+
+        Orders being prepared are ready prep after they were started. Each
+        waiting order follows the one ahead of it by minutes per order, so
+        the estimates are a running maximum over the queue computed in one
+        pass. Sets estimated_ready_time on orders whose estimate moved and
+        returns them.
+        """
+        if not queue:
+            return []
+        step = timedelta(minutes=self._order_minutes)
+        preps = [timedelta(minutes=self.prep_minutes(order.items)) for order in queue]
+        changed = []
+        previous = None
+        for order, prep in zip(queue, preps):
+            if order.preparation_status == 'preparing' and order.preparing_time is not None:
+                estimate = max(now, order.preparing_time + prep)
+            elif previous is None:
+                estimate = now + prep
+            else:
+                estimate = max(now + prep, previous + step)
+            previous = estimate
+            current = order.estimated_ready_time
+            if current is None or abs(estimate - current) >= MIN_CHANGE:
+                order.estimated_ready_time = estimate
+                changed.append(order)
+        return changed
@@ -0,0 +1,181 @@
+"""Append-only journal with group commit and snapshots
+
+Records are JSON objects written one per line to numbered segment files. A
+single flusher thread writes whatever has queued up since its last write and
+fsyncs once for the whole batch, so concurrent writers share one fsync.
+append() returns once its record is on disk.
+
+A snapshot is the store's full state at the start of a segment. Startup loads
+the newest snapshot and replays only the segments from that point on; older
+segments and snapshots are deleted once a newer snapshot is safely written.
+
+    journal-000000000001.jsonl     records 1..N
+    snapshot-000000000420.json     state before record 420
+    journal-000000000420.jsonl     records 420..
+"""
+import json
+import os
+import re
+import threading
+
+SEGMENT_PATTERN = re.compile(r'^journal-(\d+)\.jsonl$')
+SNAPSHOT_PATTERN = re.compile(r'^snapshot-(\d+)\.json$')
+
+
+def _fsync_directory(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Journal:
+    """Durable, ordered record log for one process"""
+    def __init__(self, directory, fsync=True):
+        self.directory = directory
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+        self._cond = threading.Condition()
+        self._pending = []
+        self._appended = 0  # sequence number of the last appended record
+        self._durable = 0  # sequence number of the last record on disk
+        self._segment = None
+        self._file = None
+        self._rotate_requested = False
+        self._error = None
+        self._flusher = None
+
+    def _files(self, pattern):
+        """(number, filename) pairs in the journal directory matching pattern, oldest first"""
+        found = []
+        for name in os.listdir(self.directory):
+            match = pattern.match(name)
+            if match:
+                found.append((int(match.group(1)), name))
+        return sorted(found)
+
+    def recover(self):
+        """Return the newest snapshot (or None) and the records written after it
+
+        Must be called once, before the first append. A torn final line left
+        by a crash mid-write is ignored.
+        """
+        snapshot = None
+        start = 1
+        for number, name in reversed(self._files(SNAPSHOT_PATTERN)):
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue  # incomplete snapshot; fall back to an older one
+            start = number
+            break
+
+        records = []
+        seq = start - 1
+        for number, name in self._files(SEGMENT_PATTERN):
+            if number < start:
+                continue
+            seq = max(seq, number - 1)
+            with open(os.path.join(self.directory, name)) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    records.append(record)
+                    seq += 1
+        self._appended = self._durable = seq
+        self._open_segment(seq + 1)
+        return snapshot, records
+
+    @property
+    def last_seq(self):
+        """Sequence number of the last record appended"""
+        return self._appended
+
+    def _open_segment(self, first_seq):
+        self._segment = first_seq
+        path = os.path.join(self.directory, f"journal-{first_seq:012d}.jsonl")
+        self._file = open(path, 'a', encoding='utf-8')
+        _fsync_directory(self.directory)
+
+    def _start_flusher(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_forever, daemon=True,
+                                             name='journal-flusher')
+            self._flusher.start()
+
+    def append(self, record):
+        """Write a record and wait until it (and its batch) is on disk"""
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with self._cond:
+            self._start_flusher()
+            self._pending.append(line)
+            self._appended += 1
+            seq = self._appended
+            self._cond.notify_all()
+            while self._durable < seq and self._error is None:
+                self._cond.wait()
+            if self._error is not None:
+                raise self._error
+        return seq
+
+    def _flush_forever(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._rotate_requested:
+                    self._cond.wait()
+                batch, self._pending = self._pending, []
+                target = self._appended
+                rotate = self._rotate_requested
+            try:
+                if batch:
+                    self._file.write(''.join(batch))
+                    self._file.flush()
+                    if self.fsync:
+                        os.fsync(self._file.fileno())
+                if rotate:
+                    self._file.close()
+                    self._open_segment(target + 1)
+            except OSError as error:
+                with self._cond:
+                    self._error = error
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self._durable = target
+                if rotate:
+                    self._rotate_requested = False
+                self._cond.notify_all()
+
+    def rotate(self):
+        """Close the current segment and start a new one, returning its first sequence number"""
+        with self._cond:
+            self._start_flusher()
+            self._rotate_requested = True
+            self._cond.notify_all()
+            while self._rotate_requested and self._error is None:
+                self._cond.wait()
+            if self._error is not None:
+                raise self._error
+            return self._segment
+
+    def write_snapshot(self, segment, state):
+        """Store state as of the start of segment, then drop what it supersedes"""
+        path = os.path.join(self.directory, f"snapshot-{segment:012d}.json")
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        _fsync_directory(self.directory)
+
+        for number, name in self._files(SNAPSHOT_PATTERN):
+            if number < segment:
+                os.remove(os.path.join(self.directory, name))
+        for number, name in self._files(SEGMENT_PATTERN):
+            if number < segment:
+                os.remove(os.path.join(self.directory, name))
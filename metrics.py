@@ -0,0 +1,199 @@
+"""Low-overhead timers, counters and gauges exposed in Prometheus text format
+
+Recording a sample costs two clock reads, a bisect and a short lock, so the
+instrumentation stays on in production. Gauges are callbacks evaluated only
+when /metrics is scraped. Each gunicorn worker keeps its own histograms and
+counters; gauges read from the shared store report the same value everywhere.
+"""
+import bisect
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import Response, g, request, before_render_template, template_rendered
+
+# Latency buckets in seconds, from sub-millisecond lookups to slow checkouts
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Histogram:
+    """Latency histogram keyed by a tuple of label values"""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for label_values, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_labels(self.label_names, label_values, le)}", cumulative
+            yield f"{self.name}_sum{_labels(self.label_names, label_values)}", series[-1]
+            yield f"{self.name}_count{_labels(self.label_names, label_values)}", cumulative
+
+
+class Counter:
+    """Monotonic counter keyed by a tuple of label values"""
+    kind = 'counter'
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values=(), amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            snapshot = dict(self._values)
+        for label_values, value in sorted(snapshot.items()):
+            yield f"{self.name}{_labels(self.label_names, label_values)}", value
+
+
+class Gauge:
+    """Value computed by a callback at scrape time
+
+    The callback returns a number, or a dict of label-value tuples to numbers.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, callback, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback
+        self.label_names = tuple(label_names)
+
+    def samples(self):
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for label_values, value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.label_names, label_values)}", value
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, value in metric.samples():
+                lines.append(f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    'quickbite_request_duration_seconds', 'Time to handle a request, by route',
+    ('method', 'route')))
+REQUESTS = REGISTRY.register(Counter(
+    'quickbite_requests_total', 'Requests handled, by route and status code',
+    ('method', 'route', 'status')))
+FUNCTION_DURATION = REGISTRY.register(Histogram(
+    'quickbite_function_duration_seconds', 'Time spent in instrumented model functions',
+    ('function',)))
+TEMPLATE_DURATION = REGISTRY.register(Histogram(
+    'quickbite_template_render_seconds', 'Time to render a Jinja template', ('template',)))
+
+
+def gauge(name, help_text, callback, label_names=()):
+    """Register a gauge whose value is read from callback when scraped"""
+    return REGISTRY.register(Gauge(name, help_text, callback, label_names))
+
+
+def timed(function_name):
+    """Decorator recording a function's duration in quickbite_function_duration_seconds"""
+    labels = (function_name,)
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                FUNCTION_DURATION.observe(labels, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def _route_label():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+def init_app(app):
+    """Time every request and template render, and serve /metrics"""
+    @app.before_request
+    def start_request_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            route = _route_label()
+            REQUEST_DURATION.observe((request.method, route), time.perf_counter() - start)
+            REQUESTS.inc((request.method, route, str(response.status_code)))
+        return response
+
+    def start_template_timer(sender, template, context, **extra):
+        g.setdefault('metrics_templates', []).append(time.perf_counter())
+
+    def record_template(sender, template, context, **extra):
+        starts = g.get('metrics_templates')
+        if starts:
+            TEMPLATE_DURATION.observe((template.name,), time.perf_counter() - starts.pop())
+
+    before_render_template.connect(start_template_timer, app, weak=False)
+    template_rendered.connect(record_template, app, weak=False)
+
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus scrape endpoint (protected by METRICS_TOKEN when set)"""
+        token = os.environ.get('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f"Bearer {token}":
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
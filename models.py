@@ -1,7 +1,35 @@
+import hashlib
 import json
+import logging
+import multiprocessing
 import os
-from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager, nullcontext
+from datetime import datetime, timedelta
+import metrics
+from passwords import PasswordHasher, HasherBusy
+from archive import OrderArchive
+from eta import EtaEngine
+from recommend import rank_pickups
+from storage import create_store, order_record, order_from_record
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Hashing runs on a bounded pool so login storms cannot starve other pages
+password_hasher = PasswordHasher()
+
+@metrics.timed('hash_password')
+def hash_password(password):
+    """Hash a password on the hashing pool (raises HasherBusy when saturated)"""
+    return password_hasher.hash(password)
+
+@metrics.timed('verify_password')
+def verify_password(password_hash, password):
+    """Check a password on the hashing pool (raises HasherBusy when saturated)"""
+    return password_hasher.check(password_hash, password)
 
 class User:
     """Simple user class for mock authentication"""
@@ -9,108 +37,206 @@ class User:
         self.student_id = student_id
         self.name = name
         self.email = email
-        self.password_hash = generate_password_hash(password) if password else None
+        self.password_hash = hash_password(password) if password else None
         self.is_admin = False
     
     def check_password(self, password):
         if self.password_hash is None:
             return False
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+
+class MealRef:
+    """A meal's id, name and price as ordered, shared by every line that orders it"""
+    __slots__ = ('meal_id', 'name', 'price')
+
+    def __init__(self, meal_id, name, price):
+        self.meal_id = meal_id
+        self.name = name
+        self.price = price
+
+# (meal_id, name, price) -> MealRef; a handful of entries per menu item
+_meal_refs = {}
+
+def meal_ref(meal_id, meal_name, meal_price):
+    """Return the shared MealRef for a meal at a given name and price"""
+    key = (meal_id, meal_name, meal_price)
+    ref = _meal_refs.get(key)
+    if ref is None:
+        ref = _meal_refs.setdefault(key, MealRef(meal_id, meal_name, meal_price))
+    return ref
 
 class CartItem:
-    """Cart item class to store individual items in cart"""
+    """Cart item class to store individual items in cart (also used as order lines)"""
+    __slots__ = ('meal', 'quantity')
+
     def __init__(self, meal_id, meal_name, meal_price, quantity=1):
-        self.meal_id = meal_id
-        self.meal_name = meal_name
-        self.meal_price = meal_price
+        self.meal = meal_ref(meal_id, meal_name, meal_price)
         self.quantity = quantity
+
+    @classmethod
+    def from_meal(cls, meal, quantity):
+        item = cls.__new__(cls)
+        item.meal = meal
+        item.quantity = quantity
+        return item
+
+    @property
+    def meal_id(self):
+        return self.meal.meal_id
+
+    @property
+    def meal_name(self):
+        return self.meal.name
+
+    @property
+    def meal_price(self):
+        return self.meal.price
     
     def get_total_price(self):
-        return self.meal_price * self.quantity
+        return self.meal.price * self.quantity
 
 class Cart:
-    """Shopping cart class to manage user's cart items"""
+    """Shopping cart class to manage user's cart items
+    
+    Item count and price totals are kept up to date as items change, so
+    reading them never iterates the items.
+    """
+    __slots__ = ('student_id', 'items', 'pickup_time', 'pickup_location', 'created_at',
+                 '_total_items', '_total_price')
+
     def __init__(self, student_id):
         self.student_id = student_id
         self.items = {}  # meal_id -> CartItem
         self.pickup_time = None
         self.pickup_location = None
         self.created_at = datetime.now()
+        self._total_items = 0
+        self._total_price = 0
+    
+    def _set_quantity(self, item, quantity):
+        """Change an item's quantity and the running totals with it"""
+        delta = quantity - item.quantity
+        item.quantity = quantity
+        self._total_items += delta
+        self._total_price += item.meal.price * delta
     
     def add_item(self, meal_id, meal_name, meal_price, quantity=1):
-        if meal_id in self.items:
-            self.items[meal_id].quantity += quantity
-        else:
-            self.items[meal_id] = CartItem(meal_id, meal_name, meal_price, quantity)
+        item = self.items.get(meal_id)
+        if item is None:
+            item = self.items[meal_id] = CartItem(meal_id, meal_name, meal_price, 0)
+        self._set_quantity(item, item.quantity + quantity)
     
     def remove_item(self, meal_id):
-        if meal_id in self.items:
-            del self.items[meal_id]
+        item = self.items.pop(meal_id, None)
+        if item is not None:
+            if self.items:
+                self._total_items -= item.quantity
+                self._total_price -= item.get_total_price()
+            else:
+                # Start an empty cart from exact zeros rather than float leftovers
+                self._total_items = 0
+                self._total_price = 0
     
     def update_quantity(self, meal_id, quantity):
         if meal_id in self.items:
             if quantity <= 0:
                 self.remove_item(meal_id)
             else:
-                self.items[meal_id].quantity = quantity
+                self._set_quantity(self.items[meal_id], quantity)
+    
+    def order_lines(self):
+        """Snapshot the cart as order lines that later cart changes do not affect"""
+        return tuple(CartItem.from_meal(item.meal, item.quantity) for item in self.items.values())
     
     def get_total_price(self):
-        return sum(item.get_total_price() for item in self.items.values())
+        return self._total_price
     
     def get_total_items(self):
-        return sum(item.quantity for item in self.items.values())
+        return self._total_items
     
     def clear(self):
         self.items.clear()
+        self._total_items = 0
+        self._total_price = 0
         self.pickup_time = None
         self.pickup_location = None
     
     def is_empty(self):
         return len(self.items) == 0
 
+# Kitchen preparation statuses, in order
+PREPARATION_STATUSES = ['received', 'preparing', 'ready', 'delivered']
+# Order statuses; both status fields are stored as small ints on the order
+ORDER_STATUSES = ['confirmed', 'cancelled']
+_PREPARATION_CODES = {status: code for code, status in enumerate(PREPARATION_STATUSES)}
+_ORDER_CODES = {status: code for code, status in enumerate(ORDER_STATUSES)}
+
 class Order:
-    """Order class to store order information"""
+    """Order class to store order information
+
+    Orders accumulate all term, so they are slotted, keep their lines as a
+    tuple of shared MealRefs, store statuses as small ints and intern the
+    strings that repeat across orders.
+    """
+    __slots__ = ('order_id', 'student_id', 'student_name', 'items', 'total_price',
+                 'pickup_time', 'pickup_location', 'order_time', '_status', '_preparation',
+                 'estimated_ready_time', 'preparing_time', 'actual_ready_time', 'delivered_time',
+                 'version')
+
     def __init__(self, order_id, student_id, student_name, items, total_price,
                  pickup_time, pickup_location, order_time=None):
         self.order_id = order_id
-        self.student_id = student_id
-        self.student_name = student_name
-        self.items = items  # List of CartItem objects
+        self.student_id = sys.intern(student_id)
+        self.student_name = sys.intern(student_name)
+        self.items = tuple(items)  # CartItem order lines
         self.total_price = total_price
-        self.pickup_time = pickup_time
-        self.pickup_location = pickup_location
+        self.pickup_time = sys.intern(pickup_time)
+        self.pickup_location = sys.intern(pickup_location)
         self.order_time = order_time or datetime.now()
-        self.status = "confirmed"
-        self.preparation_status = "received"  # received, preparing, ready, delivered
+        self._status = 0  # confirmed
+        self._preparation = 0  # received, preparing, ready, delivered
         self.estimated_ready_time = None
+        self.preparing_time = None
         self.actual_ready_time = None
         self.delivered_time = None
+        self.version = 0  # store-wide change counter value of the last change
+
+    @property
+    def status(self):
+        return ORDER_STATUSES[self._status]
+
+    @status.setter
+    def status(self, value):
+        self._status = _ORDER_CODES[value]
+
+    @property
+    def preparation_status(self):
+        return PREPARATION_STATUSES[self._preparation]
+
+    @preparation_status.setter
+    def preparation_status(self, value):
+        self._preparation = _PREPARATION_CODES[value]
         
+    @metrics.timed('calculate_estimated_ready_time')
     def calculate_estimated_ready_time(self):
-        """Calculate estimated preparation time based on items and current queue"""
-        # Base preparation time per item (in minutes)
-        base_prep_time = 5
-        # Additional time based on number of items
-        item_count = sum(item.quantity for item in self.items)
-        total_prep_time = base_prep_time + (item_count * 2)
+        """Estimate when the order will be ready from learned prep times and the queue"""
+        # Prep time for this order's meals, learned from past ready times
+        total_prep_time = eta_engine.prep_minutes(self.items)
         
         # Add queue delay based on orders in same time slot
-        from datetime import timedelta
         queue_delay = self.calculate_queue_delay()
         
         self.estimated_ready_time = self.order_time + timedelta(minutes=total_prep_time + queue_delay)
         return self.estimated_ready_time
     
+    @metrics.timed('calculate_queue_delay')
     def calculate_queue_delay(self):
         """Calculate additional delay based on orders ahead in queue"""
-        # Get orders in same time slot placed before this order
-        same_slot_orders = [order for order in orders_db.values() 
-                           if order.pickup_time == self.pickup_time 
-                           and order.order_time < self.order_time
-                           and order.status in ['confirmed', 'preparing']]
+        # Orders in the same time slot placed before this one and not yet ready
+        orders_ahead = store.orders_ahead(self)
         
-        # Each order ahead adds 2 minutes delay
-        return len(same_slot_orders) * 2
+        # Each order ahead adds the kitchen's observed minutes per order
+        return orders_ahead * eta_engine.minutes_per_order()
     
     def get_delivery_progress(self):
         """Get current delivery progress percentage"""
@@ -128,32 +254,135 @@ class Order:
             self.calculate_estimated_ready_time()
         return self.estimated_ready_time
     
-    def update_status(self, new_status):
-        """Update order status and timestamps"""
+    def apply_status(self, new_status, now=None):
+        """Set the preparation status and stamp preparing/ready/delivered times, without saving"""
+        now = now or datetime.now()
         self.preparation_status = new_status
-        if new_status == 'ready' and not self.actual_ready_time:
-            self.actual_ready_time = datetime.now()
+        if new_status == 'preparing' and not self.preparing_time:
+            self.preparing_time = now
+        elif new_status == 'ready' and not self.actual_ready_time:
+            self.actual_ready_time = now
         elif new_status == 'delivered' and not self.delivered_time:
-            self.delivered_time = datetime.now()
+            self.delivered_time = now
+    
+    @metrics.timed('update_status')
+    def update_status(self, new_status):
+        """Update order status and timestamps, starting from the stored order
 
-# In-memory storage for MVP
-users_db = {}
-orders_db = {}
-carts_db = {}  # student_id -> Cart
-order_counter = 1
+        This copy may be stale, so the change is applied to the order as
+        stored now. Returns that order, or None if it no longer exists.
+        """
+        orders, _ = update_orders_status(new_status, order_ids=[self.order_id])
+        return orders[0] if orders else None
 
-# Create admin user
-admin_user = User("admin", "Admin User", "admin@school.edu", "admin123")
-admin_user.is_admin = True
-users_db["admin"] = admin_user
+# Maximum orders per time slot (500 total / 4 time slots)
+MAX_SLOT_CAPACITY = 125
+
+# Storage backend: "memory" keeps state in this process (fast, for development
+# and tests), "journal" does the same but journals changes to survive restarts,
+# "sqlite" shares state between gunicorn workers through one file
+STORE_BACKEND = os.environ.get("QUICKBITE_STORE", "memory")
+if STORE_BACKEND == "journal":
+    STORE_PATH = os.environ.get("QUICKBITE_JOURNAL_DIR", os.path.join(BASE_DIR, 'data', 'journal'))
+else:
+    STORE_PATH = os.environ.get("QUICKBITE_DB_PATH", os.path.join(BASE_DIR, 'data', 'quickbite.db'))
+
+class MenuCatalog:
+    """Menu loaded once from disk and reloaded only when the file changes"""
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.version = 0
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._digest = None
+        self._checked_at = None
+        self._snapshot = self._build({"meals": []})
+
+    def _build(self, data):
+        """Precompute id lookup and category/dietary groupings"""
+        meals = data.get('meals', [])
+        by_id = {}
+        by_category = {}
+        by_dietary = {}
+        for meal in meals:
+            by_id[str(meal['id'])] = meal
+            by_category.setdefault(meal.get('category'), []).append(meal)
+            for diet in meal.get('dietary', []):
+                by_dietary.setdefault(diet, []).append(meal)
+        return {
+            'data': data,
+            'by_id': by_id,
+            'by_category': by_category,
+            'by_dietary': by_dietary
+        }
+
+    def refresh(self):
+        """Reload the menu if the file's mtime and content hash changed"""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if mtime == self._mtime and self._digest is not None:
+                return
+            self._mtime = mtime
+
+            if mtime is None:
+                raw = b''
+                data = {"meals": []}
+            else:
+                with open(self.path, 'rb') as f:
+                    raw = f.read()
+            digest = hashlib.sha1(raw).hexdigest()
+            if digest == self._digest:
+                return
+            if mtime is not None:
+                data = json.loads(raw)
+            self._snapshot = self._build(data)
+            self._digest = digest
+            self.version += 1
+
+    def get_data(self):
+        self.refresh()
+        return self._snapshot['data']
+
+    def get_digest(self):
+        """Content hash of the current menu, the same in every worker process"""
+        self.refresh()
+        return self._digest
+
+    def get_meal(self, meal_id):
+        """Look up a meal by id in O(1)"""
+        self.refresh()
+        return self._snapshot['by_id'].get(str(meal_id))
+
+    def get_meals_by_category(self):
+        self.refresh()
+        return self._snapshot['by_category']
+
+    def get_meals_by_dietary(self):
+        self.refresh()
+        return self._snapshot['by_dietary']
 
+menu_catalog = MenuCatalog(os.path.join(BASE_DIR, 'data', 'menu.json'))
+
+@metrics.timed('load_menu')
 def load_menu():
     """Load menu data from JSON file"""
-    try:
-        with open('data/menu.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {"meals": []}
+    return menu_catalog.get_data()
+
+def get_menu_version():
+    """Version tag of the menu that changes whenever menu.json does"""
+    return menu_catalog.get_digest()
+
+def get_meal(meal_id):
+    """Get a single meal by id, or None if it is not on the menu"""
+    return menu_catalog.get_meal(meal_id)
 
 def get_time_slots():
     """Get available time slots for pickup"""
@@ -164,6 +393,20 @@ def get_time_slots():
         "1:00 PM - 1:30 PM"
     ]
 
+# Status changes and ETA refreshes lock only the slots they touch, so the
+# kitchen working one slot never waits on another
+slot_locks = {time_slot: threading.Lock() for time_slot in get_time_slots()}
+
+@contextmanager
+def locked_slots(time_slots):
+    """Hold the locks of the given slots, always taken in the same order"""
+    with ExitStack() as stack:
+        for time_slot in sorted(set(time_slots)):
+            lock = slot_locks.get(time_slot)
+            if lock is not None:
+                stack.enter_context(lock)
+        yield
+
 def get_pickup_locations():
     """Get available pickup locations with GPS coordinates"""
     return [
@@ -187,96 +430,358 @@ def get_pickup_locations():
         }
     ]
 
+store = create_store(STORE_BACKEND, get_time_slots(), MAX_SLOT_CAPACITY, STORE_PATH)
+
+# Seconds a waiting client sleeps before re-reading the store version. This is
+# also how changes written by other worker processes are picked up.
+CHANGE_POLL_INTERVAL = 2.0
+order_changes = threading.Condition()
+
+# Ready-time estimates, warmed up from orders the kitchen already finished
+eta_engine = EtaEngine()
+eta_engine.train(store.recent_ready_orders(500))
+
+# Create admin user
+if not store.get_user("admin"):
+    admin_user = User("admin", "Admin User", "admin@school.edu", "admin123")
+    admin_user.is_admin = True
+    store.add_user(admin_user)
+
+# Orders shown per page in a student's order history
+ORDERS_PER_PAGE = 20
+# Orders loaded at a time into one slot/location cell of the admin dashboard
+ADMIN_ORDERS_PER_PAGE = 10
+# Cart operations accepted in one batch request
+MAX_CART_OPERATIONS = 50
+# Shortest password accepted at registration or in a roster import
+MIN_PASSWORD_LENGTH = 6
+
+@metrics.timed('create_user')
 def create_user(student_id, name, email, password):
-    """Create a new user"""
-    if student_id in users_db:
+    """Create a new user
+
+    Raises HasherBusy when too many passwords are being hashed already.
+    """
+    if store.get_user(student_id):
         return False, "Student ID already exists"
     
     user = User(student_id, name, email, password)
-    users_db[student_id] = user
+    if not store.add_user(user):
+        return False, "Student ID already exists"
     return True, "User created successfully"
 
+@metrics.timed('create_users')
+def create_users(users):
+    """Create a batch of users whose passwords are already hashed
+
+    users are (student_id, name, email, password_hash) tuples. Returns the
+    student IDs that were created; the others already existed.
+    """
+    new_users = []
+    for student_id, name, email, password_hash in users:
+        user = User(student_id, name, email)
+        user.password_hash = password_hash
+        new_users.append(user)
+    return store.add_users(new_users)
+
+def get_user(student_id):
+    """Get a user by student ID"""
+    return store.get_user(student_id)
+
+@metrics.timed('authenticate_user')
 def authenticate_user(student_id, password):
-    """Authenticate user login"""
-    user = users_db.get(student_id)
+    """Authenticate user login
+
+    Hashes made with an older method or cost are upgraded on a successful
+    login. Raises HasherBusy when too many passwords are being checked already.
+    """
+    user = store.get_user(student_id)
     if user and user.check_password(password):
+        if password_hasher.needs_rehash(user.password_hash):
+            try:
+                user.password_hash = hash_password(password)
+                store.update_password_hash(user.student_id, user.password_hash)
+            except HasherBusy:
+                pass  # upgrade on a later login instead of failing this one
         return user
     return None
 
 # Cart management functions
-def get_or_create_cart(student_id):
-    """Get existing cart or create new one for student"""
-    if student_id not in carts_db:
-        carts_db[student_id] = Cart(student_id)
-    return carts_db[student_id]
+def get_cart(student_id):
+    """Get a student's cart, or an empty one that is not stored
+
+    Carts are only stored once something is added, so students who just
+    browse never take up a cart.
+    """
+    return store.get_cart(student_id) or Cart(student_id)
 
+@metrics.timed('add_to_cart')
 def add_to_cart(student_id, meal_id, meal_name, meal_price, quantity=1):
     """Add item to student's cart"""
-    cart = get_or_create_cart(student_id)
-    cart.add_item(meal_id, meal_name, meal_price, quantity)
-    return cart
+    return store.update_cart(
+        student_id, Cart, lambda cart: cart.add_item(meal_id, meal_name, meal_price, quantity))
 
 def remove_from_cart(student_id, meal_id):
     """Remove item from student's cart"""
-    if student_id in carts_db:
-        carts_db[student_id].remove_item(meal_id)
+    return store.update_cart(student_id, Cart, lambda cart: cart.remove_item(meal_id))
 
 def update_cart_quantity(student_id, meal_id, quantity):
     """Update quantity of item in cart"""
-    if student_id in carts_db:
-        carts_db[student_id].update_quantity(meal_id, quantity)
+    return store.update_cart(
+        student_id, Cart, lambda cart: cart.update_quantity(meal_id, quantity))
 
 def clear_cart(student_id):
     """Clear student's cart"""
-    if student_id in carts_db:
-        carts_db[student_id].clear()
+    if store.get_cart(student_id):
+        store.update_cart(student_id, Cart, lambda cart: cart.clear())
 
-def create_order_from_cart(student_id, student_name, pickup_time, pickup_location):
-    """Create order from cart items"""
-    global order_counter
+@metrics.timed('apply_cart_operations')
+def apply_cart_operations(student_id, operations):
+    """Apply a batch of cart changes all or nothing
     
-    if student_id not in carts_db or carts_db[student_id].is_empty():
-        return None, "Cart is empty"
+    operations is a list of dicts with an "op" of "add" (meal_id, quantity
+    to add), "set" (meal_id, new quantity; 0 removes), "remove" (meal_id) or
+    "clear". Returns (cart, message), with cart None and the cart untouched
+    if any operation is invalid.
+    """
+    if not isinstance(operations, list) or not operations:
+        return None, "No cart operations given"
+    if len(operations) > MAX_CART_OPERATIONS:
+        return None, f"At most {MAX_CART_OPERATIONS} cart operations per request"
     
-    cart = carts_db[student_id]
-    order_id = f"ORD{order_counter:04d}"
+    changes = []
+    for operation in operations:
+        op = operation.get('op') if isinstance(operation, dict) else None
+        if op == 'clear':
+            changes.append((op, None, 0))
+            continue
+        if op not in ('add', 'set', 'remove'):
+            return None, f"Unknown cart operation: {op}"
+        meal = get_meal(operation.get('meal_id'))
+        if not meal:
+            return None, "Invalid meal selection"
+        quantity = operation.get('quantity', 1 if op == 'add' else 0)
+        if op != 'remove' and (type(quantity) is not int or quantity < (1 if op == 'add' else 0)):
+            return None, f"Invalid quantity for {meal['name']}"
+        changes.append((op, meal, quantity))
     
-    # Convert cart items to order items
-    order_items = list(cart.items.values())
-    total_price = cart.get_total_price()
+    def apply(cart):
+        for op, meal, quantity in changes:
+            if op == 'clear':
+                cart.clear()
+            elif op == 'add':
+                cart.add_item(str(meal['id']), meal['name'], meal['price'], quantity)
+            elif op == 'set':
+                meal_id = str(meal['id'])
+                if meal_id in cart.items or quantity <= 0:
+                    cart.update_quantity(meal_id, quantity)
+                else:
+                    cart.add_item(meal_id, meal['name'], meal['price'], quantity)
+            else:
+                cart.remove_item(str(meal['id']))
     
-    order = Order(order_id, student_id, student_name, order_items, total_price,
-                  pickup_time, pickup_location)
+    cart = store.update_cart(student_id, Cart, apply)
+    added = [meal['name'] for op, meal, _ in changes if op == 'add']
+    if len(added) == len(changes):
+        return cart, f"{', '.join(dict.fromkeys(added))} added to cart"
+    return cart, "Cart updated"
+
+# Seconds an order form submission is remembered, to absorb retries
+ORDER_KEY_TTL = 600
+# Submissions remembered at once; the oldest are forgotten first
+ORDER_KEY_LIMIT = 20000
+# Longer keys are not from our forms and are ignored
+ORDER_KEY_MAX_LENGTH = 64
+# SQLite keeps keys in a table every worker process shares; the other stores
+# serve a single process, which keeps them in an OrderKeyCache
+SHARED_ORDER_KEYS = STORE_BACKEND == "sqlite"
+
+class OrderKeyCache:
+    """Bounded TTL map of (student_id, idempotency key) -> placed order id
+    
+    The first submission with a key claims it. Duplicates that arrive while
+    it is still being placed wait for it and get its order; if it failed the
+    key is released and the next duplicate places the order itself. Keys
+    live in this process, so it is only used by the single-process stores.
+    """
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires, order_id or None while placing)
+        self._cond = threading.Condition()
+
+    def _evict(self, now):
+        entries = self._entries
+        while entries:
+            key, (expires, _) = next(iter(entries.items()))
+            # Leave room for the key about to be claimed
+            if expires > now and len(entries) < self.max_entries:
+                return
+            del entries[key]
+
+    def claim(self, key):
+        """Return the order id already placed under key, or None once the caller owns it"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._evict(now)
+                entry = self._entries.get(key)
+                if entry is None:
+                    self._entries[key] = (now + self.ttl, None)
+                    return None
+                if entry[1] is not None:
+                    return entry[1]
+                self._cond.wait()
+
+    def resolve(self, key, order_id):
+        """Record the order placed under a claimed key, or release the key if none was"""
+        with self._cond:
+            if order_id is None:
+                self._entries.pop(key, None)
+            else:
+                self._entries[key] = (time.monotonic() + self.ttl, order_id)
+            self._cond.notify_all()
+
+    def __len__(self):
+        return len(self._entries)
+
+order_keys = OrderKeyCache(ORDER_KEY_TTL, ORDER_KEY_LIMIT)
+
+def _order_key(student_id, idempotency_key):
+    if not idempotency_key or len(idempotency_key) > ORDER_KEY_MAX_LENGTH:
+        return None
+    return (student_id, idempotency_key)
+
+def _order_key_scope(key):
+    """Context that a shared key claim and the order it places are written in together
     
-    # Calculate estimated ready time
-    order.calculate_estimated_ready_time()
+    The claim and the order commit in one transaction, so a duplicate on
+    another worker waits for both and never sees a key without its order.
+    """
+    return store.atomic() if key is not None and SHARED_ORDER_KEYS else nullcontext()
+
+def _claim_order_key(key):
+    """The order a repeated submission already placed, else None (claiming the key)"""
+    if key is None:
+        return None
+    if SHARED_ORDER_KEYS:
+        order_id = store.claim_order_key(key, ORDER_KEY_TTL)
+    else:
+        order_id = order_keys.claim(key)
+    return get_order(order_id) if order_id is not None else None
+
+def _resolve_order_key(key, order):
+    """Record the order placed under a claimed key, or release the key if none was"""
+    if key is None:
+        return
+    order_id = order.order_id if order else None
+    if SHARED_ORDER_KEYS:
+        store.resolve_order_key(key, order_id, ORDER_KEY_TTL)
+    else:
+        order_keys.resolve(key, order_id)
+
+@metrics.timed('create_order_from_cart')
+def create_order_from_cart(student_id, student_name, pickup_time, pickup_location,
+                           idempotency_key=None):
+    """Create order from cart items
     
-    orders_db[order_id] = order
-    order_counter += 1
+    A repeated idempotency_key returns the order its first submission placed
+    without placing another.
+    """
+    key = _order_key(student_id, idempotency_key)
+    with _order_key_scope(key):
+        placed = _claim_order_key(key)
+        if placed:
+            return placed, "Order already placed"
+        order = None
+        try:
+            order, message = _create_order_from_cart(student_id, student_name, pickup_time,
+                                                     pickup_location)
+        finally:
+            _resolve_order_key(key, order)
+    # After the commit, so woken clients can read the order
+    if order:
+        notify_order_change()
+    return order, message
+
+def _create_order_from_cart(student_id, student_name, pickup_time, pickup_location):
+    order = None
+    message = "Cart is empty"
     
-    # Clear cart after order
-    cart.clear()
+    def checkout(cart):
+        # Runs under the student's cart lock, so the cart cannot change (or be
+        # checked out twice) between snapshotting its lines and clearing it
+        nonlocal order, message
+        if cart.is_empty():
+            return
+        
+        if pickup_time not in get_time_slots():
+            message = "Invalid pickup time"
+            return
+        
+        # Snapshot cart items as order lines
+        order_items = cart.order_lines()
+        total_price = cart.get_total_price()
+        
+        placed = Order(None, student_id, student_name, order_items, total_price,
+                       pickup_time, pickup_location)
+        
+        # Reserve a seat in the slot, assign the order ID and estimate ready time
+        if not store.place_order(placed):
+            message = "Sorry, this time slot is full. Please select another time."
+            return
+        
+        # Clear cart after order
+        cart.clear()
+        order = placed
+        message = "Order created successfully"
     
-    return order, "Order created successfully"
+    store.update_cart(student_id, Cart, checkout)
+    return order, message
 
-def create_order(student_id, student_name, meal_name, meal_price, pickup_time, pickup_location):
-    """Create a new order (legacy function for single item orders)"""
-    global order_counter
-    order_id = f"ORD{order_counter:04d}"
+@metrics.timed('create_order')
+def create_order(student_id, student_name, meal_name, meal_price, pickup_time, pickup_location,
+                 idempotency_key=None):
+    """Create a new order (legacy function for single item orders)
     
+    Returns None if the pickup time slot is full. A repeated idempotency_key
+    returns the order its first submission placed.
+    """
+    key = _order_key(student_id, idempotency_key)
+    with _order_key_scope(key):
+        placed = _claim_order_key(key)
+        if placed:
+            return placed
+        order = None
+        try:
+            order = _create_order(student_id, student_name, meal_name, meal_price, pickup_time,
+                                  pickup_location)
+        finally:
+            _resolve_order_key(key, order)
+    if order:
+        notify_order_change()
+    return order
+
+def _create_order(student_id, student_name, meal_name, meal_price, pickup_time, pickup_location):
     # Create single cart item for backward compatibility
     cart_item = CartItem("single", meal_name, meal_price, 1)
     
-    order = Order(order_id, student_id, student_name, [cart_item], meal_price,
+    order = Order(None, student_id, student_name, [cart_item], meal_price,
                   pickup_time, pickup_location)
     
-    # Calculate estimated ready time
-    order.calculate_estimated_ready_time()
-    
-    orders_db[order_id] = order
-    order_counter += 1
+    # Reserve a seat in the slot, assign the order ID and estimate ready time
+    if not store.place_order(order):
+        return None
     return order
 
+def get_order(order_id):
+    """Get an order by ID"""
+    return store.get_order(order_id)
+
+def get_total_orders():
+    """Get the number of orders placed"""
+    return store.count_orders()
+
 def get_orders_by_time_and_location():
     """Get orders grouped by time slot and location for admin dashboard"""
     time_slots = get_time_slots()
@@ -287,21 +792,243 @@ def get_orders_by_time_and_location():
         summary[time_slot] = {}
         for location in locations:
             location_name = location.get('name') if isinstance(location, dict) else location
-            summary[time_slot][location_name] = []
-    
-    for order in orders_db.values():
-        if order.pickup_time in summary and order.pickup_location in summary[order.pickup_time]:
-            summary[order.pickup_time][order.pickup_location].append(order)
+            summary[time_slot][location_name] = store.orders_at(time_slot, location_name)[0]
     
     return summary
 
+def get_order_counts_by_time_and_location():
+    """Get order counts per time slot and location without loading any orders"""
+    counts = store.slot_location_counts()
+    return {
+        time_slot: {location['name']: counts.get((time_slot, location['name']), 0)
+                    for location in get_pickup_locations()}
+        for time_slot in get_time_slots()
+    }
+
+def get_orders_at(time_slot, location, page=1, per_page=ADMIN_ORDERS_PER_PAGE):
+    """Get a page of orders for one time slot and location, and the total there"""
+    return store.orders_at(time_slot, location, page, per_page)
+
+def get_production_plan(by_status=False):
+    """Meal quantities to prepare per time slot and location
+
+    Read from counts kept up to date as orders are placed and change status,
+    never by walking orders. Cancelled orders are left out. Returns
+    {'meals': {meal_id: name}, 'plan': {slot: {location: {meal_id: quantity}}}};
+    with by_status each quantity is {preparation_status: quantity} instead.
+    """
+    meals = {}
+    plan = {}
+    for time_slot, location, meal_id, meal_name, status, quantity in store.production_rows():
+        meals[meal_id] = meal_name
+        cell = plan.setdefault(time_slot, {}).setdefault(location, {})
+        if by_status:
+            cell.setdefault(meal_id, {})[status] = quantity
+        else:
+            cell[meal_id] = cell.get(meal_id, 0) + quantity
+    return {'meals': meals, 'plan': plan}
+
 def get_orders_count_by_time_slot():
     """Get order counts by time slot to check capacity"""
-    time_slots = get_time_slots()
-    counts = {slot: 0 for slot in time_slots}
+    return store.slot_counts()
+
+@metrics.timed('recommend_pickups')
+def recommend_pickups(origin=None, limit=None):
+    """Open (slot, location) pairs ranked by queue depth and distance from origin
+
+    origin is the student's (lat, lng), if known. Reads only the per-slot
+    and per-location counts the store keeps, never the orders themselves.
+    """
+    ranked = rank_pickups(get_time_slots(), get_pickup_locations(), store.slot_counts(),
+                          store.queue_depths(), MAX_SLOT_CAPACITY,
+                          eta_engine.minutes_per_order(), origin)
+    return ranked if limit is None else ranked[:limit]
+
+@metrics.timed('get_student_orders')
+def get_student_orders(student_id, page=1, per_page=ORDERS_PER_PAGE):
+    """Get a page of a student's orders (newest first) and their total count
+
+    Current orders come first, then archived ones read from the archive.
+    """
+    orders, hot_total = store.get_student_orders(student_id, page, per_page)
+    archived_total = order_archive.count(student_id)
+    if len(orders) < per_page and archived_total:
+        offset = max((page - 1) * per_page - hot_total, 0)
+        records = order_archive.student_records(student_id, offset, per_page - len(orders))
+        orders = orders + [order_from_record(record) for record in records]
+    return orders, hot_total + archived_total
+
+def get_student_order(student_id, order_id):
+    """Get an order only if it belongs to the given student (archived orders included)"""
+    order = store.get_student_order(student_id, order_id)
+    if order is None:
+        record = order_archive.student_record(student_id, order_id)
+        if record is not None:
+            order = order_from_record(record)
+    return order
+
+@metrics.timed('update_orders_status')
+def update_orders_status(new_status, order_ids=None, time_slot=None, location=None,
+                         current_status=None):
+    """Move many orders to a new preparation status in one batch
+    
+    Orders are picked either by explicit order_ids or by the selector
+    time_slot + location + current_status. Returns (orders, message); orders
+    is None and nothing changes if any requested order ID is unknown.
+    """
+    if new_status not in PREPARATION_STATUSES:
+        return None, "Invalid status"
     
-    for order in orders_db.values():
-        if order.pickup_time in counts:
-            counts[order.pickup_time] += 1
+    if order_ids:
+        found = store.get_orders(order_ids)
+        missing = [order_id for order_id in order_ids if order_id not in found]
+        if missing:
+            return None, f"Orders not found: {', '.join(missing)}"
+        time_slots = {order.pickup_time for order in found.values()}
+    elif time_slot and location and current_status:
+        time_slots = [time_slot]
+    else:
+        return None, "Give order IDs or a time slot, location and current status"
+    
+    with locked_slots(time_slots), store.atomic():
+        # Read under the locks (and, on SQLite, inside the write transaction
+        # shared by every worker), so a change made meanwhile, say a cancel
+        # or a ready stamp, is not overwritten with the state read before it
+        if order_ids:
+            orders = list(store.get_orders(order_ids).values())
+        else:
+            orders = store.find_orders(time_slot, location, current_status)
+        now = datetime.now()
+        not_ready = {order.order_id for order in orders if order.actual_ready_time is None}
+        for order in orders:
+            order.apply_status(new_status, now)
+        store.orders_updated(orders)
+        if orders:
+            order_statuses_changed(orders, not_ready, now)
+    if orders:
+        notify_order_change()
+    return orders, f"{len(orders)} orders updated to {new_status}"
+
+def cancel_order(order_id):
+    """Cancel an order and free its seat in the time slot"""
+    order = store.get_order(order_id)
+    if not order:
+        return False
+    with locked_slots([order.pickup_time]):
+        cancelled = store.cancel_order(order_id)
+        if cancelled:
+            refresh_estimates([order.pickup_time])
+    if cancelled:
+        notify_order_change()
+    return cancelled
+
+def order_statuses_changed(orders, not_ready_before, now=None):
+    """Learn from orders that just became ready and re-estimate their slots' queues"""
+    now = now or datetime.now()
+    newly_ready = [order for order in orders
+                   if order.order_id in not_ready_before and order.actual_ready_time]
+    eta_engine.observe_ready(newly_ready, now)
+    refresh_estimates({order.pickup_time for order in orders}, now)
+
+def refresh_estimates(time_slots, now=None):
+    """Recompute ETAs of every pending order in the given slots, one batch per slot
+
+    Only orders whose estimate moved are saved, which also pushes the new
+    estimate to tracking pages. Reads keep using the stored estimate. Call
+    with the slots locked (see locked_slots).
+    """
+    now = now or datetime.now()
+    for time_slot in time_slots:
+        changed = eta_engine.recompute(store.pending_orders(time_slot), now)
+        if changed:
+            store.orders_updated(changed)
+
+# Closed orders from previous days are moved here by the daily rollover
+ARCHIVE_DIR = os.environ.get("QUICKBITE_ARCHIVE_DIR", os.path.join(BASE_DIR, 'data', 'archive'))
+order_archive = OrderArchive(ARCHIVE_DIR)
+# Archived IDs are never handed out again, even if the store lost count of them
+store.advance_order_ids(max((int(order_id[3:]) for order_id in order_archive.order_ids()),
+                            default=0))
+
+def archive_closed_orders(before=None):
+    """Move delivered and cancelled orders placed before `before` to the archive
+
+    Defaults to everything closed before midnight today. The orders are on
+    disk in the archive before they leave the hot store, so an interrupted
+    rollover is simply finished by the next one. Only orders whose records
+    are in the archive leave the store. Returns how many moved.
+    """
+    before = before or datetime.combine(datetime.now().date(), datetime.min.time())
+    with order_archive.rollover_lock():
+        orders = store.closed_orders_before(before)
+        if not orders:
+            return 0
+        archived = order_archive.add([order_record(order) for order in orders])
+        if len(archived) < len(orders):
+            logging.getLogger(__name__).warning(
+                "Kept %d closed orders whose IDs are archived for other orders",
+                len(orders) - len(archived))
+        return len(store.drop_orders(archived))
+
+def start_daily_rollover():
+    """Archive closed orders and drop idle carts now and after every midnight, on a daemon thread
+
+    Cart changes already drop a few idle carts each; this catches the rest
+    once the day's traffic has stopped. Does nothing in worker processes
+    (such as roster hashing), which re-import the app module.
+    """
+    if multiprocessing.parent_process() is not None:
+        return
+
+    def rollover_forever():
+        while True:
+            try:
+                archive_closed_orders()
+            except Exception:
+                logging.getLogger(__name__).exception("Order archive rollover failed")
+            try:
+                store.evict_idle_carts()
+            except Exception:
+                logging.getLogger(__name__).exception("Idle cart eviction failed")
+            now = datetime.now()
+            next_run = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+            time.sleep((next_run - now).total_seconds() + 60)
+
+    threading.Thread(target=rollover_forever, daemon=True, name='order-rollover').start()
+
+# Gauges read at scrape time
+metrics.gauge('quickbite_slot_orders', 'Orders holding a seat in each pickup slot',
+              lambda: {(slot,): count for slot, count in store.slot_counts().items()},
+              ('slot',))
+metrics.gauge('quickbite_active_carts', 'Carts with at least one item',
+              lambda: store.count_active_carts())
+metrics.gauge('quickbite_order_keys', 'Order submissions remembered to absorb retries',
+              lambda: store.count_order_keys() if SHARED_ORDER_KEYS else len(order_keys))
+
+# Order change feed for live status updates
+def notify_order_change():
+    """Wake clients waiting in wait_for_order_changes()"""
+    with order_changes:
+        order_changes.notify_all()
+
+def get_order_version():
+    """Get the current store-wide order version"""
+    return store.current_version()
+
+def get_order_changes(since_version):
+    """Get orders changed after since_version, oldest change first"""
+    return store.changes_since(since_version)
+
+def wait_for_order_changes(since_version, timeout):
+    """Block until the order version passes since_version or timeout expires
     
-    return counts
+    Returns the current order version.
+    """
+    deadline = time.monotonic() + timeout
+    with order_changes:
+        while True:
+            version = store.current_version()
+            remaining = deadline - time.monotonic()
+            if version > since_version or remaining <= 0:
+                return version
+            order_changes.wait(min(remaining, CHANGE_POLL_INTERVAL))
@@ -0,0 +1,78 @@
+"""Password hashing off the request threads, with admission control
+
+Hashing is deliberately slow. When hundreds of students log in at 11:25,
+hashing inline lets logins take every CPU the worker has and pages like
+/menu and /cart stall behind them. PasswordHasher runs hashes on a small
+bounded pool instead: at most `workers` hashes run at once, at most
+`queue_depth` more wait, and anything beyond that is refused immediately
+with HasherBusy so the caller can ask the student to try again.
+
+A thread pool is enough because hashlib's scrypt and PBKDF2 release the GIL
+while they run, so request threads keep serving other pages meanwhile.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Werkzeug method string, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000"
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+# Hashes running at once per worker process
+HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+# Hashes allowed to wait for a free slot before new ones are refused
+HASH_QUEUE_DEPTH = int(os.environ.get('PASSWORD_HASH_QUEUE_DEPTH', 32))
+# Longest a request waits for its hash before giving up
+HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+
+
+def hash_passwords(passwords, method=PASSWORD_HASH_METHOD):
+    """Hash a batch of passwords in the calling process
+
+    Used by bulk imports, which hash on a process pool of their own rather
+    than through the request-time PasswordHasher.
+    """
+    return [generate_password_hash(password, method) for password in passwords]
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing pool is saturated; the caller should retry later"""
+
+
+class PasswordHasher:
+    """Bounded pool for hashing and checking passwords"""
+    def __init__(self, method=PASSWORD_HASH_METHOD, workers=HASH_WORKERS,
+                 queue_depth=HASH_QUEUE_DEPTH, timeout=HASH_TIMEOUT):
+        self.method = method
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(workers + queue_depth)
+        self._method_prefix = None
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            future = self._pool.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # The hash still finishes in the background and frees its slot
+            raise HasherBusy() from None
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def check(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True if password_hash was made with a different method or cost"""
+        if self._method_prefix is None:
+            # Werkzeug fills in default parameters, so learn the full prefix once
+            self._method_prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._method_prefix
@@ -0,0 +1,62 @@
+"""Pickup slot and location suggestions that spread the lunch rush
+
+Every (time slot, location) pair gets a score in minutes, lower is better:
+
+    score = queued orders there * minutes per order + distance * walking minutes per km
+
+Queued orders are the ones the kitchen has not finished at that slot and
+location, read from counts the store keeps up to date, so ranking costs
+O(slots x locations) however many orders there are. Without the student's
+position only the queue counts. Full slots are left out; ties go to the
+emptier slot.
+"""
+from math import asin, cos, radians, sin, sqrt
+
+EARTH_RADIUS_KM = 6371.0
+# About 5 km/h on foot
+WALKING_MINUTES_PER_KM = 12.0
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    """Great-circle (haversine) distance between two GPS coordinates"""
+    d_lat = radians(lat2 - lat1)
+    d_lng = radians(lng2 - lng1)
+    a = sin(d_lat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(d_lng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(sqrt(min(1.0, a)))
+
+
+def rank_pickups(time_slots, locations, seats, depths, capacity, minutes_per_order,
+                 origin=None):
+    """Score every open (slot, location) pair, best first
+
+    seats is {time_slot: orders holding a seat}, depths is
+    {(time_slot, location name): queued orders} and origin an optional
+    (lat, lng). Returns a list of dicts ready to be sent as JSON.
+    """
+    distances = {}
+    if origin is not None:
+        distances = {location['name']: distance_km(origin[0], origin[1],
+                                                   location['lat'], location['lng'])
+                     for location in locations}
+    ranked = []
+    for slot_index, time_slot in enumerate(time_slots):
+        taken = seats.get(time_slot, 0)
+        if taken >= capacity:
+            continue
+        for location_index, location in enumerate(locations):
+            name = location['name']
+            queued = depths.get((time_slot, name), 0)
+            score = queued * minutes_per_order
+            distance = distances.get(name)
+            if distance is not None:
+                score += distance * WALKING_MINUTES_PER_KM
+            ranked.append(((score, taken, slot_index, location_index), {
+                'time_slot': time_slot,
+                'location': name,
+                'queued_orders': queued,
+                'spots_left': capacity - taken,
+                'distance_km': None if distance is None else round(distance, 2),
+                'score': round(score, 1),
+            }))
+    ranked.sort(key=lambda pair: pair[0])
+    return [suggestion for _, suggestion in ranked]
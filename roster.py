@@ -0,0 +1,323 @@
+"""Bulk import of a student roster at the start of term
+
+Reads a CSV file (with a header row) or a JSONL file, one object per line,
+with student_id, name, email and password fields. Rows are streamed and
+validated one at a time, so the whole roster is never held in memory.
+Passwords are hashed on a pool of worker processes, so throughput grows with
+the number of cores. Users are stored one batch at a time, in file order.
+Duplicate student IDs (already registered, or repeated in the file) and
+invalid rows are reported by line number and skipped without stopping the
+import.
+
+    python roster.py import students.csv [--workers N] [--batch-size 500]
+
+Admins can also upload a file to /admin/import_roster. The upload is saved
+and imported by a background job with fewer hashing processes, so the web
+app keeps cores for requests; /admin/import_roster/<job_id> reports its
+progress. The command writes to the store configured by QUICKBITE_STORE, so
+use it with "sqlite", or with "journal" while the app is stopped; the
+in-memory store is only reachable through the upload.
+
+Hashing processes are started by a fork server rather than forked from the
+caller, which in the web app has many threads that may hold locks. They
+re-import the main module, so this one imports models (which builds the
+store) only inside the functions that need it.
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import math
+import multiprocessing
+import os
+import re
+import secrets
+import shutil
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from passwords import hash_passwords
+
+FIELDS = ('student_id', 'name', 'email', 'password')
+FORMATS = ('csv', 'jsonl')
+# Users stored per batch (one transaction or journal record each)
+BATCH_SIZE = 500
+# Passwords handed to a worker process at a time
+HASH_CHUNK = 16
+# Worker processes hashing passwords
+IMPORT_WORKERS = int(os.environ.get('QUICKBITE_IMPORT_WORKERS', os.cpu_count() or 1))
+# Worker processes for imports started from the web app, leaving cores for requests
+WEB_IMPORT_WORKERS = int(os.environ.get('QUICKBITE_WEB_IMPORT_WORKERS',
+                                        max(1, (os.cpu_count() or 2) // 2)))
+# Uploaded rosters and import job reports
+IMPORT_DIR = os.environ.get('QUICKBITE_IMPORT_DIR',
+                            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'imports'))
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{16}$')
+# Duplicates and errors listed individually in a report; the rest are only counted
+REPORT_LIMIT = 100
+
+
+class ImportReport:
+    """Running totals of a roster import"""
+    def __init__(self, limit=REPORT_LIMIT):
+        self.limit = limit
+        self.created = 0
+        self.duplicates = 0
+        self.errors = 0
+        self.problems = []  # (line, student_id, message), at most limit of them
+
+    def _note(self, line, student_id, message):
+        if len(self.problems) < self.limit:
+            self.problems.append((line, student_id, message))
+
+    def duplicate(self, line, student_id):
+        self.duplicates += 1
+        self._note(line, student_id, "Student ID already exists")
+
+    def error(self, line, student_id, message):
+        self.errors += 1
+        self._note(line, student_id, message)
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'duplicates': self.duplicates,
+            'errors': self.errors,
+            'problems': [{'line': line, 'student_id': student_id, 'message': message}
+                         for line, student_id, message in self.problems],
+        }
+
+
+def detect_format(filename):
+    """Guess the roster format from a file name, defaulting to CSV"""
+    if filename and filename.lower().endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    return 'csv'
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, row dict or None) from a text stream
+
+    A row that cannot be parsed at all comes back as None.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line, text in enumerate(stream, 1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError:
+                row = None
+            yield line, row if isinstance(row, dict) else None
+    else:
+        raise ValueError(f"Unknown roster format: {fmt}")
+
+
+def validate_row(row):
+    """Return ((student_id, name, email, password), None) or (None, error message)"""
+    from models import MIN_PASSWORD_LENGTH
+    if row is None:
+        return None, "Unreadable row"
+    values = []
+    for field in FIELDS:
+        value = row.get(field)
+        value = '' if value is None else str(value)
+        if field != 'password':
+            value = value.strip()
+        if not value:
+            return None, f"Missing {field}"
+        values.append(value)
+    student_id, name, email, password = values
+    if '@' not in email:
+        return None, "Invalid email"
+    if len(password) < MIN_PASSWORD_LENGTH:
+        return None, f"Password shorter than {MIN_PASSWORD_LENGTH} characters"
+    return tuple(values), None
+
+
+def _new_rows(rows, report):
+    """Valid rows for students that do not exist yet, as (line, fields)"""
+    from models import get_user
+    seen = set()
+    for line, row in rows:
+        fields, message = validate_row(row)
+        if fields is None:
+            student_id = row.get('student_id') if isinstance(row, dict) else None
+            report.error(line, student_id, message)
+            continue
+        student_id = fields[0]
+        if student_id in seen or get_user(student_id) is not None:
+            report.duplicate(line, student_id)
+            continue
+        seen.add(student_id)
+        yield line, fields
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _store_batch(batch, futures, report):
+    """Wait for a batch's hashes and store its users"""
+    from models import create_users
+    hashes = [password_hash for future in futures for password_hash in future.result()]
+    users = [(student_id, name, email, password_hash)
+             for (_, (student_id, name, email, _)), password_hash in zip(batch, hashes)]
+    created = set(create_users(users))
+    report.created += len(created)
+    for line, fields in batch:
+        if fields[0] not in created:
+            report.duplicate(line, fields[0])  # registered while the import ran
+
+
+def _hashing_pool(workers):
+    context = multiprocessing.get_context('forkserver')
+    # The fork server only needs the hashing code, not the app
+    context.set_forkserver_preload(['passwords'])
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+
+def import_roster(stream, fmt='csv', workers=IMPORT_WORKERS, batch_size=BATCH_SIZE,
+                  progress=None, report=None):
+    """Import a roster from a text stream and return an ImportReport
+
+    progress, if given, is called with the report after each stored batch.
+    Pass report to keep the counts of a run that fails part way.
+    """
+    from models import password_hasher
+    if report is None:
+        report = ImportReport()
+    # Enough batches hashing ahead to keep every worker busy while one is stored
+    ahead = max(2, math.ceil(2 * workers * HASH_CHUNK / batch_size))
+    with _hashing_pool(workers) as pool:
+        pending = deque()  # (batch, hash futures), oldest first
+        for batch in _batches(_new_rows(read_rows(stream, fmt), report), batch_size):
+            passwords = [fields[3] for _, fields in batch]
+            futures = [pool.submit(hash_passwords, passwords[start:start + HASH_CHUNK],
+                                   password_hasher.method)
+                       for start in range(0, len(passwords), HASH_CHUNK)]
+            pending.append((batch, futures))
+            if len(pending) > ahead:
+                _store_batch(*pending.popleft(), report)
+                if progress:
+                    progress(report)
+        while pending:
+            _store_batch(*pending.popleft(), report)
+            if progress:
+                progress(report)
+    return report
+
+
+# One web-started import at a time per process
+_job_slots = threading.BoundedSemaphore(1)
+
+
+def _job_path(job_id, suffix):
+    return os.path.join(IMPORT_DIR, f"{job_id}.{suffix}")
+
+
+def _write_job(job_id, status):
+    """Replace a job's status file, so readers in any process never see half of it"""
+    temp_path = _job_path(job_id, f"json.{os.getpid()}.tmp")
+    with open(temp_path, 'w') as f:
+        json.dump(status, f)
+    os.replace(temp_path, _job_path(job_id, 'json'))
+
+
+def _run_job(job_id, upload_path, fmt, workers):
+    report = ImportReport()
+    status = {'state': 'failed', 'error': "Import stopped", **report.as_dict()}
+    try:
+        with open(upload_path, encoding='utf-8-sig', errors='replace', newline='') as stream:
+            import_roster(stream, fmt, workers, report=report, progress=lambda report: _write_job(
+                job_id, {'state': 'running', **report.as_dict()}))
+        status = {'state': 'done', **report.as_dict()}
+    except Exception as e:
+        # Batches stored before the failure stay imported, so say how far it got
+        status = {'state': 'failed', 'error': str(e) or type(e).__name__, **report.as_dict()}
+        logging.getLogger(__name__).exception(
+            "Roster import %s failed after creating %d users (%d duplicates, %d errors)",
+            job_id, report.created, report.duplicates, report.errors)
+    finally:
+        os.remove(upload_path)
+        _write_job(job_id, status)
+        _job_slots.release()
+
+
+def start_import(stream, fmt, workers=WEB_IMPORT_WORKERS):
+    """Save a binary roster stream and import it on a background thread
+
+    Returns the job ID, or None if this process is already running an import.
+    """
+    if not _job_slots.acquire(blocking=False):
+        return None
+    try:
+        job_id = secrets.token_hex(8)
+        os.makedirs(IMPORT_DIR, exist_ok=True)
+        upload_path = _job_path(job_id, 'upload')
+        with open(upload_path, 'wb') as f:
+            shutil.copyfileobj(stream, f)
+        _write_job(job_id, {'state': 'running', **ImportReport().as_dict()})
+        threading.Thread(target=_run_job, args=(job_id, upload_path, fmt, workers),
+                         daemon=True, name=f'roster-import-{job_id}').start()
+    except BaseException:
+        _job_slots.release()
+        raise
+    return job_id
+
+
+def job_status(job_id):
+    """A job's state ("running", "done" or "failed") and report so far, or None
+
+    A failed job also has an "error" message.
+    """
+    if not JOB_ID_PATTERN.match(job_id):
+        return None
+    try:
+        with open(_job_path(job_id, 'json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    command = commands.add_parser('import', help='create users from a CSV or JSONL roster')
+    command.add_argument('path', help='roster file, or - for standard input')
+    command.add_argument('--format', choices=FORMATS,
+                         help='file format (default: from the file extension, else csv)')
+    command.add_argument('--workers', type=int, default=IMPORT_WORKERS,
+                         help='password hashing processes (default: %(default)s)')
+    command.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                         help='users stored per batch (default: %(default)s)')
+    args = parser.parse_args(argv)
+    fmt = args.format or detect_format(args.path)
+    if args.path == '-':
+        stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', newline='')
+        report = import_roster(stream, fmt, args.workers, args.batch_size)
+    else:
+        with open(args.path, encoding='utf-8-sig', newline='') as stream:
+            report = import_roster(stream, fmt, args.workers, args.batch_size)
+    for line, student_id, message in report.problems:
+        print(f"line {line}: {student_id or '-'}: {message}", file=sys.stderr)
+    print(f"{report.created} created, {report.duplicates} duplicates, {report.errors} errors")
+    return 1 if report.errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,28 +1,190 @@
-from flask import render_template, request, redirect, url_for, flash, session, jsonify
+import hashlib
+import os
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
+from flask import (
+    render_template, request, redirect, url_for, flash, session, jsonify,
+    Response, make_response
+)
+from markupsafe import Markup
 from app import app
+from roster import FORMATS as ROSTER_FORMATS, detect_format, job_status, start_import
 from models import (
-    load_menu, get_time_slots, get_pickup_locations, 
-    create_user, authenticate_user, create_order, create_order_from_cart,
-    get_orders_by_time_and_location, get_orders_count_by_time_slot,
-    get_or_create_cart, add_to_cart, remove_from_cart, update_cart_quantity, clear_cart,
-    users_db, orders_db, carts_db
+    load_menu, get_meal, get_time_slots, get_pickup_locations, 
+    create_user, authenticate_user, MIN_PASSWORD_LENGTH, create_order, create_order_from_cart,
+    get_orders_count_by_time_slot, MAX_SLOT_CAPACITY, recommend_pickups,
+    get_student_orders, get_student_order, ORDERS_PER_PAGE,
+    get_cart, add_to_cart, remove_from_cart, update_cart_quantity, clear_cart,
+    apply_cart_operations,
+    get_user, get_order, get_total_orders,
+    get_order_version, get_order_changes, wait_for_order_changes,
+    get_order_counts_by_time_and_location, get_orders_at, ADMIN_ORDERS_PER_PAGE,
+    update_orders_status, PREPARATION_STATUSES, HasherBusy, get_production_plan,
+    get_menu_version
 )
 
+# Seconds a student is asked to wait when the password hashing pool is full
+HASHING_RETRY_AFTER = 5
+# Most pickup suggestions returned by one request
+MAX_RECOMMENDATIONS = 20
+
+def busy_response(template):
+    """Re-render a login/registration form asking the student to retry shortly"""
+    flash('Lots of students are signing in right now. Please try again in a few seconds.', 'error')
+    return render_template(template), 503, {'Retry-After': str(HASHING_RETRY_AFTER)}
+
+# Templates only change on deploy; their newest mtime dates pages built from them
+TEMPLATES_MODIFIED = datetime.fromtimestamp(max(
+    entry.stat().st_mtime for entry in os.scandir(os.path.join(app.root_path, app.template_folder))
+), timezone.utc).replace(microsecond=0)
+# Pages change when the templates or the static asset URLs they embed do
+PAGES_VERSION = (TEMPLATES_MODIFIED.isoformat(), app.config.get('ASSETS_VERSION'))
+
+# Rendered meal grids: (menu version, logged in) -> HTML
+meal_grids = {}
+
+def meal_grid(user_logged_in):
+    """Menu cards for the current menu, rendered once per menu version"""
+    menu_data = load_menu()
+    key = (get_menu_version(), user_logged_in)
+    html = meal_grids.get(key)
+    if html is None:
+        html = Markup(render_template('meal_grid.html', menu=menu_data,
+                                      user_logged_in=user_logged_in))
+        # Grids for older menus are never asked for again
+        for stale in [cached for cached in list(meal_grids) if cached[0] != key[0]]:
+            meal_grids.pop(stale, None)
+        meal_grids[key] = html
+    return html
+
+def page_etag(*parts):
+    """Strong ETag for a page built from the templates, the session and parts"""
+    user = (session.get('user'), session.get('user_name'), session.get('is_admin'),
+            session.get('last_order_id'))
+    return hashlib.sha1(repr((PAGES_VERSION, user) + parts).encode()).hexdigest()
+
+def conditional_page(etag, render, last_modified=None):
+    """Answer 304 if the browser's copy is current, else render a tagged page
+
+    last_modified is only given for pages that cannot change without their
+    templates changing; If-Modified-Since is ignored when an ETag is sent.
+    Pages showing flashed messages are one-off and are never tagged.
+    """
+    if '_flashes' in session:
+        return render()
+    if request.if_none_match:
+        unchanged = request.if_none_match.contains(etag)
+    else:
+        unchanged = (last_modified is not None and request.if_modified_since is not None
+                     and last_modified <= request.if_modified_since)
+    response = Response(status=304) if unchanged else make_response(render())
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Browsers must revalidate; the page depends on who is logged in
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+def new_order_key():
+    """Idempotency key rendered into an order form, so resubmitting it places one order
+    
+    Keys are not part of page ETags: a revalidated page keeps a key that has
+    not placed an order yet, since placing one changes the page.
+    """
+    return secrets.token_urlsafe(16)
+
+# Seconds a long-poll waits for an order change before answering 204
+LONG_POLL_TIMEOUT = 25
+# Long-polls that may wait at once in each worker process. Each one holds a
+# request thread, so the cap keeps most of the gthread pool for page views;
+# further long-polls are answered at once and told to come back later.
+LONG_POLL_WAITERS = int(os.environ.get('QUICKBITE_LONG_POLL_WAITERS', 32))
+# Seconds a client turned away by the cap waits before asking again
+LONG_POLL_RETRY = 10
+long_poll_slots = threading.BoundedSemaphore(LONG_POLL_WAITERS)
+
+def order_status_data(order):
+    """Status fields sent to tracking pages and the admin dashboard"""
+    estimated = order.get_estimated_delivery_time()
+    return {
+        'order_id': order.order_id,
+        'status': order.preparation_status,
+        'progress': order.get_delivery_progress(),
+        'estimated_ready_time': estimated.isoformat(),
+        'estimated_ready_display': estimated.strftime('%I:%M %p'),
+        'pickup_time': order.pickup_time,
+        'pickup_location': order.pickup_location
+    }
+
+def admin_order_data(order):
+    """Order fields the admin dashboard needs to render one order"""
+    data = order_status_data(order)
+    data.update({
+        'student_name': order.student_name,
+        'items': [{'meal_name': item.meal_name, 'quantity': item.quantity}
+                  for item in order.items],
+        'total_price': order.total_price,
+        'version': order.version
+    })
+    return data
+
+def long_poll(check):
+    """Answer as soon as check() returns data, waiting for order changes if needed
+    
+    check() is called once, then again after every order change until
+    LONG_POLL_TIMEOUT; its data is sent as JSON, or 204 if it never had
+    any. Requests beyond LONG_POLL_WAITERS are answered 204 at once with a
+    Retry-After instead of waiting.
+    """
+    # Read the version first, so a change right after check() still wakes us
+    version = get_order_version()
+    data = check()
+    waited = False
+    if data is None and long_poll_slots.acquire(blocking=False):
+        waited = True
+        try:
+            deadline = time.monotonic() + LONG_POLL_TIMEOUT
+            while data is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                latest = wait_for_order_changes(version, remaining)
+                if latest > version:
+                    version = latest
+                    data = check()
+        finally:
+            long_poll_slots.release()
+    if data is not None:
+        response = jsonify(data)
+    else:
+        response = make_response('', 204)
+        if not waited:
+            response.headers['Retry-After'] = str(LONG_POLL_RETRY)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 @app.route('/')
 def home():
     """Public home page - accessible to everyone"""
     if 'user' in session:
-        user = users_db.get(session['user'])
+        user = get_user(session['user'])
         # If admin is already logged in, redirect to dashboard
         if user and user.is_admin:
             return redirect(url_for('admin_dashboard'))
         
         # Get cart info for logged in users
-        cart = get_or_create_cart(session['user'])
+        cart = get_cart(session['user'])
         cart_items = cart.get_total_items()
-        return render_template('index.html', user=user, cart_items=cart_items)
+        return conditional_page(
+            page_etag(cart_items),
+            lambda: render_template('index.html', user=user, cart_items=cart_items))
     else:
-        return render_template('index.html', user=None, cart_items=0)
+        return conditional_page(
+            page_etag(0), lambda: render_template('index.html', user=None, cart_items=0),
+            last_modified=TEMPLATES_MODIFIED)
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -35,7 +197,10 @@ def login():
             flash('Please fill in all fields', 'error')
             return render_template('login.html')
         
-        user = authenticate_user(student_id, password)
+        try:
+            user = authenticate_user(student_id, password)
+        except HasherBusy:
+            return busy_response('login.html')
         if user:
             session['user'] = user.student_id
             session['user_name'] = user.name
@@ -69,11 +234,14 @@ def register():
             flash('Passwords do not match', 'error')
             return render_template('register.html')
         
-        if password and len(password) < 6:
-            flash('Password must be at least 6 characters long', 'error')
+        if password and len(password) < MIN_PASSWORD_LENGTH:
+            flash(f'Password must be at least {MIN_PASSWORD_LENGTH} characters long', 'error')
             return render_template('register.html')
         
-        success, message = create_user(student_id, name, email, password)
+        try:
+            success, message = create_user(student_id, name, email, password)
+        except HasherBusy:
+            return busy_response('register.html')
         if success:
             flash('Registration successful! Please log in.', 'success')
             return redirect(url_for('login'))
@@ -97,17 +265,23 @@ def menu():
     
     # Get user's cart
     cart = None
+    cart_summary = None
     if user_logged_in:
-        cart = get_or_create_cart(session['user'])
+        cart = get_cart(session['user'])
+        cart_summary = (cart.get_total_items(), cart.get_total_price())
     
-    return render_template('menu.html', 
+    # Slot counts change with every order, so the page has no useful Last-Modified
+    etag = page_etag(get_menu_version(), sorted(order_counts.items()), cart_summary)
+    return conditional_page(etag, lambda: render_template('menu.html', 
                          menu=menu_data, 
+                         meal_grid=meal_grid(user_logged_in),
                          time_slots=time_slots,
                          locations=locations,
                          order_counts=order_counts,
-                         max_capacity=125,  # 500 total / 4 time slots
+                         max_capacity=MAX_SLOT_CAPACITY,
                          user_logged_in=user_logged_in,
-                         cart=cart)
+                         cart=cart,
+                         order_key=new_order_key()))
 
 @app.route('/order', methods=['POST'])
 def place_order():
@@ -124,34 +298,28 @@ def place_order():
         flash('Please complete all order details', 'error')
         return redirect(url_for('menu'))
     
-    # Check capacity for selected time slot
-    order_counts = get_orders_count_by_time_slot()
-    if pickup_time and order_counts.get(pickup_time, 0) >= 125:
-        flash('Sorry, this time slot is full. Please select another time.', 'error')
-        return redirect(url_for('menu'))
-    
-    # Load menu to get meal details
-    menu_data = load_menu()
-    selected_meal = None
-    for meal in menu_data.get('meals', []):
-        if str(meal['id']) == meal_id:
-            selected_meal = meal
-            break
+    # Look up meal details in the cached menu catalog
+    selected_meal = get_meal(meal_id)
     
     if not selected_meal:
         flash('Invalid meal selection', 'error')
         return redirect(url_for('menu'))
     
-    # Create order
+    # Create order (reserves a seat in the time slot atomically)
     order = create_order(
         session['user'],
         session['user_name'],
         selected_meal['name'],
         selected_meal['price'],
         pickup_time,
-        pickup_location
+        pickup_location,
+        idempotency_key=request.form.get('idempotency_key')
     )
     
+    if not order:
+        flash('Sorry, this time slot is full. Please select another time.', 'error')
+        return redirect(url_for('menu'))
+    
     # Store order in session for confirmation page
     session['last_order_id'] = order.order_id
     
@@ -171,13 +339,8 @@ def add_to_cart_route():
     if not meal_id:
         return jsonify({'success': False, 'message': 'Meal ID required'}), 400
     
-    # Load menu to get meal details
-    menu_data = load_menu()
-    selected_meal = None
-    for meal in menu_data.get('meals', []):
-        if str(meal['id']) == meal_id:
-            selected_meal = meal
-            break
+    # Look up meal details in the cached menu catalog
+    selected_meal = get_meal(meal_id)
     
     if not selected_meal:
         return jsonify({'success': False, 'message': 'Invalid meal selection'}), 400
@@ -199,7 +362,7 @@ def view_cart():
     if 'user' not in session:
         return redirect(url_for('login'))
     
-    cart = get_or_create_cart(session['user'])
+    cart = get_cart(session['user'])
     time_slots = get_time_slots()
     locations = get_pickup_locations()
     order_counts = get_orders_count_by_time_slot()
@@ -209,7 +372,8 @@ def view_cart():
                          time_slots=time_slots,
                          locations=locations,
                          order_counts=order_counts,
-                         max_capacity=125)
+                         max_capacity=MAX_SLOT_CAPACITY,
+                         order_key=new_order_key())
 
 @app.route('/update_cart', methods=['POST'])
 def update_cart_route():
@@ -220,8 +384,7 @@ def update_cart_route():
     meal_id = request.form.get('meal_id')
     quantity = int(request.form.get('quantity', 0))
     
-    update_cart_quantity(session['user'], meal_id, quantity)
-    cart = get_or_create_cart(session['user'])
+    cart = update_cart_quantity(session['user'], meal_id, quantity)
     
     return jsonify({
         'success': True,
@@ -236,8 +399,7 @@ def remove_from_cart_route():
         return jsonify({'success': False, 'message': 'Login required'}), 401
     
     meal_id = request.form.get('meal_id')
-    remove_from_cart(session['user'], meal_id)
-    cart = get_or_create_cart(session['user'])
+    cart = remove_from_cart(session['user'], meal_id)
     
     return jsonify({
         'success': True,
@@ -245,6 +407,54 @@ def remove_from_cart_route():
         'cart_total': cart.get_total_price()
     })
 
+@app.route('/cart_operations', methods=['POST'])
+def cart_operations_route():
+    """Apply a JSON list of cart operations in one request, all or nothing
+    
+    Lets pages coalesce rapid clicks, e.g.
+    {"operations": [{"op": "set", "meal_id": "3", "quantity": 4}, {"op": "remove", "meal_id": "1"}]}
+    """
+    if 'user' not in session:
+        return jsonify({'success': False, 'message': 'Login required'}), 401
+    
+    data = request.get_json(silent=True)
+    operations = data.get('operations') if isinstance(data, dict) else None
+    cart, message = apply_cart_operations(session['user'], operations)
+    if cart is None:
+        return jsonify({'success': False, 'message': message}), 400
+    
+    return jsonify({
+        'success': True,
+        'message': message,
+        'cart_count': cart.get_total_items(),
+        'cart_total': cart.get_total_price(),
+        'items': {meal_id: item.quantity for meal_id, item in cart.items.items()}
+    })
+
+@app.route('/pickup_recommendations')
+def pickup_recommendations():
+    """Suggest pickup slots and locations, least loaded and closest first
+    
+    Optional lat/lng query parameters add walking distance to the ranking;
+    limit caps how many suggestions come back.
+    """
+    if 'user' not in session:
+        return jsonify({'success': False, 'message': 'Login required'}), 401
+    
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    origin = None
+    if lat is not None and lng is not None:
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return jsonify({'success': False, 'message': 'Invalid coordinates'}), 400
+        origin = (lat, lng)
+    limit = max(1, min(request.args.get('limit', 3, type=int), MAX_RECOMMENDATIONS))
+    
+    return jsonify({
+        'success': True,
+        'recommendations': recommend_pickups(origin, limit)
+    })
+
 @app.route('/place_cart_order', methods=['POST'])
 def place_cart_order():
     """Place order from cart items"""
@@ -258,18 +468,13 @@ def place_cart_order():
         flash('Please complete all order details', 'error')
         return redirect(url_for('view_cart'))
     
-    # Check capacity for selected time slot
-    order_counts = get_orders_count_by_time_slot()
-    if pickup_time and order_counts.get(pickup_time, 0) >= 125:
-        flash('Sorry, this time slot is full. Please select another time.', 'error')
-        return redirect(url_for('view_cart'))
-    
-    # Create order from cart
+    # Create order from cart (reserves a seat in the time slot atomically)
     order, message = create_order_from_cart(
         session['user'],
         session['user_name'],
         pickup_time,
-        pickup_location
+        pickup_location,
+        idempotency_key=request.form.get('idempotency_key')
     )
     
     if order:
@@ -288,11 +493,11 @@ def order_confirmation():
         return redirect(url_for('login'))
     
     order_id = session.get('last_order_id')
-    if not order_id or order_id not in orders_db:
+    order = get_order(order_id) if order_id else None
+    if not order:
         flash('No recent order found', 'error')
         return redirect(url_for('menu'))
     
-    order = orders_db[order_id]
     return render_template('confirmation.html', order=order)
 
 @app.route('/admin')
@@ -302,14 +507,93 @@ def admin_dashboard():
         flash('Access denied', 'error')
         return redirect(url_for('login'))
     
-    orders_summary = get_orders_by_time_and_location()
+    # Read the version first so changes made while rendering are still pushed.
+    # Only counts are rendered; each cell's orders load through the API.
+    version = get_order_version()
+    cell_counts = get_order_counts_by_time_and_location()
     order_counts = get_orders_count_by_time_slot()
-    total_orders = len(orders_db)
+    total_orders = get_total_orders()
     
     return render_template('admin.html', 
-                         orders_summary=orders_summary,
+                         cell_counts=cell_counts,
                          order_counts=order_counts,
-                         total_orders=total_orders)
+                         total_orders=total_orders,
+                         max_capacity=MAX_SLOT_CAPACITY,
+                         per_page=ADMIN_ORDERS_PER_PAGE,
+                         version=version)
+
+@app.route('/admin/api/orders')
+def admin_orders_api():
+    """One page of orders for a time slot and location"""
+    if 'user' not in session or not session.get('is_admin'):
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
+    
+    time_slot = request.args.get('time_slot')
+    location = request.args.get('location')
+    if not time_slot or not location:
+        return jsonify({'success': False, 'message': 'Missing parameters'}), 400
+    
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', ADMIN_ORDERS_PER_PAGE, type=int), 1), 100)
+    orders, total = get_orders_at(time_slot, location, page, per_page)
+    
+    return jsonify({
+        'success': True,
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'orders': [admin_order_data(order) for order in orders]
+    })
+
+@app.route('/admin/api/changes')
+def admin_changes_api():
+    """Orders changed since the version the client last saw, plus fresh counts"""
+    if 'user' not in session or not session.get('is_admin'):
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
+    
+    since = request.args.get('since', 0, type=int)
+    version = get_order_version()
+    orders = get_order_changes(since)
+    
+    return jsonify({
+        'success': True,
+        'version': max([version] + [order.version for order in orders]),
+        'orders': [admin_order_data(order) for order in orders],
+        'slot_counts': get_orders_count_by_time_slot(),
+        'cell_counts': get_order_counts_by_time_and_location(),
+        'total_orders': get_total_orders()
+    })
+
+@app.route('/admin/production')
+def admin_production():
+    """Kitchen production plan: how much of each meal each slot and location needs"""
+    if 'user' not in session or not session.get('is_admin'):
+        flash('Access denied', 'error')
+        return redirect(url_for('login'))
+    
+    return render_template('production.html',
+                         plan=get_production_plan(by_status=True),
+                         time_slots=get_time_slots(),
+                         locations=[location['name'] for location in get_pickup_locations()],
+                         statuses=PREPARATION_STATUSES,
+                         version=get_order_version())
+
+@app.route('/admin/api/production')
+def admin_production_api():
+    """Meal quantities per slot and location, optionally split by preparation status"""
+    if 'user' not in session or not session.get('is_admin'):
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
+    
+    version = get_order_version()
+    by_status = request.args.get('by_status', '0') not in ('0', 'false', '')
+    production = get_production_plan(by_status)
+    
+    return jsonify({
+        'success': True,
+        'version': version,
+        'meals': production['meals'],
+        'plan': production['plan']
+    })
 
 @app.route('/admin/update_order_status', methods=['POST'])
 def update_order_status():
@@ -323,17 +607,18 @@ def update_order_status():
     if not order_id or not new_status:
         return jsonify({'success': False, 'message': 'Missing parameters'}), 400
     
-    order = orders_db.get(order_id)
+    order = get_order(order_id)
     if not order:
         return jsonify({'success': False, 'message': 'Order not found'}), 404
     
     # Valid status transitions
-    valid_statuses = ['received', 'preparing', 'ready', 'delivered']
-    if new_status not in valid_statuses:
+    if new_status not in PREPARATION_STATUSES:
         return jsonify({'success': False, 'message': 'Invalid status'}), 400
     
     # Update order status
-    order.update_status(new_status)
+    order = order.update_status(new_status)
+    if not order:
+        return jsonify({'success': False, 'message': 'Order not found'}), 404
     
     return jsonify({
         'success': True, 
@@ -343,6 +628,83 @@ def update_order_status():
         'progress': order.get_delivery_progress()
     })
 
+@app.route('/admin/bulk_update_order_status', methods=['POST'])
+def bulk_update_order_status():
+    """Admin route to move many orders to a new status in one request
+    
+    Takes either order_ids (repeated or comma-separated) or a selector of
+    time_slot, location and current_status, plus the new status.
+    """
+    if 'user' not in session or not session.get('is_admin'):
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
+    
+    new_status = request.form.get('status')
+    order_ids = [order_id.strip()
+                 for value in request.form.getlist('order_ids')
+                 for order_id in value.split(',') if order_id.strip()]
+    
+    orders, message = update_orders_status(
+        new_status,
+        order_ids=order_ids,
+        time_slot=request.form.get('time_slot'),
+        location=request.form.get('location'),
+        current_status=request.form.get('current_status')
+    )
+    if orders is None:
+        return jsonify({'success': False, 'message': message}), 400
+    
+    return jsonify({
+        'success': True,
+        'message': message,
+        'new_status': new_status,
+        'order_ids': [order.order_id for order in orders]
+    })
+
+@app.route('/admin/import_roster', methods=['POST'])
+def import_roster_route():
+    """Admin route to create student accounts from a CSV or JSONL roster
+    
+    Takes an uploaded file in the roster field, or the file itself as the
+    request body. The format comes from format, the file name or the content
+    type. The file is imported by a background job; poll the returned
+    status_url for its progress. Bad rows and duplicates are reported without
+    stopping the import.
+    """
+    if 'user' not in session or not session.get('is_admin'):
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
+    
+    upload = request.files.get('roster')
+    if upload is not None:
+        stream, filename = upload.stream, upload.filename
+    else:
+        stream, filename = request.stream, None
+    fmt = request.values.get('format')
+    if fmt is None:
+        ndjson = request.mimetype in ('application/x-ndjson', 'application/jsonl')
+        fmt = 'jsonl' if ndjson and upload is None else detect_format(filename)
+    if fmt not in ROSTER_FORMATS:
+        return jsonify({'success': False, 'message': 'Unknown roster format'}), 400
+    
+    job_id = start_import(stream, fmt)
+    if job_id is None:
+        return jsonify({'success': False, 'message': 'A roster import is already running'}), 409
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': url_for('import_roster_status', job_id=job_id)
+    }), 202
+
+@app.route('/admin/import_roster/<job_id>')
+def import_roster_status(job_id):
+    """Admin route reporting a roster import's state and counts so far"""
+    if 'user' not in session or not session.get('is_admin'):
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
+    
+    status = job_status(job_id)
+    if status is None:
+        return jsonify({'success': False, 'message': 'Import not found'}), 404
+    return jsonify({'success': True, **status})
+
 @app.route('/logout')
 def logout():
     """Logout user"""
@@ -356,14 +718,17 @@ def user_orders():
     if 'user' not in session:
         return redirect(url_for('login'))
     
-    # Get user's orders
-    user_orders = [order for order in orders_db.values() 
-                   if order.student_id == session['user']]
+    page = max(request.args.get('page', 1, type=int), 1)
     
-    # Sort by order time (newest first)
-    user_orders.sort(key=lambda x: x.order_time, reverse=True)
+    # Get one page of the user's orders (newest first)
+    user_orders, total_orders = get_student_orders(session['user'], page)
+    total_pages = max((total_orders + ORDERS_PER_PAGE - 1) // ORDERS_PER_PAGE, 1)
     
-    return render_template('orders.html', orders=user_orders)
+    return render_template('orders.html', 
+                         orders=user_orders,
+                         page=page,
+                         total_pages=total_pages,
+                         total_orders=total_orders)
 
 @app.route('/track_order/<order_id>')
 def track_order(order_id):
@@ -371,15 +736,56 @@ def track_order(order_id):
     if 'user' not in session:
         return redirect(url_for('login'))
     
-    order = orders_db.get(order_id)
-    
     # Check if order exists and belongs to current user
-    if not order or order.student_id != session['user']:
+    order = get_student_order(session['user'], order_id)
+    if not order:
         flash('Order not found or access denied', 'error')
         return redirect(url_for('user_orders'))
     
     return render_template('order_tracking.html', order=order)
 
+@app.route('/track_order/<order_id>/status')
+def track_order_status(order_id):
+    """Long-poll for one order's status on its tracking page
+    
+    Answers with the status once the order's version is newer than ?since=,
+    or 204 without a body if it has not changed within LONG_POLL_TIMEOUT.
+    """
+    if 'user' not in session:
+        return jsonify({'success': False, 'message': 'Login required'}), 401
+    
+    student_id = session['user']
+    if not get_student_order(student_id, order_id):
+        return jsonify({'success': False, 'message': 'Order not found'}), 404
+    since = request.args.get('since', -1, type=int)
+    
+    def check():
+        order = get_student_order(student_id, order_id)
+        if order is None or order.version <= since:
+            return None
+        data = order_status_data(order)
+        data['version'] = order.version
+        return data
+    
+    return long_poll(check)
+
+@app.route('/admin/api/wait')
+def admin_wait_api():
+    """Long-poll until any order changes after ?since=, then send the new version
+    
+    The dashboard and production plan then fetch what they need.
+    """
+    if 'user' not in session or not session.get('is_admin'):
+        return jsonify({'success': False, 'message': 'Admin access required'}), 403
+    
+    since = request.args.get('since', 0, type=int)
+    
+    def check():
+        version = get_order_version()
+        return {'success': True, 'version': version} if version > since else None
+    
+    return long_poll(check)
+
 # Error handlers
 @app.errorhandler(404)
 def not_found(error):
@@ -0,0 +1,157 @@
+"""Server-side sessions in a shared SQLite file
+
+Replaces Flask-Session's filesystem backend, which read a file on every
+request, rewrote it on most, and never removed old ones. Sessions live in one
+WAL-mode SQLite table that every gunicorn worker on the host shares:
+
+- a request whose session did not change writes nothing, except for a cheap
+  expiry bump at most once per SESSION_TOUCH_INTERVAL;
+- a daemon thread in each worker deletes expired rows in batches every
+  SESSION_CLEANUP_INTERVAL, so cleanup never runs inside a request.
+"""
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+# Seconds between runs of the background expiry sweep
+SESSION_CLEANUP_INTERVAL = 60
+# Expired sessions deleted per statement, so the sweep never holds the lock for long
+SESSION_CLEANUP_BATCH = 1000
+# An unchanged session's expiry is pushed back at most this often (seconds)
+SESSION_TOUCH_INTERVAL = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    sid TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_by_expiry ON sessions (expires);
+"""
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session dict that remembers whether it was changed during the request"""
+    def __init__(self, initial=None, sid=None, expires=None):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires = expires
+        self.modified = False
+
+
+class SQLiteSessionInterface(SessionInterface):
+    """Flask session interface storing session data in SQLite"""
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._sweeper_pid = None
+        self._sweeper_lock = threading.Lock()
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='quickbite-session', key_derivation='hmac')
+
+    def _start_sweeper(self, app):
+        """Start the expiry thread once per worker process (forks lose threads)"""
+        if self._sweeper_pid == os.getpid():
+            return
+        with self._sweeper_lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+            threading.Thread(target=self._sweep_forever, args=(app,), daemon=True,
+                             name='session-sweeper').start()
+
+    def _sweep_forever(self, app):
+        while True:
+            time.sleep(SESSION_CLEANUP_INTERVAL)
+            try:
+                self.delete_expired()
+            except sqlite3.Error:
+                app.logger.exception("Session cleanup failed")
+
+    def delete_expired(self, now=None):
+        """Delete expired sessions in batches, returning how many were removed"""
+        now = time.time() if now is None else now
+        conn = self._connect()
+        removed = 0
+        while True:
+            cursor = conn.execute(
+                "DELETE FROM sessions WHERE rowid IN "
+                "(SELECT rowid FROM sessions WHERE expires < ? LIMIT ?)",
+                (now, SESSION_CLEANUP_BATCH))
+            removed += cursor.rowcount
+            if cursor.rowcount < SESSION_CLEANUP_BATCH:
+                return removed
+
+    def count(self):
+        """Number of sessions that have not expired"""
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM sessions WHERE expires >= ?", (time.time(),)).fetchone()[0]
+
+    def open_session(self, app, request):
+        self._start_sweeper(app)
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            if sid:
+                row = self._connect().execute(
+                    "SELECT data, expires FROM sessions WHERE sid = ? AND expires >= ?",
+                    (sid, time.time())).fetchone()
+                if row is not None:
+                    return ServerSession(self.serializer.loads(row[0]), sid, row[1])
+        return ServerSession(sid=secrets.token_urlsafe(32))
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        conn = self._connect()
+
+        if not session:
+            if session.modified:
+                conn.execute("DELETE FROM sessions WHERE sid = ?", (session.sid,))
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        now = time.time()
+        expires = now + app.permanent_session_lifetime.total_seconds()
+        if session.modified or session.expires is None:
+            conn.execute("INSERT OR REPLACE INTO sessions (sid, data, expires) VALUES (?, ?, ?)",
+                         (session.sid, self.serializer.dumps(dict(session)), expires))
+        elif expires - session.expires >= SESSION_TOUCH_INTERVAL:
+            conn.execute("UPDATE sessions SET expires = ? WHERE sid = ?", (expires, session.sid))
+        else:
+            return
+
+        if self.should_set_cookie(app, session):
+            response.set_cookie(
+                name, self._signer(app).sign(session.sid.encode()).decode(),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
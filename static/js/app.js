@@ -170,23 +170,41 @@ function initializeRegistrationForm() {
     });
 }
 
+/**
+ * Call onChange whenever an order changes after version, using the
+ * /admin/api/wait long-poll. Stops if the admin is logged out.
+ */
+function watchOrderChanges(version, onChange) {
+    function wait() {
+        fetch(`/admin/api/wait?since=${version}`, {cache: 'no-store'})
+        .then(response => {
+            if (response.status === 200) {
+                return response.json().then(data => {
+                    version = data.version;
+                    onChange();
+                    return 0;
+                });
+            }
+            if (response.status !== 204) return null;
+            // Busy servers say when to come back
+            return (parseInt(response.headers.get('Retry-After')) || 0) * 1000;
+        })
+        .catch(() => 5000)
+        .then(delay => {
+            if (delay !== null) setTimeout(wait, Math.max(delay, 1000));
+        });
+    }
+    wait();
+}
+
 /**
  * Initialize admin dashboard functionality
  */
 function initializeAdminDashboard() {
-    // Auto-refresh functionality for admin dashboard
+    // Order updates arrive through watchOrderChanges (see admin.html), so
+    // the dashboard no longer reloads itself on a timer
     if (window.location.pathname.includes('/admin')) {
         console.log('Admin dashboard loaded');
-        
-        // Add auto-refresh every 30 seconds
-        setInterval(function() {
-            const refreshBtn = document.querySelector('button[onclick="window.location.reload()"]');
-            if (refreshBtn && !document.hidden) {
-                // Only refresh if page is visible
-                console.log('Auto-refreshing admin dashboard...');
-                window.location.reload();
-            }
-        }, 30000); // 30 seconds
     }
 }
 
@@ -0,0 +1,1531 @@
+"""Storage backends for users, carts and orders
+
+MemoryStore keeps everything in process-local dicts and is the fast mode for
+development and tests. JournalStore is a MemoryStore that also journals
+every change to disk, so a restart or deploy does not lose orders.
+SQLiteStore keeps the same data in a WAL-mode SQLite file so that several
+gunicorn workers share one view of users, carts, orders and slot capacity.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+from journal import Journal
+
+class SlotLedger:
+    """Per-slot order counts kept up to date as orders are created and cancelled
+    
+    Each slot has its own lock, so checkouts for different slots never wait
+    on each other.
+    """
+    def __init__(self, time_slots, capacity):
+        self.capacity = capacity
+        self._counts = {slot: 0 for slot in time_slots}
+        self._locks = {slot: threading.Lock() for slot in time_slots}
+
+    def __contains__(self, time_slot):
+        return time_slot in self._counts
+
+    def count(self, time_slot):
+        return self._counts.get(time_slot, 0)
+
+    def counts(self):
+        return dict(self._counts)
+
+    def reserve(self, time_slot):
+        """Atomically take a seat in a slot, returning False if it is full"""
+        lock = self._locks.get(time_slot)
+        if lock is None:
+            return False
+        with lock:
+            count = self._counts[time_slot]
+            if count >= self.capacity:
+                return False
+            self._counts[time_slot] = count + 1
+            return True
+
+    def release(self, time_slot):
+        """Give back a seat taken by reserve()"""
+        lock = self._locks.get(time_slot)
+        if lock is None:
+            return
+        with lock:
+            if self._counts[time_slot] > 0:
+                self._counts[time_slot] -= 1
+
+class SlotQueueIndex:
+    """Per-slot queue of pending orders answering "orders ahead" in O(log n)
+    
+    Orders get a position in their slot's queue in placement order. A Fenwick
+    tree per slot counts which positions are still waiting on the kitchen, so
+    status changes and look-ups never scan the other orders. The number of
+    queued orders at each slot and location is kept alongside.
+    """
+    QUEUED_STATUSES = ('received', 'preparing')
+
+    def __init__(self):
+        self._trees = {}  # time_slot -> 1-based Fenwick tree of queued flags
+        self._positions = {}  # order_id -> (time_slot, position)
+        self._queued = set()  # order_ids currently waiting
+        self._depths = {}  # (time_slot, location) -> queued orders
+        self._lock = threading.Lock()
+
+    def _count(self, order, delta):
+        key = (order.pickup_time, order.pickup_location)
+        depth = self._depths.get(key, 0) + delta
+        if depth:
+            self._depths[key] = depth
+        else:
+            self._depths.pop(key, None)
+
+    @staticmethod
+    def _prefix_sum(tree, i):
+        total = 0
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    @staticmethod
+    def _add(tree, i, delta):
+        size = len(tree) - 1
+        while i <= size:
+            tree[i] += delta
+            i += i & -i
+
+    @classmethod
+    def is_queued(cls, order):
+        return order.status != "cancelled" and order.preparation_status in cls.QUEUED_STATUSES
+
+    def add(self, order):
+        """Append a newly placed order to the back of its slot's queue"""
+        with self._lock:
+            tree = self._trees.setdefault(order.pickup_time, [0])
+            i = len(tree)
+            queued = self.is_queued(order)
+            # Node i covers positions (i - lowbit(i), i]
+            lowbit = i & -i
+            tree.append(int(queued) + self._prefix_sum(tree, i - 1)
+                        - self._prefix_sum(tree, i - lowbit))
+            self._positions[order.order_id] = (order.pickup_time, i)
+            if queued:
+                self._queued.add(order.order_id)
+                self._count(order, 1)
+
+    def update(self, order):
+        """Move an order in or out of the queue after a status change"""
+        self.update_many([order])
+
+    def update_many(self, orders):
+        """Apply a batch of status changes under a single lock acquisition"""
+        with self._lock:
+            for order in orders:
+                position = self._positions.get(order.order_id)
+                if position is None:
+                    continue
+                time_slot, i = position
+                queued = self.is_queued(order)
+                if queued and order.order_id not in self._queued:
+                    self._queued.add(order.order_id)
+                    self._add(self._trees[time_slot], i, 1)
+                    self._count(order, 1)
+                elif not queued and order.order_id in self._queued:
+                    self._queued.discard(order.order_id)
+                    self._add(self._trees[time_slot], i, -1)
+                    self._count(order, -1)
+
+    def remove_many(self, orders):
+        """Forget archived orders; their positions stay in the tree as empty leaves"""
+        with self._lock:
+            for order in orders:
+                position = self._positions.pop(order.order_id, None)
+                if position is not None and order.order_id in self._queued:
+                    self._queued.discard(order.order_id)
+                    self._add(self._trees[position[0]], position[1], -1)
+                    self._count(order, -1)
+
+    def ahead(self, time_slot, order_id=None):
+        """Count queued orders placed before order_id (or all, for a new order)"""
+        with self._lock:
+            tree = self._trees.get(time_slot)
+            if not tree:
+                return 0
+            position = self._positions.get(order_id)
+            if position is None:
+                return self._prefix_sum(tree, len(tree) - 1)
+            return self._prefix_sum(tree, position[1] - 1)
+
+    def queue_length(self, time_slot):
+        return self.ahead(time_slot)
+
+    def depths(self):
+        """Queued orders per (time_slot, location)"""
+        with self._lock:
+            return dict(self._depths)
+
+    def queued_ids(self, time_slot):
+        """IDs of a slot's queued orders, front of the queue first"""
+        with self._lock:
+            positions = [(self._positions[order_id][1], order_id) for order_id in self._queued
+                         if self._positions[order_id][0] == time_slot]
+        return [order_id for _, order_id in sorted(positions)]
+
+class StudentOrderIndex:
+    """Each student's orders kept in placement order for history and ownership checks"""
+    def __init__(self):
+        self._orders = {}  # student_id -> list of Orders, oldest first
+        self._order_ids = {}  # student_id -> set of order_ids
+        self._lock = threading.Lock()
+
+    def add(self, order):
+        with self._lock:
+            self._orders.setdefault(order.student_id, []).append(order)
+            self._order_ids.setdefault(order.student_id, set()).add(order.order_id)
+
+    def remove_many(self, orders):
+        """Forget archived orders"""
+        order_ids = {order.order_id for order in orders}
+        with self._lock:
+            for student_id in {order.student_id for order in orders}:
+                kept = [order for order in self._orders.get(student_id, [])
+                        if order.order_id not in order_ids]
+                if kept:
+                    self._orders[student_id] = kept
+                    self._order_ids[student_id] -= order_ids
+                else:
+                    self._orders.pop(student_id, None)
+                    self._order_ids.pop(student_id, None)
+
+    def owns(self, student_id, order_id):
+        return order_id in self._order_ids.get(student_id, ())
+
+    def count(self, student_id):
+        return len(self._orders.get(student_id, ()))
+
+    def page(self, student_id, page=1, per_page=20):
+        """Get one page of a student's orders, newest first"""
+        orders = self._orders.get(student_id, [])
+        end = len(orders) - (page - 1) * per_page
+        if end <= 0:
+            return []
+        start = max(end - per_page, 0)
+        return orders[start:end][::-1]
+
+
+class SlotLocationIndex:
+    """Orders grouped by (pickup_time, pickup_location) in placement order"""
+    def __init__(self):
+        self._groups = {}  # (time_slot, location) -> list of Orders
+        self._lock = threading.Lock()
+
+    def add(self, order):
+        with self._lock:
+            self._groups.setdefault((order.pickup_time, order.pickup_location), []).append(order)
+
+    def remove_many(self, orders):
+        """Forget archived orders"""
+        order_ids = {order.order_id for order in orders}
+        with self._lock:
+            for key in {(order.pickup_time, order.pickup_location) for order in orders}:
+                kept = [order for order in self._groups.get(key, [])
+                        if order.order_id not in order_ids]
+                if kept:
+                    self._groups[key] = kept
+                else:
+                    self._groups.pop(key, None)
+
+    def counts(self):
+        return {key: len(orders) for key, orders in self._groups.items()}
+
+    def page(self, time_slot, location, page=1, per_page=None):
+        """Get one page of a group's orders (all of them if per_page is None) and the group size"""
+        orders = self._groups.get((time_slot, location), [])
+        if per_page is None:
+            return list(orders), len(orders)
+        start = (page - 1) * per_page
+        return orders[start:start + per_page], len(orders)
+
+
+class ProductionIndex:
+    """Meal quantities per slot, location and preparation status for the kitchen
+
+    Each order's lines are counted under its current preparation status and
+    moved when the status changes; cancelled orders are not counted.
+    """
+    def __init__(self):
+        self._counts = {}  # (time_slot, location, meal_id, status) -> quantity
+        self._names = {}  # meal_id -> meal name
+        self._statuses = {}  # order_id -> status its lines are counted under
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def counted_status(order):
+        return None if order.status == "cancelled" else order.preparation_status
+
+    def _count(self, order, status, sign):
+        for item in order.items:
+            key = (order.pickup_time, order.pickup_location, item.meal_id, status)
+            quantity = self._counts.get(key, 0) + sign * item.quantity
+            if quantity:
+                self._counts[key] = quantity
+            else:
+                del self._counts[key]
+            self._names[item.meal_id] = item.meal_name
+
+    def update_many(self, orders):
+        """Count new orders and move changed ones to their new status"""
+        with self._lock:
+            for order in orders:
+                old = self._statuses.get(order.order_id)
+                new = self.counted_status(order)
+                if old == new:
+                    continue
+                if old is not None:
+                    self._count(order, old, -1)
+                if new is not None:
+                    self._count(order, new, 1)
+                    self._statuses[order.order_id] = new
+                else:
+                    del self._statuses[order.order_id]
+
+    def add(self, order):
+        self.update_many([order])
+
+    def update(self, order):
+        self.update_many([order])
+
+    def remove_many(self, orders):
+        """Stop counting archived orders"""
+        with self._lock:
+            for order in orders:
+                status = self._statuses.pop(order.order_id, None)
+                if status is not None:
+                    self._count(order, status, -1)
+
+    def rows(self):
+        """(time_slot, location, meal_id, meal_name, status, quantity) for every non-zero count"""
+        with self._lock:
+            return [(time_slot, location, meal_id, self._names[meal_id], status, quantity)
+                    for (time_slot, location, meal_id, status), quantity in self._counts.items()]
+
+
+class OrderIdAllocator:
+    """Sequential order numbers for concurrent checkouts
+    
+    The lock is held only to bump one integer, so checkouts barely contend
+    for it, and last never moves backwards: a snapshot that saves last + 1
+    cannot hand out a number an earlier order already has.
+    """
+    def __init__(self, start=1):
+        self._lock = threading.Lock()
+        self._last = start - 1
+
+    @property
+    def last(self):
+        """Highest number handed out"""
+        return self._last
+
+    def allocate(self):
+        with self._lock:
+            self._last += 1
+            return self._last
+
+    def advance_past(self, number):
+        """Skip ahead so later numbers are above number"""
+        with self._lock:
+            if number > self._last:
+                self._last = number
+
+# Cart lock stripes; students hash onto them, so two students rarely share one
+CART_LOCK_STRIPES = 256
+# Carts not changed for this many seconds are dropped as abandoned
+CART_TTL = float(os.environ.get("QUICKBITE_CART_TTL", 12 * 3600))
+# Idle carts dropped after each cart change, so eviction keeps up without a full scan
+CART_EVICT_BATCH = 8
+
+
+class CartActivity:
+    """Students with stored carts, least recently changed first
+
+    Finding idle carts only looks at the front of the order, so it costs
+    nothing while no cart has been left alone for ttl seconds.
+    """
+    def __init__(self, ttl=CART_TTL):
+        self.ttl = ttl
+        self._touched = OrderedDict()  # student_id -> time.monotonic() of the last change
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._touched)
+
+    def touch(self, student_id):
+        with self._lock:
+            self._touched[student_id] = time.monotonic()
+            self._touched.move_to_end(student_id)
+
+    def forget(self, student_id):
+        with self._lock:
+            self._touched.pop(student_id, None)
+
+    def is_idle(self, student_id):
+        touched = self._touched.get(student_id)
+        return touched is not None and touched <= time.monotonic() - self.ttl
+
+    def idle(self, limit=None):
+        """Students whose carts have not changed for ttl seconds, oldest first"""
+        cutoff = time.monotonic() - self.ttl
+        found = []
+        with self._lock:
+            for student_id, touched in self._touched.items():
+                if touched > cutoff or len(found) == limit:
+                    break
+                found.append(student_id)
+        return found
+
+
+class MemoryStore:
+    """In-process dict storage with incrementally maintained indexes
+    
+    Safe under many threads: carts lock per student (striped), slot seats
+    per slot, order IDs come from a lock-free allocator and the indexes
+    each guard themselves. Only the change log shares one short lock.
+
+    A cart is stored only while it has items and is dropped once it has not
+    changed for CART_TTL seconds, so browsing students cost nothing.
+    """
+    def __init__(self, time_slots, capacity):
+        self.users = {}
+        self.orders = {}
+        self.carts = {}  # student_id -> Cart, only while it has items
+        self.cart_activity = CartActivity()
+        self.order_ids = OrderIdAllocator()
+        self.version = 0  # bumped on every order change
+        self.slot_ledger = SlotLedger(time_slots, capacity)
+        self.slot_queues = SlotQueueIndex()
+        self.student_orders = StudentOrderIndex()
+        self.slot_locations = SlotLocationIndex()
+        self.production = ProductionIndex()
+        self._changed = OrderedDict()  # order_id -> Order, least recently changed first
+        self._lock = threading.Lock()
+        self._cart_locks = [threading.Lock() for _ in range(CART_LOCK_STRIPES)]
+
+    def _touch(self, *orders):
+        """Stamp orders with new versions and move them to the end of the change log"""
+        with self._lock:
+            for order in orders:
+                self.version += 1
+                order.version = self.version
+                self._changed[order.order_id] = order
+                self._changed.move_to_end(order.order_id)
+
+    # Users
+    def get_user(self, student_id):
+        return self.users.get(student_id)
+
+    def add_user(self, user):
+        """Store a new user, returning False if the student ID is taken"""
+        # setdefault is atomic, so two registrations for one ID cannot both win
+        return self.users.setdefault(user.student_id, user) is user
+
+    def add_users(self, users):
+        """Store a batch of new users, returning the IDs that were not taken"""
+        return [user.student_id for user in users
+                if self.users.setdefault(user.student_id, user) is user]
+
+    def update_password_hash(self, student_id, password_hash):
+        user = self.users.get(student_id)
+        if user is not None:
+            user.password_hash = password_hash
+
+    # Carts
+    def get_cart(self, student_id):
+        return self.carts.get(student_id)
+
+    def _cart_lock(self, student_id):
+        return self._cart_locks[hash(student_id) % CART_LOCK_STRIPES]
+
+    def update_cart(self, student_id, cart_factory, change):
+        """Apply change(cart) to a student's cart atomically and return the cart
+
+        The cart is created on its first change and dropped when it empties.
+        """
+        with self._cart_lock(student_id):
+            cart = self.carts.get(student_id) or cart_factory(student_id)
+            change(cart)
+            if cart.is_empty():
+                self.carts.pop(student_id, None)
+                self.cart_activity.forget(student_id)
+            else:
+                self.carts[student_id] = cart
+                self.cart_activity.touch(student_id)
+        # Outside the lock: eviction takes other students' stripes
+        self.evict_idle_carts(CART_EVICT_BATCH)
+        return cart
+
+    def evict_idle_carts(self, limit=None):
+        """Drop carts that have not changed for CART_TTL seconds; returns how many"""
+        evicted = 0
+        for student_id in self.cart_activity.idle(limit):
+            with self._cart_lock(student_id):
+                # The student may have come back since idle() looked
+                if self.cart_activity.is_idle(student_id):
+                    self.carts.pop(student_id, None)
+                    self.cart_activity.forget(student_id)
+                    evicted += 1
+        return evicted
+
+    def count_active_carts(self):
+        return len(self.carts)
+
+    # Orders
+    def place_order(self, order):
+        """Reserve a slot seat, assign an order ID and store the order
+        
+        Returns False without storing anything if the time slot is full.
+        """
+        if not self.slot_ledger.reserve(order.pickup_time):
+            return False
+        order.order_id = f"ORD{self.order_ids.allocate():04d}"
+        order.calculate_estimated_ready_time()
+        self.orders[order.order_id] = order
+        self.slot_queues.add(order)
+        self.student_orders.add(order)
+        self.slot_locations.add(order)
+        self.production.add(order)
+        self._touch(order)
+        return True
+
+    def order_updated(self, order):
+        self.orders_updated([order])
+
+    def orders_updated(self, orders):
+        """Record status changes for a batch of orders, updating each index once"""
+        self.slot_queues.update_many(orders)
+        self.production.update_many(orders)
+        self._touch(*orders)
+
+    def get_orders(self, order_ids):
+        """Get the orders with the given IDs as a dict, skipping unknown IDs"""
+        return {order_id: self.orders[order_id] for order_id in order_ids if order_id in self.orders}
+
+    def find_orders(self, time_slot, location, preparation_status):
+        """Get the live orders at a slot/location with the given preparation status"""
+        orders, _ = self.slot_locations.page(time_slot, location)
+        return [order for order in orders if order.preparation_status == preparation_status
+                and order.status != "cancelled"]
+
+    def cancel_order(self, order_id):
+        order = self.orders.get(order_id)
+        if not order or order.status == "cancelled":
+            return False
+        order.status = "cancelled"
+        self.slot_ledger.release(order.pickup_time)
+        self.slot_queues.update(order)
+        self.production.update(order)
+        self._touch(order)
+        return True
+
+    def closed_orders_before(self, cutoff):
+        """Get delivered or cancelled orders placed before cutoff, ready to archive"""
+        return [order for order in list(self.orders.values())
+                if order.order_time < cutoff
+                and (order.status == "cancelled" or order.preparation_status == "delivered")]
+
+    def drop_orders(self, order_ids):
+        """Remove archived orders from the hot set, giving back their slot seats
+
+        Returns the IDs of the orders that were removed.
+        """
+        with self._lock:
+            dropped = [self.orders.pop(order_id) for order_id in order_ids
+                       if order_id in self.orders]
+            for order in dropped:
+                self._changed.pop(order.order_id, None)
+        for order in dropped:
+            if order.status != "cancelled":
+                self.slot_ledger.release(order.pickup_time)
+        self.slot_queues.remove_many(dropped)
+        self.student_orders.remove_many(dropped)
+        self.slot_locations.remove_many(dropped)
+        self.production.remove_many(dropped)
+        return [order.order_id for order in dropped]
+
+    def current_version(self):
+        return self.version
+
+    def advance_order_ids(self, number):
+        """Make later order IDs higher than number (call before serving orders)"""
+        self.order_ids.advance_past(number)
+
+    def atomic(self):
+        """Group a read-modify-write of orders
+
+        Orders live in this process only, so the slot locks models already
+        holds are enough.
+        """
+        return nullcontext()
+
+    def changes_since(self, version):
+        """Get orders changed after the given version, oldest change first"""
+        with self._lock:
+            changed = []
+            for order_id in reversed(self._changed):
+                order = self._changed[order_id]
+                if order.version <= version:
+                    break
+                changed.append(order)
+        changed.reverse()
+        return changed
+
+    def get_order(self, order_id):
+        return self.orders.get(order_id)
+
+    def get_student_order(self, student_id, order_id):
+        if not self.student_orders.owns(student_id, order_id):
+            return None
+        return self.orders.get(order_id)
+
+    def get_student_orders(self, student_id, page, per_page):
+        return (self.student_orders.page(student_id, page, per_page),
+                self.student_orders.count(student_id))
+
+    def orders_ahead(self, order):
+        return self.slot_queues.ahead(order.pickup_time, order.order_id)
+
+    def pending_orders(self, time_slot):
+        """Orders still waiting in a slot's kitchen queue, front first"""
+        orders = self.orders
+        return [orders[order_id] for order_id in self.slot_queues.queued_ids(time_slot)
+                if order_id in orders]
+
+    def recent_ready_orders(self, limit):
+        """The last `limit` orders to be marked ready, oldest first"""
+        ready = [order for order in list(self.orders.values()) if order.actual_ready_time]
+        ready.sort(key=lambda order: order.actual_ready_time)
+        return ready[-limit:]
+
+    def slot_counts(self):
+        return self.slot_ledger.counts()
+
+    def count_orders(self):
+        return len(self.orders)
+
+    def orders_at(self, time_slot, location, page=1, per_page=None):
+        """Get a page of one slot/location group in placement order, plus its size"""
+        return self.slot_locations.page(time_slot, location, page, per_page)
+
+    def slot_location_counts(self):
+        return self.slot_locations.counts()
+
+    def queue_depths(self):
+        """Orders still waiting on the kitchen per (time_slot, location)"""
+        return self.slot_queues.depths()
+
+    def production_rows(self):
+        return self.production.rows()
+
+
+def _order_state(order):
+    """The fields of an order that change after it is placed"""
+    return {
+        'order_id': order.order_id,
+        'status': order.status,
+        'preparation_status': order.preparation_status,
+        'estimated_ready_time': _to_text(order.estimated_ready_time),
+        'preparing_time': _to_text(order.preparing_time),
+        'actual_ready_time': _to_text(order.actual_ready_time),
+        'delivered_time': _to_text(order.delivered_time),
+        'version': order.version,
+    }
+
+
+def order_record(order):
+    """Everything needed to rebuild an order, as JSON-friendly values"""
+    record = _order_state(order)
+    record.update({
+        'student_id': order.student_id,
+        'student_name': order.student_name,
+        'items': [[item.meal_id, item.meal_name, item.meal_price, item.quantity]
+                  for item in order.items],
+        'total_price': order.total_price,
+        'pickup_time': order.pickup_time,
+        'pickup_location': order.pickup_location,
+        'order_time': _to_text(order.order_time),
+    })
+    return record
+
+
+def order_from_record(data):
+    """Rebuild an Order from order_record() output"""
+    from models import CartItem, Order  # models imports this module
+    order = Order(data['order_id'], data['student_id'], data['student_name'],
+                  [CartItem(*item) for item in data['items']], data['total_price'],
+                  data['pickup_time'], data['pickup_location'], _to_datetime(data['order_time']))
+    _apply_order_state(order, data)
+    return order
+
+
+def _apply_order_state(order, data):
+    order.status = data['status']
+    order.preparation_status = data['preparation_status']
+    order.estimated_ready_time = _to_datetime(data['estimated_ready_time'])
+    order.preparing_time = _to_datetime(data.get('preparing_time'))
+    order.actual_ready_time = _to_datetime(data['actual_ready_time'])
+    order.delivered_time = _to_datetime(data['delivered_time'])
+    order.version = data['version']
+
+
+def _user_record(user):
+    return {'student_id': user.student_id, 'name': user.name, 'email': user.email,
+            'password_hash': user.password_hash, 'is_admin': user.is_admin}
+
+
+class JournalStore(MemoryStore):
+    """MemoryStore that survives restarts through an append-only journal
+
+    Every user, order placement and status change is journaled before the
+    call returns, and a snapshot is written in the background every
+    snapshot_every records. Like MemoryStore, state belongs to one process,
+    so run a single gunicorn worker (with threads) on this backend.
+    """
+    def __init__(self, directory, time_slots, capacity, snapshot_every=10000, fsync=True):
+        super().__init__(time_slots, capacity)
+        self.snapshot_every = snapshot_every
+        self.journal = Journal(directory, fsync=fsync)
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_seq = 0
+        snapshot, records = self.journal.recover()
+        if snapshot is not None:
+            self._restore_snapshot(snapshot)
+        for record in records:
+            self._replay(record)
+        self._rebuild_change_log()
+        # A long tail means a slow next startup, so count it toward the next snapshot
+        self._snapshot_seq = self.journal.last_seq - len(records)
+
+    # Recovery
+    def _restore_snapshot(self, snapshot):
+        self.order_ids = OrderIdAllocator(snapshot['order_counter'])
+        for user in snapshot['users']:
+            self._restore_user(user)
+        for order in snapshot['orders']:
+            self._restore_order(order)
+
+    def _replay(self, record):
+        kind = record['type']
+        if kind == 'user':
+            self._restore_user(record['user'])
+        elif kind == 'users':
+            for user in record['users']:
+                self._restore_user(user)
+        elif kind == 'password':
+            user = self.users.get(record['student_id'])
+            if user is not None:
+                user.password_hash = record['password_hash']
+        elif kind == 'order':
+            self._restore_order(record['order'])
+        elif kind == 'status':
+            for state in record['orders']:
+                self._restore_order(state)
+        elif kind == 'archive':
+            MemoryStore.drop_orders(self, record['order_ids'])
+
+    def _restore_user(self, data):
+        if data['student_id'] in self.users:
+            return
+        from models import User  # models imports this module
+        user = User(data['student_id'], data['name'], data['email'])
+        user.password_hash = data['password_hash']
+        user.is_admin = data['is_admin']
+        self.users[user.student_id] = user
+
+    def _restore_order(self, data):
+        """Add a journaled order, or apply a newer state to one already restored"""
+        order = self.orders.get(data['order_id'])
+        if order is None:
+            if 'items' not in data:
+                return  # status change for an order dropped from the journal
+            order = order_from_record(data)
+            self.orders[order.order_id] = order
+            if order.status != "cancelled":
+                self.slot_ledger.reserve(order.pickup_time)
+            self.slot_queues.add(order)
+            self.student_orders.add(order)
+            self.slot_locations.add(order)
+            self.production.add(order)
+            self.order_ids.advance_past(int(order.order_id[3:]))
+        elif data['version'] >= order.version:
+            was_cancelled = order.status == "cancelled"
+            _apply_order_state(order, data)
+            if order.status == "cancelled" and not was_cancelled:
+                self.slot_ledger.release(order.pickup_time)
+            self.slot_queues.update(order)
+            self.production.update(order)
+        self.version = max(self.version, order.version)
+
+    def _rebuild_change_log(self):
+        for order in sorted(self.orders.values(), key=lambda order: order.version):
+            self._changed[order.order_id] = order
+
+    # Journaling
+    def _log(self, record):
+        seq = self.journal.append(record)
+        if seq - self._snapshot_seq >= self.snapshot_every and self._snapshot_lock.acquire(False):
+            self._snapshot_seq = seq
+            threading.Thread(target=self._write_snapshot, daemon=True,
+                             name='journal-snapshot').start()
+
+    def _write_snapshot(self):
+        """Snapshot the store at the start of a fresh segment
+
+        The copy is taken after the rotation without stopping writers, so it
+        may already include a few changes journaled in the new segment.
+        Replaying those is harmless: users and orders are only added once and
+        a state only applies if its version is not older.
+        """
+        try:
+            segment = self.journal.rotate()
+            state = {
+                'order_counter': self.order_ids.last + 1,
+                'users': [_user_record(user) for user in list(self.users.values())],
+                'orders': [order_record(order) for order in list(self.orders.values())],
+            }
+            self.journal.write_snapshot(segment, state)
+        finally:
+            self._snapshot_lock.release()
+
+    def add_user(self, user):
+        if not super().add_user(user):
+            return False
+        self._log({'type': 'user', 'user': _user_record(user)})
+        return True
+
+    def add_users(self, users):
+        added = set(super().add_users(users))
+        if added:
+            # One journal record (and fsync) for the whole batch
+            self._log({'type': 'users', 'users': [_user_record(user) for user in users
+                                                  if user.student_id in added]})
+        return [user.student_id for user in users if user.student_id in added]
+
+    def update_password_hash(self, student_id, password_hash):
+        super().update_password_hash(student_id, password_hash)
+        self._log({'type': 'password', 'student_id': student_id, 'password_hash': password_hash})
+
+    def place_order(self, order):
+        if not super().place_order(order):
+            return False
+        self._log({'type': 'order', 'order': order_record(order)})
+        return True
+
+    def orders_updated(self, orders):
+        super().orders_updated(orders)
+        if orders:
+            self._log({'type': 'status', 'orders': [_order_state(order) for order in orders]})
+
+    def drop_orders(self, order_ids):
+        dropped = super().drop_orders(order_ids)
+        if dropped:
+            self._log({'type': 'archive', 'order_ids': dropped})
+        return dropped
+
+    def cancel_order(self, order_id):
+        if not super().cancel_order(order_id):
+            return False
+        self._log({'type': 'status', 'orders': [_order_state(self.orders[order_id])]})
+        return True
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    student_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    password_hash TEXT,
+    is_admin INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS cart_items (
+    student_id TEXT NOT NULL,
+    meal_id TEXT NOT NULL,
+    meal_name TEXT NOT NULL,
+    meal_price NUMERIC NOT NULL,
+    quantity INTEGER NOT NULL,
+    PRIMARY KEY (student_id, meal_id)
+);
+CREATE TABLE IF NOT EXISTS orders (
+    seq INTEGER PRIMARY KEY,
+    order_id TEXT NOT NULL UNIQUE,
+    student_id TEXT NOT NULL,
+    student_name TEXT NOT NULL,
+    total_price NUMERIC NOT NULL,
+    pickup_time TEXT NOT NULL,
+    pickup_location TEXT NOT NULL,
+    order_time TEXT NOT NULL,
+    status TEXT NOT NULL,
+    preparation_status TEXT NOT NULL,
+    estimated_ready_time TEXT,
+    actual_ready_time TEXT,
+    delivered_time TEXT,
+    queued INTEGER NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0,
+    preparing_time TEXT
+);
+CREATE INDEX IF NOT EXISTS orders_by_student ON orders (student_id, seq);
+CREATE INDEX IF NOT EXISTS orders_by_queue ON orders (pickup_time, queued, seq);
+CREATE INDEX IF NOT EXISTS orders_by_location ON orders (pickup_time, pickup_location, seq);
+CREATE INDEX IF NOT EXISTS orders_by_version ON orders (version);
+CREATE TABLE IF NOT EXISTS order_items (
+    order_id TEXT NOT NULL,
+    meal_id TEXT NOT NULL,
+    meal_name TEXT NOT NULL,
+    meal_price NUMERIC NOT NULL,
+    quantity INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS order_items_by_order ON order_items (order_id);
+CREATE TABLE IF NOT EXISTS location_counts (
+    time_slot TEXT NOT NULL,
+    location TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (time_slot, location)
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS slot_counts (
+    time_slot TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS production_counts (
+    time_slot TEXT NOT NULL,
+    location TEXT NOT NULL,
+    meal_id TEXT NOT NULL,
+    meal_name TEXT NOT NULL,
+    preparation_status TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    PRIMARY KEY (time_slot, location, meal_id, preparation_status)
+);
+CREATE TABLE IF NOT EXISTS cart_activity (
+    student_id TEXT PRIMARY KEY,
+    touched REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cart_activity_by_time ON cart_activity (touched);
+CREATE TABLE IF NOT EXISTS queue_counts (
+    time_slot TEXT NOT NULL,
+    location TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (time_slot, location)
+);
+CREATE TABLE IF NOT EXISTS order_keys (
+    student_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    order_id TEXT,
+    expires REAL NOT NULL,
+    PRIMARY KEY (student_id, key)
+);
+CREATE INDEX IF NOT EXISTS order_keys_by_expiry ON order_keys (expires);
+"""
+
+# Fill count tables for databases created before they existed
+BACKFILLS = {
+    'production_counts': """
+INSERT INTO production_counts
+SELECT o.pickup_time, o.pickup_location, i.meal_id, MAX(i.meal_name), o.preparation_status,
+       SUM(i.quantity)
+FROM orders o JOIN order_items i ON i.order_id = o.order_id
+WHERE o.status != 'cancelled'
+GROUP BY o.pickup_time, o.pickup_location, i.meal_id, o.preparation_status
+""",
+    'cart_activity': """
+INSERT INTO cart_activity
+SELECT DISTINCT student_id, CAST(strftime('%s', 'now') AS REAL) FROM cart_items
+""",
+    'queue_counts': """
+INSERT INTO queue_counts
+SELECT pickup_time, pickup_location, COUNT(*) FROM orders WHERE queued = 1
+GROUP BY pickup_time, pickup_location
+""",
+}
+
+ORDER_COLUMNS = ("seq, order_id, student_id, student_name, total_price, pickup_time, "
+                 "pickup_location, order_time, status, preparation_status, "
+                 "estimated_ready_time, actual_ready_time, delivered_time, version, preparing_time")
+
+# Columns added after the first release, applied to existing database files
+MIGRATIONS = [
+    ("orders", "version", "INTEGER NOT NULL DEFAULT 0"),
+    ("orders", "preparing_time", "TEXT"),
+]
+
+
+def _to_text(value):
+    return value.isoformat() if value else None
+
+
+def _to_datetime(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+class SQLiteStore:
+    """SQLite storage shared by every worker process using the same file
+    
+    Each thread gets its own connection (opened lazily and reopened after a
+    fork). Slot capacity lives in the slot_counts table and is reserved with
+    a conditional UPDATE, so the capacity check holds across processes.
+    """
+    def __init__(self, path, time_slots, capacity):
+        self.path = path
+        self.capacity = capacity
+        self.cart_ttl = CART_TTL
+        self._local = threading.local()
+        conn = self._connect()
+        for table, column, definition in MIGRATIONS:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+            columns = [row['name'] for row in conn.execute(f"PRAGMA table_info({table})")]
+            if exists and column not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        backfills = []
+        if conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'orders'").fetchone():
+            backfills = [sql for table, sql in BACKFILLS.items() if not conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (table,)).fetchone()]
+        conn.executescript(SCHEMA)
+        if backfills:
+            with self._transaction() as conn:
+                for sql in backfills:
+                    conn.execute(sql)
+        with self._transaction() as conn:
+            conn.executemany("INSERT OR IGNORE INTO slot_counts (time_slot, count) VALUES (?, 0)",
+                             [(slot,) for slot in time_slots])
+            conn.execute("INSERT OR IGNORE INTO counters (name, value) VALUES ('order_version', 0)")
+            # Order numbers come from a counter, so IDs of archived rows are never reused
+            conn.execute("INSERT OR IGNORE INTO counters (name, value) "
+                         "SELECT 'order_seq', COALESCE(MAX(seq), 0) FROM orders")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Run a block in a write transaction (nested blocks join the outer one)"""
+        conn = self._connect()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # Users
+    def get_user(self, student_id):
+        row = self._connect().execute(
+            "SELECT * FROM users WHERE student_id = ?", (student_id,)).fetchone()
+        if row is None:
+            return None
+        from models import User  # models imports this module
+        user = User(row['student_id'], row['name'], row['email'])
+        user.password_hash = row['password_hash']
+        user.is_admin = bool(row['is_admin'])
+        return user
+
+    def add_user(self, user):
+        """Store a new user, returning False if the student ID is taken"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO users (student_id, name, email, password_hash, is_admin) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (user.student_id, user.name, user.email, user.password_hash, int(user.is_admin)))
+        return cursor.rowcount == 1
+
+    def add_users(self, users):
+        """Store a batch of new users in one transaction, returning the IDs that were not taken"""
+        added = []
+        with self._transaction() as conn:
+            for user in users:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO users (student_id, name, email, password_hash, is_admin) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (user.student_id, user.name, user.email, user.password_hash,
+                     int(user.is_admin)))
+                if cursor.rowcount == 1:
+                    added.append(user.student_id)
+        return added
+
+    def update_password_hash(self, student_id, password_hash):
+        with self._transaction() as conn:
+            conn.execute("UPDATE users SET password_hash = ? WHERE student_id = ?",
+                         (password_hash, student_id))
+
+    # Carts
+    def _load_cart(self, conn, student_id):
+        rows = conn.execute(
+            "SELECT meal_id, meal_name, meal_price, quantity FROM cart_items "
+            "WHERE student_id = ? ORDER BY rowid", (student_id,)).fetchall()
+        if not rows:
+            return None
+        from models import Cart
+        cart = Cart(student_id)
+        for row in rows:
+            cart.add_item(row['meal_id'], row['meal_name'], row['meal_price'], row['quantity'])
+        return cart
+
+    def get_cart(self, student_id):
+        return self._load_cart(self._connect(), student_id)
+
+    def save_cart(self, cart):
+        """Replace the stored cart lines with the cart's current items in one batch"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM cart_items WHERE student_id = ?", (cart.student_id,))
+            conn.executemany(
+                "INSERT INTO cart_items (student_id, meal_id, meal_name, meal_price, quantity) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(cart.student_id, item.meal_id, item.meal_name, item.meal_price, item.quantity)
+                 for item in cart.items.values()])
+            if cart.is_empty():
+                conn.execute("DELETE FROM cart_activity WHERE student_id = ?", (cart.student_id,))
+            else:
+                conn.execute(
+                    "INSERT INTO cart_activity (student_id, touched) VALUES (?, ?) "
+                    "ON CONFLICT (student_id) DO UPDATE SET touched = excluded.touched",
+                    (cart.student_id, time.time()))
+
+    def update_cart(self, student_id, cart_factory, change):
+        """Read, change and write a student's cart in one transaction"""
+        with self._transaction() as conn:
+            cart = self._load_cart(conn, student_id) or cart_factory(student_id)
+            change(cart)
+            self.save_cart(cart)
+        self.evict_idle_carts(CART_EVICT_BATCH)
+        return cart
+
+    def evict_idle_carts(self, limit=None):
+        """Drop carts that have not changed for CART_TTL seconds; returns how many"""
+        cutoff = time.time() - self.cart_ttl
+        # Usually nothing is idle, and finding that out needs no write lock
+        if not self._connect().execute(
+                "SELECT 1 FROM cart_activity WHERE touched <= ? LIMIT 1", (cutoff,)).fetchone():
+            return 0
+        with self._transaction() as conn:
+            student_ids = [row['student_id'] for row in conn.execute(
+                "SELECT student_id FROM cart_activity WHERE touched <= ? ORDER BY touched LIMIT ?",
+                (cutoff, -1 if limit is None else limit))]
+            for start in range(0, len(student_ids), 500):
+                chunk = student_ids[start:start + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                conn.execute(f"DELETE FROM cart_items WHERE student_id IN ({placeholders})", chunk)
+                conn.execute(f"DELETE FROM cart_activity WHERE student_id IN ({placeholders})",
+                             chunk)
+        return len(student_ids)
+
+    def count_active_carts(self):
+        return self._connect().execute(
+            "SELECT COUNT(DISTINCT student_id) FROM cart_items").fetchone()[0]
+
+    # Orders
+    def _next_version(self, conn, count=1):
+        """Take count consecutive versions, returning the first of them"""
+        conn.execute("UPDATE counters SET value = value + ? WHERE name = 'order_version'", (count,))
+        last = conn.execute("SELECT value FROM counters WHERE name = 'order_version'").fetchone()[0]
+        return last - count + 1
+
+    def place_order(self, order):
+        """Reserve a slot seat, assign an order ID and store the order
+        
+        Returns False without storing anything if the time slot is full.
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE slot_counts SET count = count + 1 WHERE time_slot = ? AND count < ?",
+                (order.pickup_time, self.capacity))
+            if cursor.rowcount != 1:
+                return False
+            conn.execute("UPDATE counters SET value = value + 1 WHERE name = 'order_seq'")
+            seq = conn.execute("SELECT value FROM counters WHERE name = 'order_seq'").fetchone()[0]
+            order.order_id = f"ORD{seq:04d}"
+            order.calculate_estimated_ready_time()
+            order.version = self._next_version(conn)
+            conn.execute(
+                f"INSERT INTO orders ({ORDER_COLUMNS}, queued) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (seq, order.order_id, order.student_id, order.student_name, order.total_price,
+                 order.pickup_time, order.pickup_location, _to_text(order.order_time),
+                 order.status, order.preparation_status, _to_text(order.estimated_ready_time),
+                 _to_text(order.actual_ready_time), _to_text(order.delivered_time),
+                 order.version, _to_text(order.preparing_time),
+                 int(SlotQueueIndex.is_queued(order))))
+            conn.execute(
+                "INSERT INTO location_counts (time_slot, location, count) VALUES (?, ?, 1) "
+                "ON CONFLICT (time_slot, location) DO UPDATE SET count = count + 1",
+                (order.pickup_time, order.pickup_location))
+            conn.executemany(
+                "INSERT INTO order_items (order_id, meal_id, meal_name, meal_price, quantity) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(order.order_id, item.meal_id, item.meal_name, item.meal_price, item.quantity)
+                 for item in order.items])
+            self._count_production(conn, [(order, order.preparation_status, 1)])
+            if SlotQueueIndex.is_queued(order):
+                self._count_queue(conn, [(order, 1)])
+        return True
+
+    def claim_order_key(self, key, ttl):
+        """Claim a (student_id, idempotency key) pair for ttl seconds
+        
+        Returns the ID of the order already placed under it, or None once
+        claimed. Call it inside atomic() together with placing the order and
+        resolve_order_key(), so other workers never see a claim without its
+        order.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM order_keys WHERE expires <= ?", (now,))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO order_keys (student_id, key, order_id, expires) "
+                "VALUES (?, ?, NULL, ?)", (*key, now + ttl))
+            if cursor.rowcount == 1:
+                return None
+            return conn.execute("SELECT order_id FROM order_keys WHERE student_id = ? AND key = ?",
+                                key).fetchone()['order_id']
+
+    def resolve_order_key(self, key, order_id, ttl):
+        """Record the order placed under a claimed key, or release the key if none was"""
+        with self._transaction() as conn:
+            if order_id is None:
+                conn.execute("DELETE FROM order_keys WHERE student_id = ? AND key = ?", key)
+            else:
+                conn.execute("UPDATE order_keys SET order_id = ?, expires = ? "
+                             "WHERE student_id = ? AND key = ?",
+                             (order_id, time.time() + ttl, *key))
+
+    def count_order_keys(self):
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM order_keys WHERE expires > ?", (time.time(),)).fetchone()[0]
+
+    def _count_queue(self, conn, changes):
+        """Add sign to queue_counts for each (order, sign) in changes"""
+        deltas = {}
+        for order, sign in changes:
+            key = (order.pickup_time, order.pickup_location)
+            deltas[key] = deltas.get(key, 0) + sign
+        conn.executemany(
+            "INSERT INTO queue_counts (time_slot, location, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (time_slot, location) DO UPDATE SET count = count + excluded.count",
+            [key + (delta,) for key, delta in deltas.items() if delta])
+
+    def _count_production(self, conn, changes):
+        """Add sign * quantity of each order's lines to production_counts
+
+        changes are (order, preparation_status, sign); order needs items,
+        pickup_time and pickup_location.
+        """
+        deltas = {}
+        for order, status, sign in changes:
+            for item in order.items:
+                key = (order.pickup_time, order.pickup_location, item.meal_id, status)
+                name, quantity = deltas.get(key, (item.meal_name, 0))
+                deltas[key] = (name, quantity + sign * item.quantity)
+        conn.executemany(
+            "INSERT INTO production_counts (time_slot, location, meal_id, meal_name, "
+            "preparation_status, quantity) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (time_slot, location, meal_id, preparation_status) "
+            "DO UPDATE SET quantity = quantity + excluded.quantity",
+            [key[:3] + (name,) + key[3:] + (quantity,)
+             for key, (name, quantity) in deltas.items() if quantity])
+        conn.execute("DELETE FROM production_counts WHERE quantity = 0")
+
+    def _counted_statuses(self, conn, order_ids):
+        """order_id -> preparation status its lines are counted under (None if cancelled)"""
+        counted = {}
+        for start in range(0, len(order_ids), 500):
+            chunk = order_ids[start:start + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            for row in conn.execute(
+                    "SELECT order_id, status, preparation_status FROM orders "
+                    f"WHERE order_id IN ({placeholders})", chunk):
+                counted[row['order_id']] = (None if row['status'] == 'cancelled'
+                                            else row['preparation_status'])
+        return counted
+
+    def order_updated(self, order):
+        self.orders_updated([order])
+
+    def orders_updated(self, orders):
+        """Write status changes for a batch of orders in one transaction"""
+        if not orders:
+            return
+        with self._transaction() as conn:
+            counted = self._counted_statuses(conn, [order.order_id for order in orders])
+            changes = []
+            queue_changes = []
+            for order in orders:
+                if order.order_id not in counted:
+                    continue
+                old = counted[order.order_id]
+                new = ProductionIndex.counted_status(order)
+                if old != new:
+                    if old is not None:
+                        changes.append((order, old, -1))
+                    if new is not None:
+                        changes.append((order, new, 1))
+                was_queued = old in SlotQueueIndex.QUEUED_STATUSES
+                if was_queued != SlotQueueIndex.is_queued(order):
+                    queue_changes.append((order, -1 if was_queued else 1))
+            self._count_production(conn, changes)
+            self._count_queue(conn, queue_changes)
+            first_version = self._next_version(conn, len(orders))
+            for offset, order in enumerate(orders):
+                order.version = first_version + offset
+            conn.executemany(
+                "UPDATE orders SET status = ?, preparation_status = ?, estimated_ready_time = ?, "
+                "preparing_time = ?, actual_ready_time = ?, delivered_time = ?, queued = ?, "
+                "version = ? WHERE order_id = ?",
+                [(order.status, order.preparation_status, _to_text(order.estimated_ready_time),
+                  _to_text(order.preparing_time), _to_text(order.actual_ready_time),
+                  _to_text(order.delivered_time), int(SlotQueueIndex.is_queued(order)),
+                  order.version, order.order_id)
+                 for order in orders])
+
+    def get_orders(self, order_ids):
+        """Get the orders with the given IDs as a dict, skipping unknown IDs"""
+        conn = self._connect()
+        order_ids = list(order_ids)
+        rows = []
+        for start in range(0, len(order_ids), 500):
+            chunk = order_ids[start:start + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            rows += conn.execute(
+                f"SELECT {ORDER_COLUMNS} FROM orders WHERE order_id IN ({placeholders})",
+                chunk).fetchall()
+        return {order.order_id: order for order in self._load_orders(rows)}
+
+    def find_orders(self, time_slot, location, preparation_status):
+        """Get the live orders at a slot/location with the given preparation status"""
+        rows = self._connect().execute(
+            f"SELECT {ORDER_COLUMNS} FROM orders WHERE pickup_time = ? AND pickup_location = ? "
+            "AND preparation_status = ? AND status != 'cancelled' ORDER BY seq",
+            (time_slot, location, preparation_status)).fetchall()
+        return self._load_orders(rows)
+
+    def cancel_order(self, order_id):
+        with self._transaction() as conn:
+            rows = conn.execute(
+                f"SELECT {ORDER_COLUMNS} FROM orders WHERE order_id = ? AND status != 'cancelled'",
+                (order_id,)).fetchall()
+            if not rows:
+                return False
+            order = self._load_orders(rows)[0]
+            conn.execute("UPDATE orders SET status = 'cancelled', queued = 0, version = ? "
+                         "WHERE order_id = ?", (self._next_version(conn), order_id))
+            conn.execute("UPDATE slot_counts SET count = count - 1 WHERE time_slot = ? AND count > 0",
+                         (order.pickup_time,))
+            self._count_production(conn, [(order, order.preparation_status, -1)])
+            if SlotQueueIndex.is_queued(order):
+                self._count_queue(conn, [(order, -1)])
+        return True
+
+    def closed_orders_before(self, cutoff):
+        """Get delivered or cancelled orders placed before cutoff, ready to archive"""
+        rows = self._connect().execute(
+            f"SELECT {ORDER_COLUMNS} FROM orders WHERE order_time < ? "
+            "AND (status = 'cancelled' OR preparation_status = 'delivered') ORDER BY seq",
+            (_to_text(cutoff),)).fetchall()
+        return self._load_orders(rows)
+
+    def drop_orders(self, order_ids):
+        """Remove archived orders, giving back their slot seats and dashboard counts"""
+        dropped = []
+        with self._transaction() as conn:
+            for start in range(0, len(order_ids), 500):
+                chunk = order_ids[start:start + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT {ORDER_COLUMNS} FROM orders WHERE order_id IN ({placeholders})",
+                    chunk).fetchall()
+                orders = self._load_orders(rows)
+                for order in orders:
+                    conn.execute("UPDATE location_counts SET count = count - 1 "
+                                 "WHERE time_slot = ? AND location = ? AND count > 0",
+                                 (order.pickup_time, order.pickup_location))
+                    if order.status != 'cancelled':
+                        conn.execute("UPDATE slot_counts SET count = count - 1 "
+                                     "WHERE time_slot = ? AND count > 0", (order.pickup_time,))
+                    dropped.append(order.order_id)
+                self._count_production(conn, [(order, order.preparation_status, -1)
+                                              for order in orders if order.status != 'cancelled'])
+                conn.execute(f"DELETE FROM order_items WHERE order_id IN ({placeholders})", chunk)
+                conn.execute(f"DELETE FROM orders WHERE order_id IN ({placeholders})", chunk)
+        return dropped
+
+    def _load_orders(self, rows):
+        """Build Order objects for rows, fetching all their items in one query"""
+        if not rows:
+            return []
+        from models import CartItem, Order
+        order_ids = [row['order_id'] for row in rows]
+        items = {order_id: [] for order_id in order_ids}
+        conn = self._connect()
+        for start in range(0, len(order_ids), 500):
+            chunk = order_ids[start:start + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            for item in conn.execute(
+                    "SELECT order_id, meal_id, meal_name, meal_price, quantity FROM order_items "
+                    f"WHERE order_id IN ({placeholders}) ORDER BY rowid", chunk):
+                items[item['order_id']].append(
+                    CartItem(item['meal_id'], item['meal_name'], item['meal_price'], item['quantity']))
+
+        orders = []
+        for row in rows:
+            order = Order(row['order_id'], row['student_id'], row['student_name'],
+                          items[row['order_id']], row['total_price'], row['pickup_time'],
+                          row['pickup_location'], _to_datetime(row['order_time']))
+            order.status = row['status']
+            order.preparation_status = row['preparation_status']
+            order.estimated_ready_time = _to_datetime(row['estimated_ready_time'])
+            order.preparing_time = _to_datetime(row['preparing_time'])
+            order.actual_ready_time = _to_datetime(row['actual_ready_time'])
+            order.delivered_time = _to_datetime(row['delivered_time'])
+            order.version = row['version']
+            orders.append(order)
+        return orders
+
+    def get_order(self, order_id):
+        rows = self._connect().execute(
+            f"SELECT {ORDER_COLUMNS} FROM orders WHERE order_id = ?", (order_id,)).fetchall()
+        orders = self._load_orders(rows)
+        return orders[0] if orders else None
+
+    def get_student_order(self, student_id, order_id):
+        rows = self._connect().execute(
+            f"SELECT {ORDER_COLUMNS} FROM orders WHERE order_id = ? AND student_id = ?",
+            (order_id, student_id)).fetchall()
+        orders = self._load_orders(rows)
+        return orders[0] if orders else None
+
+    def get_student_orders(self, student_id, page, per_page):
+        conn = self._connect()
+        rows = conn.execute(
+            f"SELECT {ORDER_COLUMNS} FROM orders WHERE student_id = ? "
+            "ORDER BY seq DESC LIMIT ? OFFSET ?",
+            (student_id, per_page, (page - 1) * per_page)).fetchall()
+        total = conn.execute("SELECT COUNT(*) FROM orders WHERE student_id = ?",
+                             (student_id,)).fetchone()[0]
+        return self._load_orders(rows), total
+
+    def orders_ahead(self, order):
+        conn = self._connect()
+        row = conn.execute("SELECT seq FROM orders WHERE order_id = ?",
+                           (order.order_id,)).fetchone() if order.order_id else None
+        if row is None:
+            return conn.execute("SELECT COUNT(*) FROM orders WHERE pickup_time = ? AND queued = 1",
+                                (order.pickup_time,)).fetchone()[0]
+        return conn.execute(
+            "SELECT COUNT(*) FROM orders WHERE pickup_time = ? AND queued = 1 AND seq < ?",
+            (order.pickup_time, row['seq'])).fetchone()[0]
+
+    def pending_orders(self, time_slot):
+        """Orders still waiting in a slot's kitchen queue, front first"""
+        rows = self._connect().execute(
+            f"SELECT {ORDER_COLUMNS} FROM orders WHERE pickup_time = ? AND queued = 1 ORDER BY seq",
+            (time_slot,)).fetchall()
+        return self._load_orders(rows)
+
+    def recent_ready_orders(self, limit):
+        """The last `limit` orders to be marked ready, oldest first"""
+        rows = self._connect().execute(
+            f"SELECT {ORDER_COLUMNS} FROM orders WHERE actual_ready_time IS NOT NULL "
+            "ORDER BY actual_ready_time DESC LIMIT ?", (limit,)).fetchall()
+        return self._load_orders(rows)[::-1]
+
+    def current_version(self):
+        return self._connect().execute(
+            "SELECT value FROM counters WHERE name = 'order_version'").fetchone()[0]
+
+    def atomic(self):
+        """Group a read-modify-write of orders into one write transaction
+
+        Reads inside it see the rows as every worker process last wrote them,
+        and no other process can write until it ends.
+        """
+        return self._transaction()
+
+    def advance_order_ids(self, number):
+        """Make later order IDs higher than number"""
+        with self._transaction() as conn:
+            conn.execute("UPDATE counters SET value = MAX(value, ?) WHERE name = 'order_seq'",
+                         (number,))
+
+    def changes_since(self, version):
+        """Get orders changed after the given version, oldest change first"""
+        rows = self._connect().execute(
+            f"SELECT {ORDER_COLUMNS} FROM orders WHERE version > ? ORDER BY version",
+            (version,)).fetchall()
+        return self._load_orders(rows)
+
+    def slot_counts(self):
+        return {row['time_slot']: row['count'] for row in
+                self._connect().execute("SELECT time_slot, count FROM slot_counts")}
+
+    def count_orders(self):
+        return self._connect().execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+    def orders_at(self, time_slot, location, page=1, per_page=None):
+        """Get a page of one slot/location group in placement order, plus its size"""
+        conn = self._connect()
+        query = (f"SELECT {ORDER_COLUMNS} FROM orders "
+                 "WHERE pickup_time = ? AND pickup_location = ? ORDER BY seq")
+        params = [time_slot, location]
+        if per_page is not None:
+            query += " LIMIT ? OFFSET ?"
+            params += [per_page, (page - 1) * per_page]
+        orders = self._load_orders(conn.execute(query, params).fetchall())
+        row = conn.execute("SELECT count FROM location_counts WHERE time_slot = ? AND location = ?",
+                           (time_slot, location)).fetchone()
+        return orders, row['count'] if row else 0
+
+    def slot_location_counts(self):
+        return {(row['time_slot'], row['location']): row['count'] for row in
+                self._connect().execute("SELECT time_slot, location, count FROM location_counts")}
+
+    def queue_depths(self):
+        """Orders still waiting on the kitchen per (time_slot, location)"""
+        return {(row['time_slot'], row['location']): row['count'] for row in self._connect().execute(
+            "SELECT time_slot, location, count FROM queue_counts WHERE count > 0")}
+
+    def production_rows(self):
+        return [tuple(row) for row in self._connect().execute(
+            "SELECT time_slot, location, meal_id, meal_name, preparation_status, quantity "
+            "FROM production_counts WHERE quantity != 0")]
+
+
+def create_store(backend, time_slots, capacity, path=None):
+    """Create the storage backend named by QUICKBITE_STORE ("memory", "journal" or "sqlite")
+
+    path is the database file for "sqlite" and the journal directory for "journal".
+    """
+    if backend == "memory":
+        return MemoryStore(time_slots, capacity)
+    if backend == "journal":
+        return JournalStore(path, time_slots, capacity,
+                            snapshot_every=int(os.environ.get("QUICKBITE_SNAPSHOT_EVERY", 10000)),
+                            fsync=os.environ.get("QUICKBITE_JOURNAL_FSYNC", "1") != "0")
+    if backend == "sqlite":
+        return SQLiteStore(path, time_slots, capacity)
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,57 @@
+"""Shared test setup
+
+The app modules read their configuration from the environment when they are
+first imported, so every data path points into a temporary directory before
+any test module imports them.
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DATA_DIR = tempfile.mkdtemp(prefix='quickbite-tests-')
+os.environ['QUICKBITE_STORE'] = 'memory'
+os.environ['QUICKBITE_DB_PATH'] = os.path.join(DATA_DIR, 'quickbite.db')
+os.environ['QUICKBITE_JOURNAL_DIR'] = os.path.join(DATA_DIR, 'journal')
+os.environ['QUICKBITE_ARCHIVE_DIR'] = os.path.join(DATA_DIR, 'archive')
+os.environ['QUICKBITE_SESSION_DB'] = os.path.join(DATA_DIR, 'sessions.db')
+os.environ['QUICKBITE_IMPORT_DIR'] = os.path.join(DATA_DIR, 'imports')
+# Fast hashes; the default scrypt cost is only there to slow down attackers
+os.environ['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+# Tests run without downloading the vendored CSS, JS and fonts
+os.environ['QUICKBITE_ASSETS_CDN_FALLBACK'] = '1'
+# Journal fsyncs only slow the tests down
+os.environ['QUICKBITE_JOURNAL_FSYNC'] = '0'
+
+# Only now, with the environment set
+import pytest
+import models
+from storage import create_store
+
+BACKENDS = ('memory', 'journal', 'sqlite')
+
+
+@pytest.fixture
+def use_store(tmp_path, monkeypatch):
+    """Point models at a fresh store: use_store('sqlite', capacity=5)"""
+    def use(backend, capacity=models.MAX_SLOT_CAPACITY):
+        path = str(tmp_path / ('journal' if backend == 'journal' else 'quickbite.db'))
+        store = create_store(backend, models.get_time_slots(), capacity, path)
+        monkeypatch.setattr(models, 'store', store)
+        monkeypatch.setattr(models, 'SHARED_ORDER_KEYS', backend == 'sqlite')
+        monkeypatch.setattr(models, 'order_keys',
+                            models.OrderKeyCache(models.ORDER_KEY_TTL, models.ORDER_KEY_LIMIT))
+        return store
+    return use
+
+
+@pytest.fixture
+def new_order():
+    """Build an unplaced order: new_order('s1', '12:00 PM', quantity=2)"""
+    def build(student_id, pickup_time, location='Main Cafeteria', quantity=1, meal_id='1'):
+        item = models.CartItem(meal_id, f"Meal {meal_id}", 5.0, quantity)
+        return models.Order(None, student_id, student_id, [item], 5.0 * quantity,
+                            pickup_time, location)
+    return build
@@ -0,0 +1,119 @@
+"""Cold archive of closed orders and the daily rollover into it"""
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import models
+from archive import OrderArchive
+from conftest import BACKENDS
+
+
+def record(order_id, student_id, order_time='2026-03-01T12:00:00'):
+    return {'order_id': order_id, 'student_id': student_id, 'order_time': order_time}
+
+
+def test_student_history_reads_newest_first(tmp_path):
+    archive = OrderArchive(str(tmp_path))
+    archive.add([record('ORD0001', 'a'), record('ORD0002', 'b')])
+    archive.add([record('ORD0003', 'a'), record('ORD0004', 'a')])
+    assert archive.count('a') == 3
+    assert [r['order_id'] for r in archive.student_records('a', 0, 10)] == [
+        'ORD0004', 'ORD0003', 'ORD0001']
+    assert [r['order_id'] for r in archive.student_records('a', 1, 1)] == ['ORD0003']
+    assert archive.student_records('a', 3, 10) == []
+    assert archive.student_record('a', 'ORD0002') is None  # someone else's
+    assert archive.student_record('b', 'ORD0002')['order_id'] == 'ORD0002'
+
+
+def test_rearchiving_after_an_interrupted_rollover_writes_nothing(tmp_path):
+    archive = OrderArchive(str(tmp_path))
+    archive.add([record('ORD0001', 'a')])
+    before = sorted(os.listdir(str(tmp_path)))
+    assert archive.add([record('ORD0001', 'a')]) == ['ORD0001']
+    assert sorted(os.listdir(str(tmp_path))) == before
+
+
+def test_an_id_archived_for_another_order_is_left_out(tmp_path):
+    archive = OrderArchive(str(tmp_path))
+    archive.add([record('ORD0001', 'a')])
+    archived = archive.add([record('ORD0001', 'b'), record('ORD0002', 'b')])
+    assert archived == ['ORD0002']
+    assert archive.student_record('a', 'ORD0001') is not None
+
+
+def test_segments_without_an_index_are_ignored(tmp_path):
+    with open(os.path.join(str(tmp_path), 'segment-000001.jsonl'), 'w') as f:
+        f.write(json.dumps(record('ORD0009', 'a')) + '\n')
+    archive = OrderArchive(str(tmp_path))
+    assert archive.count('a') == 0
+    archive.add([record('ORD0001', 'a')])
+    assert archive.order_ids() == ['ORD0001']
+
+
+def test_other_processes_see_new_segments(tmp_path):
+    reader = OrderArchive(str(tmp_path))
+    OrderArchive(str(tmp_path)).add([record('ORD0001', 'a')])
+    assert reader.count('a') == 1
+    assert reader.contains('ORD0001')
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    archive = OrderArchive(str(tmp_path / 'archive'))
+    monkeypatch.setattr(models, 'order_archive', archive)
+    return archive
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_rollover_moves_closed_orders_and_keeps_history(backend, use_store, archive, new_order):
+    store = use_store(backend)
+    slot = models.get_time_slots()[0]
+    orders = [new_order('roll', slot) for _ in range(3)]
+    for order in orders:
+        store.place_order(order)
+    delivered, cancelled, open_order = (order.order_id for order in orders)
+    models.update_orders_status('delivered', order_ids=[delivered])
+    models.cancel_order(cancelled)
+
+    assert models.archive_closed_orders(datetime.now() + timedelta(days=1)) == 2
+    assert store.get_order(delivered) is None
+    assert store.get_order(open_order) is not None
+    assert store.slot_counts()[slot] == 1
+    history, total = models.get_student_orders('roll', 1, 10)
+    assert total == 3
+    assert [order.order_id for order in history] == [open_order, cancelled, delivered]
+    assert models.get_student_order('roll', delivered).preparation_status == 'delivered'
+    # Nothing left to move
+    assert models.archive_closed_orders(datetime.now() + timedelta(days=1)) == 0
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_rollover_skips_orders_placed_since_the_cutoff(backend, use_store, archive, new_order):
+    store = use_store(backend)
+    order = new_order('today', models.get_time_slots()[0])
+    store.place_order(order)
+    models.update_orders_status('delivered', order_ids=[order.order_id])
+    assert models.archive_closed_orders(datetime.now() - timedelta(days=1)) == 0
+    assert store.get_order(order.order_id) is not None
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_archived_ids_are_never_handed_out_again(backend, use_store, archive, new_order):
+    archive.add([record('ORD0007', 'earlier')])
+    store = use_store(backend)
+    store.advance_order_ids(7)
+    order = new_order('fresh', models.get_time_slots()[0])
+    store.place_order(order)
+    assert order.order_id == 'ORD0008'
+
+
+def test_orders_whose_id_is_archived_for_another_order_stay(use_store, archive, new_order):
+    store = use_store('memory')
+    order = new_order('clash', models.get_time_slots()[0])
+    store.place_order(order)
+    archive.add([record(order.order_id, 'someone-else')])
+    models.update_orders_status('delivered', order_ids=[order.order_id])
+    assert models.archive_closed_orders(datetime.now() + timedelta(days=1)) == 0
+    assert store.get_order(order.order_id) is not None
@@ -0,0 +1,32 @@
+"""Bulk kitchen status transitions"""
+import pytest
+
+import models
+from conftest import BACKENDS
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_selector_skips_cancelled_orders(backend, use_store, new_order):
+    store = use_store(backend)
+    slot = models.get_time_slots()[0]
+    orders = [new_order(f"s{number}", slot) for number in range(3)]
+    for order in orders:
+        assert store.place_order(order)
+    models.cancel_order(orders[1].order_id)
+    updated, message = models.update_orders_status('preparing', time_slot=slot,
+                                                   location='Main Cafeteria',
+                                                   current_status='received')
+    assert [order.order_id for order in updated] == [orders[0].order_id, orders[2].order_id]
+    assert message == "2 orders updated to preparing"
+    cancelled = models.get_order(orders[1].order_id)
+    assert (cancelled.status, cancelled.preparation_status) == ('cancelled', 'received')
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_unknown_order_id_changes_nothing(backend, use_store, new_order):
+    store = use_store(backend)
+    order = new_order('s1', models.get_time_slots()[0])
+    store.place_order(order)
+    updated, message = models.update_orders_status('ready', order_ids=[order.order_id, 'ORD9999'])
+    assert updated is None and message == "Orders not found: ORD9999"
+    assert models.get_order(order.order_id).preparation_status == 'received'
@@ -0,0 +1,98 @@
+"""Running cart totals and batched, all-or-nothing cart operations"""
+import random
+
+import pytest
+
+import models
+from app import app
+from conftest import BACKENDS
+
+
+def recount(cart):
+    return (sum(item.quantity for item in cart.items.values()),
+            sum(item.get_total_price() for item in cart.items.values()))
+
+
+def test_running_totals_match_the_items():
+    rng = random.Random(3)
+    cart = models.Cart('totals')
+    for _ in range(500):
+        meal_id = str(rng.randint(1, 6))
+        action = rng.random()
+        if action < 0.5:
+            cart.add_item(meal_id, f"Meal {meal_id}", 100 * int(meal_id) + 49, rng.randint(1, 3))
+        elif action < 0.8:
+            cart.update_quantity(meal_id, rng.randint(0, 4))
+        elif action < 0.98:
+            cart.remove_item(meal_id)
+        else:
+            cart.clear()
+        assert (cart.get_total_items(), cart.get_total_price()) == recount(cart)
+
+
+def test_emptied_cart_starts_from_exact_zeros():
+    cart = models.Cart('zeros')
+    cart.add_item('1', 'Soup', 0.1, 3)
+    cart.remove_item('1')
+    assert cart.get_total_price() == 0 and cart.get_total_items() == 0
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_operations_apply_in_order(backend, use_store):
+    store = use_store(backend)
+    cart, message = models.apply_cart_operations('ops', [
+        {'op': 'add', 'meal_id': '1', 'quantity': 2},
+        {'op': 'add', 'meal_id': '2'},
+        {'op': 'set', 'meal_id': '1', 'quantity': 5},
+        {'op': 'set', 'meal_id': '3', 'quantity': 1},
+        {'op': 'remove', 'meal_id': '2'},
+    ])
+    assert message == "Cart updated"
+    assert {meal_id: item.quantity for meal_id, item in cart.items.items()} == {'1': 5, '3': 1}
+    stored = store.get_cart('ops')
+    assert (stored.get_total_items(), stored.get_total_price()) == recount(stored) == (
+        6, 5 * models.get_meal('1')['price'] + models.get_meal('3')['price'])
+
+    cart, _ = models.apply_cart_operations('ops', [{'op': 'clear'}])
+    assert cart.is_empty()
+
+
+@pytest.mark.parametrize('operations, message', [
+    ([], "No cart operations given"),
+    ([{'op': 'add', 'meal_id': '1'}] * (models.MAX_CART_OPERATIONS + 1),
+     f"At most {models.MAX_CART_OPERATIONS} cart operations per request"),
+    ([{'op': 'add', 'meal_id': '1'}, {'op': 'explode'}], "Unknown cart operation: explode"),
+    ([{'op': 'add', 'meal_id': '1'}, {'op': 'add', 'meal_id': 'nope'}], "Invalid meal selection"),
+    ([{'op': 'set', 'meal_id': '1', 'quantity': -1}], None),
+    ([{'op': 'add', 'meal_id': '1', 'quantity': '2'}], None),
+])
+def test_invalid_batches_change_nothing(operations, message, use_store):
+    store = use_store('memory')
+    models.apply_cart_operations('strict', [{'op': 'add', 'meal_id': '4', 'quantity': 1}])
+    cart, error = models.apply_cart_operations('strict', operations)
+    assert cart is None
+    if message:
+        assert error == message
+    assert {meal_id: item.quantity for meal_id, item in store.get_cart('strict').items.items()} == {
+        '4': 1}
+
+
+def test_adds_only_report_what_was_added(use_store):
+    use_store('memory')
+    _, message = models.apply_cart_operations('adds', [
+        {'op': 'add', 'meal_id': '1'}, {'op': 'add', 'meal_id': '1'}])
+    assert message == f"{models.get_meal('1')['name']} added to cart"
+
+
+def test_route_returns_the_new_cart(use_store):
+    use_store('memory')
+    client = app.test_client()
+    assert client.post('/cart_operations', json={'operations': []}).status_code == 401
+    with client.session_transaction() as session:
+        session['user'] = 'route'
+    response = client.post('/cart_operations', json={'operations': [
+        {'op': 'add', 'meal_id': '2', 'quantity': 3}]})
+    data = response.get_json()
+    assert response.status_code == 200
+    assert (data['cart_count'], data['items']) == (3, {'2': 3})
+    assert client.post('/cart_operations', json={'operations': [{'op': 'x'}]}).status_code == 400
@@ -0,0 +1,148 @@
+"""Cart and checkout from many threads at once, on the memory and SQLite stores"""
+import random
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import models
+from storage import OrderIdAllocator
+
+CAPACITY = 5
+THREADS = 16
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, use_store):
+    store = use_store(request.param, CAPACITY)
+    # Switch threads far more often than usual to shake out races
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    yield store
+    sys.setswitchinterval(interval)
+
+
+@pytest.fixture
+def meal():
+    return models.load_menu()['meals'][0]
+
+
+def run_together(function, arguments):
+    """Call function with each argument on its own thread, all released at once"""
+    barrier = threading.Barrier(len(arguments))
+
+    def call(argument):
+        barrier.wait()
+        return function(argument)
+
+    with ThreadPoolExecutor(max_workers=len(arguments)) as pool:
+        return list(pool.map(call, arguments))
+
+
+def fill_cart(student_id, meal, quantity=1):
+    models.add_to_cart(student_id, str(meal['id']), meal['name'], meal['price'], quantity)
+
+
+def test_checkouts_never_overbook_a_slot(store, meal):
+    slot = models.get_time_slots()[0]
+    students = [f"rush{number}" for number in range(THREADS)]
+    for student_id in students:
+        fill_cart(student_id, meal)
+    results = run_together(
+        lambda student_id: models.create_order_from_cart(student_id, student_id, slot,
+                                                         'Main Cafeteria'),
+        students)
+    placed = [order for order, _ in results if order is not None]
+    assert len(placed) == CAPACITY
+    assert len({order.order_id for order in placed}) == CAPACITY
+    assert store.slot_counts()[slot] == CAPACITY
+    # Students turned away keep their carts
+    for student_id, (order, _) in zip(students, results):
+        cart = store.get_cart(student_id)
+        assert (cart is None or cart.is_empty()) == (order is not None)
+
+
+def test_order_ids_are_unique_across_slots(store, meal):
+    students = [f"ids{number}" for number in range(THREADS)]
+    for student_id in students:
+        fill_cart(student_id, meal)
+    slots = models.get_time_slots()
+    results = run_together(
+        lambda number: models.create_order_from_cart(
+            students[number], students[number], slots[number % len(slots)], 'Main Cafeteria'),
+        range(THREADS))
+    order_ids = [order.order_id for order, _ in results]
+    assert None not in order_ids
+    assert len(set(order_ids)) == THREADS
+
+
+def test_allocator_never_hands_out_a_number_twice_or_moves_back():
+    allocator = OrderIdAllocator(start=10)
+    seen = []
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    try:
+        batches = run_together(
+            lambda number: [seen.append(allocator.last) if number == 0 else allocator.allocate()
+                            for _ in range(500)], range(THREADS))
+    finally:
+        sys.setswitchinterval(interval)
+    numbers = [number for batch in batches[1:] for number in batch]
+    assert sorted(numbers) == list(range(10, 10 + len(numbers)))
+    assert seen == sorted(seen)
+    assert allocator.last == 9 + len(numbers)
+    allocator.advance_past(5)
+    assert allocator.allocate() == 10 + len(numbers)
+
+
+def test_concurrent_adds_to_one_cart_are_all_kept(store, meal):
+    run_together(lambda _: [fill_cart('busy', meal) for _ in range(20)], range(THREADS))
+    assert store.get_cart('busy').get_total_items() == THREADS * 20
+
+
+def test_repeated_idempotency_key_places_one_order(store, meal):
+    fill_cart('tapper', meal, 2)
+    slot = models.get_time_slots()[0]
+    results = run_together(
+        lambda _: models.create_order_from_cart('tapper', 'Tapper', slot, 'Main Cafeteria',
+                                                idempotency_key='double-tap'),
+        range(THREADS))
+    assert {order.order_id for order, _ in results} == {results[0][0].order_id}
+    assert sorted(message for _, message in results) == (
+        ["Order already placed"] * (THREADS - 1) + ["Order created successfully"])
+    assert store.count_orders() == 1
+
+
+def test_mixed_traffic_keeps_carts_orders_and_seats_consistent(store):
+    meal_ids = [str(meal['id']) for meal in models.load_menu()['meals']]
+    slots = models.get_time_slots()[:3]
+    students = [f"mixed{number}" for number in range(6)]
+    added = [0] * THREADS
+
+    def traffic(number):
+        rng = random.Random(number)
+        for _ in range(60):
+            student_id = rng.choice(students)
+            if rng.random() < 0.6:
+                quantity = rng.randint(1, 3)
+                fill_cart(student_id, models.get_meal(rng.choice(meal_ids)), quantity)
+                added[number] += quantity
+            else:
+                models.create_order_from_cart(student_id, student_id, rng.choice(slots),
+                                              'Main Cafeteria',
+                                              idempotency_key=f"{student_id}-{rng.randrange(3)}")
+
+    run_together(traffic, range(THREADS))
+    orders = [order for student_id in students
+              for order in store.get_student_orders(student_id, 1, 10 ** 6)[0]]
+    assert len({order.order_id for order in orders}) == len(orders)
+    seated = {slot: sum(1 for order in orders if order.pickup_time == slot) for slot in slots}
+    counts = store.slot_counts()
+    assert all(counts[slot] == seated[slot] <= CAPACITY for slot in slots)
+    assert all(order.total_price == sum(item.get_total_price() for item in order.items)
+               for order in orders)
+    # Every item added is in exactly one order or cart
+    carts = [store.get_cart(student_id) for student_id in students]
+    in_carts = sum(cart.get_total_items() for cart in carts if cart is not None)
+    assert sum(added) == sum(item.quantity for order in orders for item in order.items) + in_carts
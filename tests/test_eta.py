@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from eta import BASE_MINUTES, DEFAULT_MEAL_MINUTES, DEFAULT_ORDER_MINUTES, EtaEngine
+
+NOW = datetime(2026, 3, 2, 11, 30)
+# One item at the default meal minutes
+PREP = timedelta(minutes=BASE_MINUTES + DEFAULT_MEAL_MINUTES)
+STEP = timedelta(minutes=DEFAULT_ORDER_MINUTES)
+
+
+def order(status='received', preparing_time=None, estimate=None):
+    return SimpleNamespace(items=[SimpleNamespace(meal_id='1', quantity=1)],
+                           order_time=NOW - timedelta(minutes=20),
+                           preparation_status=status, preparing_time=preparing_time,
+                           estimated_ready_time=estimate)
+
+
+def test_preparing_order_is_ready_prep_after_it_started():
+    started = order('preparing', preparing_time=NOW - timedelta(minutes=4))
+    EtaEngine().recompute([started], NOW)
+    assert started.estimated_ready_time == NOW - timedelta(minutes=4) + PREP
+
+
+def test_overdue_preparing_order_is_due_now():
+    started = order('preparing', preparing_time=NOW - timedelta(minutes=30))
+    EtaEngine().recompute([started], NOW)
+    assert started.estimated_ready_time == NOW
+
+
+def test_waiting_orders_follow_the_front_order():
+    started = order('preparing', preparing_time=NOW - timedelta(minutes=6))
+    second, third = order(), order()
+    EtaEngine().recompute([started, second, third], NOW)
+    front = NOW - timedelta(minutes=6) + PREP
+    # Not before the kitchen could make them from scratch
+    assert second.estimated_ready_time == max(front + STEP, NOW + PREP)
+    assert third.estimated_ready_time == max(second.estimated_ready_time + STEP, NOW + PREP)
+
+
+def test_waiting_front_order_starts_now():
+    waiting = order()
+    EtaEngine().recompute([waiting], NOW)
+    assert waiting.estimated_ready_time == NOW + PREP
+
+
+def test_recomputing_does_not_push_started_orders_later():
+    engine = EtaEngine()
+    started = order('preparing', preparing_time=NOW - timedelta(minutes=2))
+    engine.recompute([started], NOW)
+    first = started.estimated_ready_time
+    for minutes in range(1, 5):
+        assert engine.recompute([started], NOW + timedelta(minutes=minutes)) == []
+    assert started.estimated_ready_time == first
+
+
+def test_only_moved_estimates_are_returned():
+    engine = EtaEngine()
+    queue = [order('preparing', preparing_time=NOW), order()]
+    assert engine.recompute(queue, NOW) == queue
+    assert engine.recompute(queue, NOW + timedelta(seconds=10)) == []
+
+
+def test_observed_ready_times_update_meal_minutes():
+    engine = EtaEngine(learning_rate=1.0)
+    done = order('ready', preparing_time=NOW - timedelta(minutes=BASE_MINUTES + 6))
+    engine.observe_ready([done], NOW)
+    assert engine.meal_minutes('1') == 6
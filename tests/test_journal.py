@@ -0,0 +1,106 @@
+"""Append-only journal, snapshots, and restarting a JournalStore from them"""
+import os
+import threading
+import time
+
+import models
+from journal import Journal
+from storage import JournalStore
+
+
+def reopen(directory, **options):
+    return JournalStore(directory, models.get_time_slots(), models.MAX_SLOT_CAPACITY,
+                        fsync=False, **options)
+
+
+def test_records_come_back_in_order(tmp_path):
+    journal = Journal(str(tmp_path), fsync=False)
+    assert journal.recover() == (None, [])
+    for number in range(5):
+        assert journal.append({'n': number}) == number + 1
+    snapshot, records = Journal(str(tmp_path), fsync=False).recover()
+    assert snapshot is None
+    assert [record['n'] for record in records] == list(range(5))
+
+
+def test_torn_final_line_is_ignored(tmp_path):
+    journal = Journal(str(tmp_path), fsync=False)
+    journal.recover()
+    journal.append({'n': 1})
+    with open(os.path.join(str(tmp_path), 'journal-000000000001.jsonl'), 'a') as f:
+        f.write('{"n": 2, "unfini')
+    recovered = Journal(str(tmp_path), fsync=False)
+    assert recovered.recover()[1] == [{'n': 1}]
+    assert recovered.append({'n': 3}) == 2
+
+
+def test_concurrent_appends_are_all_kept(tmp_path):
+    journal = Journal(str(tmp_path), fsync=False)
+    journal.recover()
+    threads = [threading.Thread(target=lambda number=number: [
+        journal.append({'thread': number, 'i': i}) for i in range(50)]) for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    records = Journal(str(tmp_path), fsync=False).recover()[1]
+    assert len(records) == 400
+    assert len({(record['thread'], record['i']) for record in records}) == 400
+
+
+def test_snapshot_replaces_older_segments(tmp_path):
+    journal = Journal(str(tmp_path), fsync=False)
+    journal.recover()
+    journal.append({'n': 1})
+    journal.append({'n': 2})
+    segment = journal.rotate()
+    journal.write_snapshot(segment, {'upto': 2})
+    journal.append({'n': 3})
+    assert sorted(os.listdir(str(tmp_path))) == [
+        'journal-000000000003.jsonl', 'snapshot-000000000003.json']
+    assert Journal(str(tmp_path), fsync=False).recover() == ({'upto': 2}, [{'n': 3}])
+
+
+def test_store_restarts_with_users_orders_and_statuses(use_store, new_order):
+    store = use_store('journal')
+    slot = models.get_time_slots()[0]
+    store.add_user(models.User('j1', 'Journal Student', 'j1@school.edu'))
+    orders = [new_order('j1', slot) for _ in range(4)]
+    for order in orders:
+        store.place_order(order)
+    models.update_orders_status('ready', order_ids=[orders[0].order_id])
+    models.cancel_order(orders[1].order_id)
+    store.drop_orders([orders[0].order_id])
+
+    restarted = reopen(store.journal.directory)
+    assert restarted.get_user('j1').name == 'Journal Student'
+    assert restarted.get_order(orders[0].order_id) is None
+    assert restarted.get_order(orders[1].order_id).status == 'cancelled'
+    assert restarted.get_order(orders[2].order_id).preparation_status == 'received'
+    assert restarted.slot_counts()[slot] == 2
+    assert restarted.current_version() == store.current_version()
+    # Numbering carries on past every order ever placed
+    later = new_order('j1', slot)
+    restarted.place_order(later)
+    assert later.order_id == 'ORD0005'
+
+
+def test_store_restarts_from_a_snapshot_and_its_tail(tmp_path, new_order):
+    directory = str(tmp_path / 'journal')
+    store = reopen(directory, snapshot_every=3)
+    slot = models.get_time_slots()[0]
+    for _ in range(5):
+        store.place_order(new_order('snap', slot))
+    deadline = time.monotonic() + 5
+    while not any(name.startswith('snapshot-') for name in os.listdir(directory)):
+        assert time.monotonic() < deadline, "no snapshot written"
+        time.sleep(0.01)
+    with store._snapshot_lock:  # wait for the snapshot writer to finish
+        pass
+
+    restarted = reopen(directory)
+    assert restarted.count_orders() == 5
+    assert restarted.slot_counts()[slot] == 5
+    later = new_order('snap', slot)
+    restarted.place_order(later)
+    assert later.order_id == 'ORD0006'
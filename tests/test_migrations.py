@@ -0,0 +1,82 @@
+"""Opening a database file written before the newer columns and count tables"""
+import sqlite3
+
+import models
+from storage import SQLiteStore
+
+OLD_SCHEMA = """
+CREATE TABLE orders (
+    seq INTEGER PRIMARY KEY,
+    order_id TEXT NOT NULL UNIQUE,
+    student_id TEXT NOT NULL,
+    student_name TEXT NOT NULL,
+    total_price NUMERIC NOT NULL,
+    pickup_time TEXT NOT NULL,
+    pickup_location TEXT NOT NULL,
+    order_time TEXT NOT NULL,
+    status TEXT NOT NULL,
+    preparation_status TEXT NOT NULL,
+    estimated_ready_time TEXT,
+    actual_ready_time TEXT,
+    delivered_time TEXT,
+    queued INTEGER NOT NULL
+);
+CREATE TABLE order_items (
+    order_id TEXT NOT NULL,
+    meal_id TEXT NOT NULL,
+    meal_name TEXT NOT NULL,
+    meal_price NUMERIC NOT NULL,
+    quantity INTEGER NOT NULL
+);
+CREATE TABLE cart_items (
+    student_id TEXT NOT NULL,
+    meal_id TEXT NOT NULL,
+    meal_name TEXT NOT NULL,
+    meal_price NUMERIC NOT NULL,
+    quantity INTEGER NOT NULL,
+    PRIMARY KEY (student_id, meal_id)
+);
+"""
+
+
+def old_database(path, slot):
+    conn = sqlite3.connect(path)
+    conn.executescript(OLD_SCHEMA)
+    for seq, status, queued in ((7, 'confirmed', 1), (8, 'confirmed', 1), (9, 'cancelled', 0)):
+        conn.execute("INSERT INTO orders VALUES (?, ?, 's1', 'S', 10, ?, 'Main Cafeteria', "
+                     "'2026-03-01T11:00:00', ?, 'received', NULL, NULL, NULL, ?)",
+                     (seq, f"ORD{seq:04d}", slot, status, queued))
+        conn.execute("INSERT INTO order_items VALUES (?, '1', 'Burger', 5, 2)", (f"ORD{seq:04d}",))
+    conn.execute("INSERT INTO cart_items VALUES ('s2', '3', 'Pizza', 4, 1)")
+    conn.commit()
+    conn.close()
+
+
+def test_old_database_gains_columns_and_counts(tmp_path):
+    path = str(tmp_path / 'old.db')
+    slot = models.get_time_slots()[0]
+    old_database(path, slot)
+    store = SQLiteStore(path, models.get_time_slots(), models.MAX_SLOT_CAPACITY)
+    conn = sqlite3.connect(path)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(orders)")}
+    assert {'version', 'preparing_time'} <= columns
+    # Cancelled orders are left out of the backfilled counts
+    assert conn.execute("SELECT quantity FROM production_counts").fetchall() == [(4,)]
+    assert conn.execute("SELECT count FROM queue_counts").fetchall() == [(2,)]
+    assert conn.execute("SELECT student_id FROM cart_activity").fetchall() == [('s2',)]
+    assert store.get_order('ORD0007').version == 0
+    # New orders are numbered after the old ones
+    order = models.Order(None, 's3', 'S', [models.CartItem('1', 'Burger', 5, 1)], 5, slot,
+                         'Main Cafeteria')
+    assert store.place_order(order)
+    assert order.order_id == 'ORD0010'
+
+
+def test_reopening_does_not_backfill_twice(tmp_path):
+    path = str(tmp_path / 'old.db')
+    old_database(path, models.get_time_slots()[0])
+    SQLiteStore(path, models.get_time_slots(), models.MAX_SLOT_CAPACITY)
+    SQLiteStore(path, models.get_time_slots(), models.MAX_SLOT_CAPACITY)
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT SUM(quantity) FROM production_counts").fetchone() == (4,)
+    assert conn.execute("SELECT SUM(count) FROM queue_counts").fetchone() == (2,)
@@ -0,0 +1,111 @@
+"""Idempotent order submission, in one process and across SQLite workers"""
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import models
+from conftest import BACKENDS, ROOT
+
+
+def place(student_id, key):
+    return models.create_order(student_id, student_id, 'Soup', 3.0, models.get_time_slots()[0],
+                               'Main Cafeteria', idempotency_key=key)
+
+
+def test_cache_hands_back_the_placed_order():
+    keys = models.OrderKeyCache(ttl=60, max_entries=10)
+    assert keys.claim(('s1', 'a')) is None
+    keys.resolve(('s1', 'a'), '100001')
+    assert keys.claim(('s1', 'a')) == '100001'
+    assert keys.claim(('s2', 'a')) is None
+
+
+def test_cache_releases_a_key_whose_order_failed():
+    keys = models.OrderKeyCache(ttl=60, max_entries=10)
+    keys.claim(('s1', 'a'))
+    keys.resolve(('s1', 'a'), None)
+    assert keys.claim(('s1', 'a')) is None
+
+
+def test_cache_forgets_expired_and_oldest_keys(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(models.time, 'monotonic', lambda: clock[0])
+    keys = models.OrderKeyCache(ttl=60, max_entries=3)
+    for number in range(5):
+        keys.claim(('s1', str(number)))
+        keys.resolve(('s1', str(number)), str(number))
+    keys.claim(('s1', 'new'))
+    assert len(keys) == 3
+    assert keys.claim(('s1', '0')) is None
+    clock[0] += 61
+    assert keys.claim(('s1', 'later')) is None
+    assert len(keys) == 1
+
+
+def test_sqlite_keys_expire_and_release(use_store, monkeypatch):
+    store = use_store('sqlite')
+    clock = [1000.0]
+    monkeypatch.setattr('storage.time.time', lambda: clock[0])
+    assert store.claim_order_key(('s1', 'a'), 60) is None
+    store.resolve_order_key(('s1', 'a'), '100001', 60)
+    assert store.claim_order_key(('s1', 'a'), 60) == '100001'
+    assert store.claim_order_key(('s1', 'b'), 60) is None
+    store.resolve_order_key(('s1', 'b'), None, 60)
+    assert store.count_order_keys() == 1
+    clock[0] += 61
+    assert store.count_order_keys() == 0
+    assert store.claim_order_key(('s1', 'a'), 60) is None
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_repeated_key_returns_the_first_order(backend, use_store):
+    use_store(backend)
+    first = place('s1', 'tap')
+    assert place('s1', 'tap').order_id == first.order_id
+    assert place('s2', 'tap').order_id != first.order_id
+    assert place('s1', None).order_id != first.order_id
+    assert models.get_total_orders() == 3
+
+
+def test_overlong_keys_are_not_remembered(use_store):
+    use_store('memory')
+    key = 'k' * (models.ORDER_KEY_MAX_LENGTH + 1)
+    assert place('s1', key).order_id != place('s1', key).order_id
+    assert len(models.order_keys) == 0
+
+
+def test_failed_order_frees_its_key(use_store):
+    use_store('memory', capacity=1)
+    blocker = place('s2', None)
+    assert place('s1', 'retry') is None
+    models.cancel_order(blocker.order_id)
+    assert place('s1', 'retry') is not None
+
+
+WORKER = """
+import sys, time
+import models
+start = float(sys.argv[1])
+while time.time() < start:
+    time.sleep(0.001)
+order = models.create_order('s1', 'S', 'Soup', 3.0, models.get_time_slots()[0],
+                            'Main Cafeteria', idempotency_key='double-tap')
+print(order.order_id)
+"""
+
+
+def test_workers_sharing_a_database_place_one_order(tmp_path):
+    env = dict(os.environ, QUICKBITE_STORE='sqlite', QUICKBITE_DB_PATH=str(tmp_path / 'shared.db'),
+               PYTHONPATH=ROOT)
+    start = str(time.time() + 3)
+    workers = [subprocess.Popen([sys.executable, '-c', WORKER, start], cwd=ROOT, env=env,
+                                stdout=subprocess.PIPE, text=True) for _ in range(4)]
+    outputs = [worker.communicate(timeout=60)[0].split() for worker in workers]
+    assert all(worker.returncode == 0 for worker in workers)
+    assert len({output[-1] for output in outputs}) == 1
+    check = subprocess.run([sys.executable, '-c', 'import models; print(models.get_total_orders())'],
+                           cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True, check=True)
+    assert check.stdout.split()[-1] == '1'
@@ -0,0 +1,97 @@
+import threading
+import time
+
+import pytest
+
+import models
+import routes
+from app import app
+
+
+@pytest.fixture
+def placed():
+    meal = models.load_menu()['meals'][0]
+    models.add_to_cart('track1', str(meal['id']), meal['name'], meal['price'], 1)
+    order, _ = models.create_order_from_cart('track1', 'Tracker', models.get_time_slots()[0],
+                                             'Main Cafeteria')
+    return order
+
+
+@pytest.fixture
+def student():
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user'] = 'track1'
+    return client
+
+
+@pytest.fixture
+def admin():
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user'] = 'admin'
+        session['is_admin'] = True
+    return client
+
+
+def status_url(order, since):
+    return f'/track_order/{order.order_id}/status?since={since}'
+
+
+def test_newer_status_is_sent_at_once(placed, student):
+    response = student.get(status_url(placed, -1))
+    assert response.status_code == 200
+    assert response.get_json()['version'] == models.get_order(placed.order_id).version
+
+
+def test_unchanged_order_answers_204_after_the_timeout(placed, student, monkeypatch):
+    monkeypatch.setattr(routes, 'LONG_POLL_TIMEOUT', 0.2)
+    version = models.get_order(placed.order_id).version
+    response = student.get(status_url(placed, version))
+    assert response.status_code == 204
+    assert 'Retry-After' not in response.headers
+
+
+def test_waiting_poll_wakes_on_a_status_change(placed, student, monkeypatch):
+    monkeypatch.setattr(routes, 'LONG_POLL_TIMEOUT', 10)
+    version = models.get_order(placed.order_id).version
+    timer = threading.Timer(0.2, models.update_orders_status, ('preparing',),
+                            {'order_ids': [placed.order_id]})
+    timer.start()
+    started = time.monotonic()
+    response = student.get(status_url(placed, version))
+    timer.join()
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'preparing'
+    assert time.monotonic() - started < 5
+
+
+def test_polls_beyond_the_cap_are_told_to_retry(placed, student, monkeypatch):
+    monkeypatch.setattr(routes, 'long_poll_slots', threading.BoundedSemaphore(1))
+    routes.long_poll_slots.acquire()
+    version = models.get_order(placed.order_id).version
+    started = time.monotonic()
+    response = student.get(status_url(placed, version))
+    assert response.status_code == 204
+    assert response.headers['Retry-After'] == str(routes.LONG_POLL_RETRY)
+    assert time.monotonic() - started < 1
+
+
+def test_other_students_orders_are_not_found(placed):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user'] = 'someone-else'
+    assert client.get(status_url(placed, -1)).status_code == 404
+
+
+def test_admin_wait_returns_the_new_version(placed, admin, monkeypatch):
+    monkeypatch.setattr(routes, 'LONG_POLL_TIMEOUT', 0.2)
+    version = models.get_order_version()
+    assert admin.get(f'/admin/api/wait?since={version}').status_code == 204
+    models.update_orders_status('ready', order_ids=[placed.order_id])
+    data = admin.get(f'/admin/api/wait?since={version}').get_json()
+    assert data['version'] > version
+
+
+def test_admin_wait_needs_an_admin(student):
+    assert student.get('/admin/api/wait?since=0').status_code == 403
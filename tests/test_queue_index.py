@@ -0,0 +1,96 @@
+"""Per-slot queue index answering "orders ahead of me" without scanning orders"""
+import random
+
+import pytest
+
+import models
+from conftest import BACKENDS
+from storage import SlotQueueIndex
+
+SLOT = '12:00 PM'
+
+
+@pytest.fixture
+def queue(new_order):
+    """An index holding five orders in one slot, ORD0001 at the front"""
+    index = SlotQueueIndex()
+    orders = []
+    for number in range(1, 6):
+        order = new_order(f"q{number}", SLOT, location='Food Court' if number % 2 else 'Library')
+        order.order_id = f"ORD{number:04d}"
+        index.add(order)
+        orders.append(order)
+    return index, orders
+
+
+def test_orders_ahead_counts_earlier_queued_orders(queue):
+    index, orders = queue
+    assert [index.ahead(SLOT, order.order_id) for order in orders] == [0, 1, 2, 3, 4]
+    assert index.ahead(SLOT) == index.queue_length(SLOT) == 5
+    assert index.ahead('1:00 PM') == 0
+
+
+def test_orders_leave_and_rejoin_the_queue_with_their_status(queue):
+    index, orders = queue
+    orders[1].preparation_status = 'ready'
+    orders[2].status = 'cancelled'
+    index.update_many(orders[1:3])
+    assert index.ahead(SLOT, orders[4].order_id) == 2
+    assert index.queued_ids(SLOT) == ['ORD0001', 'ORD0004', 'ORD0005']
+    # Preparing orders are still waiting on the kitchen
+    orders[1].preparation_status = 'preparing'
+    index.update(orders[1])
+    index.update(orders[1])  # applying the same change twice counts once
+    assert index.ahead(SLOT, orders[4].order_id) == 3
+
+
+def test_depths_count_queued_orders_per_location(queue):
+    index, orders = queue
+    assert index.depths() == {(SLOT, 'Food Court'): 3, (SLOT, 'Library'): 2}
+    orders[1].preparation_status = 'delivered'
+    orders[3].preparation_status = 'ready'
+    index.update_many(orders)
+    assert index.depths() == {(SLOT, 'Food Court'): 3}
+
+
+def test_archived_orders_are_forgotten(queue):
+    index, orders = queue
+    index.remove_many(orders[:2])
+    assert index.ahead(SLOT, orders[2].order_id) == 0
+    assert index.queued_ids(SLOT) == ['ORD0003', 'ORD0004', 'ORD0005']
+    index.update(orders[0])  # unknown orders are ignored
+    assert index.queue_length(SLOT) == 3
+
+
+def test_matches_a_full_scan_under_random_changes(new_order):
+    rng = random.Random(7)
+    index = SlotQueueIndex()
+    orders = []
+    for number in range(300):
+        order = new_order('scan', rng.choice([SLOT, '12:30 PM']))
+        order.order_id = f"ORD{number:04d}"
+        orders.append(order)
+        index.add(order)
+        for changed in rng.sample(orders, min(3, len(orders))):
+            changed.preparation_status = rng.choice(models.PREPARATION_STATUSES)
+            index.update(changed)
+        probe = rng.choice(orders)
+        expected = sum(1 for other in orders[:orders.index(probe)]
+                       if other.pickup_time == probe.pickup_time
+                       and SlotQueueIndex.is_queued(other))
+        assert index.ahead(probe.pickup_time, probe.order_id) == expected
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_store_orders_ahead_follow_status_changes(backend, use_store, new_order):
+    store = use_store(backend)
+    slot = models.get_time_slots()[0]
+    orders = [new_order(f"ahead{number}", slot) for number in range(4)]
+    for order in orders:
+        assert store.place_order(order)
+    assert [store.orders_ahead(order) for order in orders] == [0, 1, 2, 3]
+    models.update_orders_status('ready', order_ids=[orders[0].order_id, orders[2].order_id])
+    assert store.orders_ahead(store.get_order(orders[3].order_id)) == 1
+    assert [order.order_id for order in store.pending_orders(slot)] == [
+        orders[1].order_id, orders[3].order_id]
+    assert store.queue_depths() == {(slot, 'Main Cafeteria'): 2}
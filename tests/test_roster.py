@@ -0,0 +1,59 @@
+"""Roster import jobs started from the web app"""
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import models
+import roster
+
+
+def roster_csv(count):
+    rows = ''.join(f"r{number},N{number},r{number}@x.edu,pass{number:06d}\n"
+                   for number in range(count))
+    return io.BytesIO(f"student_id,name,email,password\n{rows}r1,Dup,d@x.edu,passdup1\n".encode())
+
+
+def finished(job_id):
+    """Wait for a job's thread to exit (giving back its slot) and return its status"""
+    for thread in threading.enumerate():
+        if thread.name == f'roster-import-{job_id}':
+            thread.join(30)
+            assert not thread.is_alive(), "import did not finish"
+    return roster.job_status(job_id)
+
+
+@pytest.fixture(autouse=True)
+def threads_for_hashing(use_store, monkeypatch):
+    use_store('memory')
+    # Hash on threads; the process pool is only there to spread the CPU cost
+    monkeypatch.setattr(roster, '_hashing_pool', ThreadPoolExecutor)
+
+
+def test_job_reports_its_counts():
+    status = finished(roster.start_import(roster_csv(30), 'csv', workers=2))
+    assert (status['state'], status['created'], status['duplicates']) == ('done', 30, 1)
+    assert models.get_user('r7') is not None
+
+
+def test_failed_job_keeps_its_error_and_counts(monkeypatch, caplog):
+    create_users = models.create_users
+    calls = []
+
+    def fail_second_batch(users):
+        calls.append(len(users))
+        if len(calls) == 2:
+            raise OSError("disk full")
+        return create_users(users)
+
+    monkeypatch.setattr(models, 'create_users', fail_second_batch)
+    job_id = roster.start_import(roster_csv(roster.BATCH_SIZE + 10), 'csv', workers=2)
+    status = finished(job_id)
+    assert status['state'] == 'failed'
+    assert status['error'] == "disk full"
+    assert status['created'] == roster.BATCH_SIZE
+    failure = [record for record in caplog.records if record.name == 'roster']
+    assert failure and failure[0].exc_info and job_id in failure[0].getMessage()
+    # The failed job gave its slot back
+    assert finished(roster.start_import(roster_csv(1), 'csv', workers=1))['state'] == 'done'
@@ -0,0 +1,69 @@
+"""Slot capacity ledger and the seat counts every store keeps"""
+import threading
+
+import pytest
+
+import models
+from conftest import BACKENDS
+from storage import SlotLedger
+
+SLOTS = ('11:00 AM', '11:30 AM')
+
+
+def test_ledger_reserves_up_to_capacity():
+    ledger = SlotLedger(SLOTS, 2)
+    assert ledger.reserve('11:00 AM') and ledger.reserve('11:00 AM')
+    assert not ledger.reserve('11:00 AM')
+    assert ledger.counts() == {'11:00 AM': 2, '11:30 AM': 0}
+
+
+def test_ledger_release_frees_a_seat_and_never_goes_negative():
+    ledger = SlotLedger(SLOTS, 1)
+    ledger.reserve('11:00 AM')
+    ledger.release('11:00 AM')
+    ledger.release('11:00 AM')
+    assert ledger.count('11:00 AM') == 0
+    assert ledger.reserve('11:00 AM')
+
+
+def test_ledger_rejects_unknown_slots():
+    ledger = SlotLedger(SLOTS, 5)
+    assert not ledger.reserve('3:00 AM')
+    ledger.release('3:00 AM')
+    assert '3:00 AM' not in ledger
+    assert ledger.count('3:00 AM') == 0
+
+
+def test_concurrent_reservations_fill_exactly_to_capacity():
+    ledger = SlotLedger(SLOTS, 10)
+    barrier = threading.Barrier(40)
+    taken = []
+
+    def reserve():
+        barrier.wait()
+        taken.append(ledger.reserve('11:30 AM'))
+
+    threads = [threading.Thread(target=reserve) for _ in range(40)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert taken.count(True) == 10
+    assert ledger.count('11:30 AM') == 10
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_store_counts_follow_placements_and_cancellations(backend, use_store, new_order):
+    store = use_store(backend, capacity=2)
+    slot = models.get_time_slots()[0]
+    first, second, third = (new_order(f"seat{number}", slot) for number in range(3))
+    assert store.place_order(first) and store.place_order(second)
+    assert not store.place_order(third)
+    assert third.order_id is None
+    assert models.get_orders_count_by_time_slot()[slot] == 2
+
+    assert models.cancel_order(first.order_id)
+    assert not models.cancel_order(first.order_id)  # a seat is only given back once
+    assert store.slot_counts()[slot] == 1
+    assert store.place_order(third)
+    assert store.slot_counts()[slot] == 2